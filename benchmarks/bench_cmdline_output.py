@@ -0,0 +1,145 @@
+"""
+命令输出吞吐基准：大量输出经过 OutputAccumulator / execute_command 的耗时。
+
+用法：
+    python benchmarks/bench_cmdline_output.py               # 500MB 经 execute_command，另测累加器本身
+    python benchmarks/bench_cmdline_output.py --mb 100 --skip-legacy
+
+累加器部分对比改动前的实现（逐块拼接解码缓冲、重复编码计数、整段重编码裁剪尾部）。
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyagent.tools.cmdline import OutputAccumulator, execute_command  # noqa: E402
+
+# 模拟构建日志：ASCII 为主，夹带多字节字符
+LOG_LINE = "[build] compiling module_0042.c -> module_0042.o ✓ 耗时 12ms\n".encode("utf-8")
+CHUNK_SIZE = 64 * 1024
+
+
+class _LegacyOutputAccumulator(OutputAccumulator):
+    """改动前的追加路径：每块重新拼接解码缓冲、重编码计数，并按文本裁剪尾部。"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._decoder_state = []
+        self._tail_text = ""
+        self._text_bytes = 0
+
+    def append(self, data):
+        self.total_raw_bytes += len(data)
+        decoded = self._stream_decode(data)
+        if decoded:
+            self._append_decoded_text(decoded)
+        if self._temp_file_handle is not None or self._should_use_temp_file():
+            self._ensure_temp_file()
+            self._temp_file_handle.write(data)
+        elif data:
+            self._raw_chunks.append(data)
+
+    def _stream_decode(self, data):
+        self._decoder_state.append(data)
+        raw = b"".join(self._decoder_state)
+        for trim in range(4):
+            try:
+                result = raw.decode("utf-8") if trim == 0 else raw[:-trim].decode("utf-8")
+                self._decoder_state = [raw[-trim:]] if trim > 0 else []
+                return result
+            except UnicodeDecodeError:
+                continue
+        self._decoder_state = []
+        return raw.decode("utf-8", errors="replace")
+
+    def _append_decoded_text(self, text):
+        byte_count = len(text.encode("utf-8"))
+        self._tail_text += text
+        self._text_bytes += byte_count
+        if self._text_bytes > self.max_rolling_bytes * 2:
+            buf = self._tail_text.encode("utf-8")
+            start = len(buf) - self.max_rolling_bytes
+            while start < len(buf) and (buf[start] & 0xC0) == 0x80:
+                start += 1
+            self._tail_text = buf[start:].decode("utf-8")
+            self._text_bytes = len(self._tail_text.encode("utf-8"))
+        newlines = text.count("\n")
+        if newlines:
+            self.completed_lines += newlines
+            self.current_line_bytes = len(text[text.rfind("\n") + 1:].encode("utf-8"))
+        else:
+            self.current_line_bytes += byte_count
+        self.has_open_line = self.current_line_bytes > 0
+        self.total_lines = self.completed_lines + (1 if self.has_open_line else 0)
+
+    def _get_snapshot_text(self):
+        return self._tail_text
+
+
+def _make_chunks(total_bytes):
+    block = LOG_LINE * (CHUNK_SIZE // len(LOG_LINE) + 1)
+    # 故意不按字符边界切块，覆盖多字节字符跨块的情况
+    block = block[:CHUNK_SIZE]
+    count = total_bytes // CHUNK_SIZE
+    return [block] * count
+
+
+def bench_accumulator(cls, chunks):
+    accumulator = cls()
+    start = time.perf_counter()
+    for chunk in chunks:
+        accumulator.append(chunk)
+    accumulator.finish()
+    snapshot = accumulator.snapshot()
+    elapsed = time.perf_counter() - start
+    accumulator.close_temp_file()
+    if accumulator.temp_file_path and os.path.exists(accumulator.temp_file_path):
+        os.unlink(accumulator.temp_file_path)
+    return elapsed, snapshot
+
+
+def bench_execute_command(total_bytes):
+    line = LOG_LINE.decode("utf-8").rstrip("\n").replace("'", "")
+    command = f"yes '{line}' | head -c {total_bytes}"
+    start = time.perf_counter()
+    result = execute_command(command, timeout=-1)
+    elapsed = time.perf_counter() - start
+    match = re.search(r"完整输出: (\S+?)；", result)
+    if match and os.path.exists(match.group(1)):
+        os.unlink(match.group(1))
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=int, default=500, help="经 execute_command 输出的数据量（MB）")
+    parser.add_argument("--accumulator-mb", type=int, default=200, help="直接喂给累加器的数据量（MB）")
+    parser.add_argument("--skip-legacy", action="store_true", help="不运行改动前实现的对比")
+    args = parser.parse_args()
+
+    chunks = _make_chunks(args.accumulator_mb * 1024 * 1024)
+    size_mb = len(chunks) * CHUNK_SIZE / (1024 * 1024)
+    print(f"OutputAccumulator，{size_mb:.0f}MB（{CHUNK_SIZE // 1024}KB 分块）：")
+    implementations = [("当前实现", OutputAccumulator)]
+    if not args.skip_legacy:
+        implementations.append(("改动前", _LegacyOutputAccumulator))
+    snapshots = []
+    for label, cls in implementations:
+        elapsed, snapshot = bench_accumulator(cls, chunks)
+        snapshots.append(snapshot)
+        print(f"  {label:<8} {elapsed:7.2f}s  {size_mb / elapsed:8.1f} MB/s")
+    if len(snapshots) == 2 and snapshots[0]["content"] != snapshots[1]["content"]:
+        print("  警告：两种实现的快照内容不一致")
+
+    total_bytes = args.mb * 1024 * 1024
+    if total_bytes > 0:
+        elapsed = bench_execute_command(total_bytes)
+        print(f"\nexecute_command，{args.mb}MB：{elapsed:.2f}s  {args.mb / elapsed:.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+启动耗时基准：用 python -X importtime 测量 `import pyagent.main` 的累计导入时间，
+超出预算时以非零状态退出，可用于 CI 防止启动变慢。
+
+用法：
+    python benchmarks/bench_startup.py                    # 默认预算 100ms，取多次运行的中位数
+    python benchmarks/bench_startup.py --budget-ms 60 --runs 9
+    python benchmarks/bench_startup.py --module pyagent.tools
+
+同时列出启动时被意外加载的重量级依赖（这些依赖应在首次使用时才导入）。
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 启动（到模型选择提示）阶段不应加载的模块
+HEAVY_MODULES = ("prompt_toolkit", "httpx", "openai", "anthropic", "json_repair", "playwright")
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def measure(module: str) -> Tuple[int, Dict[str, int]]:
+    """在新解释器中导入 module，返回 (module 的累计导入微秒数, {顶层模块: 累计微秒数})。"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0
+    cumulative: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        name, micros = match.group(4), int(match.group(2))
+        cumulative[name] = micros
+        if name == module:
+            total = micros
+    return total, cumulative
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="pyagent.main")
+    parser.add_argument("--budget-ms", type=float, default=100.0)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="列出耗时最多的 N 个模块")
+    args = parser.parse_args()
+
+    totals: List[int] = []
+    cumulative: Dict[str, int] = {}
+    for _ in range(args.runs):
+        total, cumulative = measure(args.module)
+        totals.append(total)
+
+    median_ms = statistics.median(totals) / 1000
+    print(f"import {args.module}: 中位数 {median_ms:.1f} ms（{args.runs} 次，"
+          f"最小 {min(totals) / 1000:.1f} ms，最大 {max(totals) / 1000:.1f} ms）")
+
+    print(f"\n累计耗时最多的 {args.top} 个模块（最后一次运行）：")
+    slowest = sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[: args.top]
+    for name, micros in slowest:
+        print(f"  {micros / 1000:8.1f} ms  {name}")
+
+    loaded_heavy = [name for name in HEAVY_MODULES if name in cumulative]
+    if loaded_heavy:
+        print(f"\n启动时加载了重量级依赖：{', '.join(loaded_heavy)}")
+
+    if median_ms > args.budget_ms:
+        print(f"\n超出预算：{median_ms:.1f} ms > {args.budget_ms:.1f} ms")
+        sys.exit(1)
+    print(f"\n在预算之内（{args.budget_ms:.1f} ms）")
+
+
+if __name__ == "__main__":
+    main()
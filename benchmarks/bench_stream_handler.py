@@ -0,0 +1,125 @@
+"""
+StreamResponseHandler 微基准：回放一段流式响应，对比分块缓冲与逐次 str += 拼接。
+
+用法：
+    python benchmarks/bench_stream_handler.py                 # 使用合成的推理模型流
+    python benchmarks/bench_stream_handler.py --record x.jsonl  # 回放录制的事件流
+    python benchmarks/bench_stream_handler.py --save x.jsonl    # 保存合成流供之后回放
+
+录制文件每行一个事件：{"event_type": "thinking", "data": "..."}。
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyagent.conversation_manager import StreamEvent, StreamResponseHandler  # noqa: E402
+
+
+class _NullFrontend:
+    def output(self, message_type, content):
+        pass
+
+
+class _ConcatHandler(StreamResponseHandler):
+    """改动前的拼接方式：每个片段都对完整字符串做一次 +=。"""
+
+    def __init__(self, frontend):
+        super().__init__(frontend)
+        self._concat_content = ""
+        self._concat_thinking = ""
+        self._concat_arguments = {}
+
+    def handle_stream_event(self, event):
+        if event.event_type == "thinking":
+            self._concat_thinking += event.data
+            self.frontend.output("thinking", event.data)
+        elif event.event_type == "content":
+            self._concat_content += event.data
+            self.frontend.output("content", event.data)
+        elif event.event_type == "tool_call":
+            index = event.data["index"]
+            arguments = self._concat_arguments.get(index, "") + event.data["function"]["arguments"]
+            self._concat_arguments[index] = arguments
+            if len(arguments) % 50 == 0:
+                self.frontend.output("tool_progress", ".")
+        else:
+            super().handle_stream_event(event)
+
+    def get_result(self):
+        return {"content": self._concat_content, "thinking": self._concat_thinking}
+
+
+def synthesize_stream(thinking_tokens: int = 30000, content_tokens: int = 3000,
+                      tool_calls: int = 4, argument_chars: int = 20000) -> List[StreamEvent]:
+    """生成接近推理模型输出的事件序列：大量 1~4 字符的细碎增量。"""
+    deltas = ["思", "考", " the", " next", " step", ",", " 然后", "\n"]
+    events = [StreamEvent("thinking", deltas[i % len(deltas)]) for i in range(thinking_tokens)]
+    events += [StreamEvent("content", deltas[i % len(deltas)]) for i in range(content_tokens)]
+
+    for index in range(tool_calls):
+        body = json.dumps({"path": f"file_{index}.txt", "content": "x" * argument_chars})
+        events.append(StreamEvent("tool_call", {
+            "index": index,
+            "id": f"call_{index}",
+            "function": {"name": "write_file", "arguments": ""},
+        }))
+        for start in range(0, len(body), 3):
+            events.append(StreamEvent("tool_call", {
+                "index": index,
+                "id": "",
+                "function": {"name": "", "arguments": body[start:start + 3]},
+            }))
+
+    events.append(StreamEvent("finish", "tool_calls"))
+    return events
+
+
+def load_record(path: str) -> List[StreamEvent]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [StreamEvent(item["event_type"], item["data"]) for item in map(json.loads, f) if item]
+
+
+def save_record(path: str, events: List[StreamEvent]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps({"event_type": event.event_type, "data": event.data}, ensure_ascii=False))
+            f.write("\n")
+
+
+def replay(handler_cls, events: List[StreamEvent], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        handler = handler_cls(_NullFrontend())
+        for event in events:
+            handler.handle_stream_event(event)
+        handler.get_result()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--record", help="回放的 JSONL 事件文件")
+    parser.add_argument("--save", help="将合成的事件流保存到该文件")
+    parser.add_argument("--thinking-tokens", type=int, default=30000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    events = load_record(args.record) if args.record else synthesize_stream(args.thinking_tokens)
+    if args.save:
+        save_record(args.save, events)
+
+    print(f"事件数: {len(events)}")
+    for label, handler_cls in (("str +=", _ConcatHandler), ("分块缓冲", StreamResponseHandler)):
+        print(f"{label:>8}: {replay(handler_cls, events, args.repeat) * 1000:8.2f} ms (最优 / {args.repeat} 次)")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,13 @@ __version__ = "1.0.0"
 __author__ = "Guilimao"
 __email__ = "guilimao@foxmail.com"
 
-from .llm_adapter import UnifiedLLMClient
-
 __all__ = ["UnifiedLLMClient"]
+
+
+def __getattr__(name):
+    # 延迟导入：`import pyagent` 不应加载 LLM 适配器及其依赖
+    if name == "UnifiedLLMClient":
+        from .llm_adapter import UnifiedLLMClient
+
+        return UnifiedLLMClient
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,19 +1,29 @@
+from concurrent.futures import CancelledError, Future
 from datetime import datetime
 import os
 import shutil
+import sys
 import tempfile
-
-import json_repair
+import uuid
+from typing import TYPE_CHECKING
 
 from . import conversation_saver
-from .conversation_manager import ConversationManager, StreamResponseHandler
+from .conversation_manager import (
+    DEFAULT_CONTEXT_TOKEN_BUDGET,
+    ConversationManager,
+    StreamResponseHandler,
+)
 from .frontends import FrontendInterface
 from .frontends.image_handler import ImageHandler
 from .llm_adapter import UnifiedLLMClient
 from .token_counter import TokenCounter
-from .tools import TOOL_FUNCTIONS, TOOLS
-from .tools.browser_manager import cleanup_browser
-from .tools.web_browser import build_overflow_message
+from .tool_executor import MAX_PARALLEL_TOOL_CALLS, THREAD_AFFINE_TOOLS, ToolCallExecutor
+from .tools import TOOL_REGISTRY, TOOLS
+from .tools.cmdline import ShellSession, activate_shell_session, deactivate_shell_session
+from .tools.command_jobs import JobTable, activate_job_table, deactivate_job_table
+
+if TYPE_CHECKING:
+    from .tools.browser_manager import BrowserPool
 
 
 class Agent:
@@ -24,22 +34,47 @@ class Agent:
         system_prompt: str,
         model_name: str,
         model_parameters: list = None,
+        context_token_budget: int | None = None,
+        tokenizer: dict | str | None = None,
+        session_id: str | None = None,
+        browser_pool: "BrowserPool | None" = None,
+        persistent_shell: bool = False,
     ):
         self.client = client
         self.frontend = frontend
         self.conversation_manager = ConversationManager(system_prompt)
         self.model_name = model_name
         self.model_parameters = model_parameters or []
+        # 估算上下文超过该 token 预算时自动压缩；<= 0 表示关闭。
+        self.context_token_budget = (
+            DEFAULT_CONTEXT_TOKEN_BUDGET
+            if context_token_budget is None
+            else context_token_budget
+        )
 
         # 会话级临时文件统一托管，退出时一起清理。
         self._temp_dir: str | None = None
         self._temp_files: list[str] = []
 
-        self.token_counter = TokenCounter(model_name)
+        # tokenizer 为模型配置中的分词后端设置，未配置时使用启发式计数
+        self.token_counter = TokenCounter(model_name, tokenizer=tokenizer)
         self.token_counter.set_initial_tokens(system_prompt, TOOLS)
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.session_id = f"conversation_{timestamp}"
+        if session_id is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            # 随机后缀避免同一秒内启动的多个 Agent 写入同一个会话
+            session_id = f"conversation_{timestamp}_{uuid.uuid4().hex}"
+        self.session_id = session_id
+        self._system_message_saved = False
+
+        # 多会话服务中共享浏览器池：本会话使用独立的 context，浏览器操作在池线程上执行
+        self._browser_pool = browser_pool
+        self._browser_session = browser_pool.create_session() if browser_pool else None
+
+        # 持久 shell 模式：本会话的 execute_command 复用同一个 bash 进程
+        self._shell_session = ShellSession() if persistent_shell else None
+        # 本会话的后台命令任务，会话结束时终止仍在运行的任务
+        self._job_table = JobTable()
 
     def _ensure_temp_dir(self) -> str:
         """确保会话专属临时目录存在。"""
@@ -70,15 +105,36 @@ class Agent:
         self._temp_files.append(path)
         return path
 
+    def _cleanup_browser(self) -> None:
+        """清理本会话的浏览器资源（共享浏览器池中只关闭本会话的 context）。"""
+        if self._browser_pool is not None:
+            self._browser_pool.close_session(self._browser_session)
+            return
+
+        # 浏览器模块只在 browser_use 首次调用时加载，未加载说明没有需要清理的资源
+        browser_manager = sys.modules.get(f"{__package__}.tools.browser_manager")
+        if browser_manager is not None:
+            browser_manager.cleanup_browser()
+
+    def _affine_runner(self):
+        """共享浏览器池时返回在池线程上执行绑定线程工具的函数。"""
+        if self._browser_pool is None:
+            return None
+        return lambda tool_func, kwargs: self._browser_pool.run(
+            self._browser_session, tool_func, **kwargs
+        )
+
     def _cleanup_temp_files(self) -> None:
         """清理会话托管的临时文件以及浏览器资源。"""
-        cleanup_browser()
+        self._cleanup_browser()
         if self._temp_dir and os.path.isdir(self._temp_dir):
             shutil.rmtree(self._temp_dir, ignore_errors=True)
             self._temp_dir = None
             self._temp_files.clear()
 
     def run(self):
+        shell_token = activate_shell_session(self._shell_session) if self._shell_session else None
+        jobs_token = activate_job_table(self._job_table)
         try:
             self.frontend.start_session()
 
@@ -94,15 +150,18 @@ class Agent:
 
                 self.conversation_manager.add_user_message(clean_text, content_parts)
 
-                if len(self.conversation_manager.get_messages_for_sdk()) == 2:
+                # 系统消息在第一条用户输入时保存一次（clear() 后不再重复写入同一序号）
+                if not self._system_message_saved:
                     system_message = self.conversation_manager.get_system_message()
                     if system_message:
-                        conversation_saver.save_conversation([system_message], self.session_id)
+                        conversation_saver.append_message(
+                            system_message,
+                            self.session_id,
+                            self.conversation_manager.messages[0].seq,
+                        )
+                    self._system_message_saved = True
 
-                conversation_saver.save_conversation(
-                    [self.conversation_manager.get_last_message()],
-                    self.session_id,
-                )
+                self._save_last_message()
 
                 # 开始新一轮统计，用户输入使用兜底计数；provider 用量在 LLM 响应后补充。
                 self.token_counter.start_new_round(clean_text)
@@ -113,14 +172,24 @@ class Agent:
                 self._process_conversation_round()
 
                 # 每轮结束后主动清理浏览器事件循环状态。
-                cleanup_browser()
+                self._cleanup_browser()
 
         except KeyboardInterrupt:
             self.frontend.output("warning", "\n⚠️  用户中断，正在退出...")
         except Exception as e:
             self.frontend.output("error", f"发生错误: {str(e)}")
         finally:
+            deactivate_job_table(jobs_token)
+            self._job_table.close()
+            if shell_token is not None:
+                deactivate_shell_session(shell_token)
+                self._shell_session.close()
             self._cleanup_temp_files()
+            # 会话结束前确保写后队列中的消息全部落盘，并报告写入失败的消息。
+            try:
+                conversation_saver.flush(self.session_id)
+            except conversation_saver.ConversationSaveError as e:
+                self.frontend.output("error", f"对话记录保存失败: {e}")
             self.frontend.end_session()
 
     def _process_conversation_round(self):
@@ -131,87 +200,129 @@ class Agent:
             # 兜底估算：当前完整上下文的 token 数。
             context_window_tokens = self.token_counter.calculate_conversation_tokens(messages)
 
+            if context_window_tokens > self.context_token_budget > 0:
+                compaction = self.conversation_manager.compact_context(
+                    self.token_counter, self.context_token_budget
+                )
+                if compaction:
+                    messages = self.conversation_manager.get_messages_for_sdk()
+                    context_window_tokens = compaction["context_tokens"]
+                    self.frontend.output(
+                        "info",
+                        f"📊 上下文已自动压缩: 精简 {compaction['elided_messages']} 条, "
+                        f"省略 {compaction['dropped_messages']} 条, "
+                        f"当前约 {context_window_tokens} tokens",
+                    )
+
             api_params = self._build_api_params(messages)
-            stream = self.client.chat_completions_create_with_events(**api_params)
-            stream_handler = StreamResponseHandler(self.frontend)
 
-            provider_usage = None
-            for event in stream:
-                if event.event_type == "usage":
-                    provider_usage = event.data
-                    continue
-                stream_handler.handle_stream_event(event)
+            # 参数已完整的工具调用在流式生成其余内容时即提交执行，
+            # 结果仍在流结束后按 tool_calls 原始顺序写入会话。
+            with ToolCallExecutor(affine_runner=self._affine_runner()) as executor:
+                dispatched: dict = {}
+
+                def on_tool_call_ready(tool_call: dict, function_args: dict) -> None:
+                    # 绑定调用线程的工具若在此执行会阻塞流的读取，留到流结束后处理
+                    if (
+                        tool_call["function"]["name"] in THREAD_AFFINE_TOOLS
+                        and self._browser_pool is None
+                    ):
+                        return
+                    # 参数展示与警告留到流结束后输出，避免与流式内容交错
+                    notices: list = []
+                    dispatched[tool_call["id"]] = (
+                        self._submit_tool_call(executor, tool_call, function_args, notices),
+                        notices,
+                    )
 
-            result = stream_handler.get_result()
+                stream = self.client.chat_completions_create_with_events(**api_params)
+                stream_handler = StreamResponseHandler(
+                    self.frontend, on_tool_call_ready=on_tool_call_ready
+                )
 
-            fallback_output_tokens = self.token_counter.count_assistant_output(
-                result["thinking"],
-                result["content"],
-                result["tool_calls"],
-            )
+                provider_usage = None
+                for event in stream:
+                    if event.event_type == "usage":
+                        provider_usage = event.data
+                        continue
+                    stream_handler.handle_stream_event(event)
+                # 流结束后立即显示前端合并缓冲中剩余的增量
+                self.frontend.flush()
+
+                result = stream_handler.get_result()
+                self._record_api_usage(result, provider_usage, context_window_tokens)
+
+                self.conversation_manager.add_assistant_message(
+                    result["content"],
+                    result["thinking"],
+                    result["tool_calls"],
+                )
+                self._save_last_message()
 
-            usage_info = (
-                self.token_counter.extract_provider_usage(provider_usage)
-                if provider_usage is not None
-                else {}
-            )
-            prompt_tokens = usage_info.get("prompt_tokens")
-            completion_tokens = usage_info.get("completion_tokens")
-            total_tokens = usage_info.get("total_tokens")
+                if result["has_tool_calls"]:
+                    # 没有提前派发的调用时沿用按调用数创建的执行器（单个调用在当前线程执行）
+                    self._execute_tool_calls(
+                        result["tool_calls"], executor if dispatched else None, dispatched
+                    )
 
-            # 优先使用 provider 返回的 prompt/completion；不完整时回退到本地估算。
-            has_full_provider_usage = (
-                prompt_tokens is not None and completion_tokens is not None
-            )
-            if has_full_provider_usage:
-                self.token_counter.add_api_usage(
-                    prompt_tokens, completion_tokens, from_provider=True
-                )
-            elif (
-                prompt_tokens is not None
-                and completion_tokens is None
-                and total_tokens is not None
-            ):
-                self.token_counter.add_api_usage(
-                    prompt_tokens,
-                    total_tokens - prompt_tokens,
-                    from_provider=True,
-                )
-            elif (
-                completion_tokens is not None
-                and prompt_tokens is None
-                and total_tokens is not None
-            ):
-                self.token_counter.add_api_usage(
-                    total_tokens - completion_tokens,
-                    completion_tokens,
-                    from_provider=True,
-                )
-            else:
-                self.token_counter.add_api_usage(
-                    context_window_tokens, fallback_output_tokens
-                )
+            if not result["has_tool_calls"]:
+                self.token_counter.finish_round()
+                break
 
-            self._show_context_stats(context_window_tokens)
-            self._show_response_stats(
-                self.token_counter.current_round_stats["llm_output_tokens"]
-            )
+    def _record_api_usage(self, result: dict, provider_usage, context_window_tokens: int) -> None:
+        """累计本次 LLM 调用的 token 用量并输出统计。"""
+        fallback_output_tokens = self.token_counter.count_assistant_output(
+            result["thinking"],
+            result["content"],
+            result["tool_calls"],
+        )
 
-            self.conversation_manager.add_assistant_message(
-                result["content"],
-                result["thinking"],
-                result["tool_calls"],
+        usage_info = (
+            self.token_counter.extract_provider_usage(provider_usage)
+            if provider_usage is not None
+            else {}
+        )
+        prompt_tokens = usage_info.get("prompt_tokens")
+        completion_tokens = usage_info.get("completion_tokens")
+        total_tokens = usage_info.get("total_tokens")
+
+        # 优先使用 provider 返回的 prompt/completion；不完整时回退到本地估算。
+        has_full_provider_usage = (
+            prompt_tokens is not None and completion_tokens is not None
+        )
+        if has_full_provider_usage:
+            self.token_counter.add_api_usage(
+                prompt_tokens, completion_tokens, from_provider=True
             )
-            conversation_saver.save_conversation(
-                [self.conversation_manager.get_last_message()],
-                self.session_id,
+        elif (
+            prompt_tokens is not None
+            and completion_tokens is None
+            and total_tokens is not None
+        ):
+            self.token_counter.add_api_usage(
+                prompt_tokens,
+                total_tokens - prompt_tokens,
+                from_provider=True,
+            )
+        elif (
+            completion_tokens is not None
+            and prompt_tokens is None
+            and total_tokens is not None
+        ):
+            self.token_counter.add_api_usage(
+                total_tokens - completion_tokens,
+                completion_tokens,
+                from_provider=True,
+            )
+        else:
+            self.token_counter.add_api_usage(
+                context_window_tokens, fallback_output_tokens
             )
 
-            if result["has_tool_calls"]:
-                self._execute_tool_calls(result["tool_calls"])
-            else:
-                self.token_counter.finish_round()
-                break
+        self._show_context_stats(context_window_tokens)
+        self._show_response_stats(
+            self.token_counter.current_round_stats["llm_output_tokens"]
+        )
 
     def _build_api_params(self, messages: list) -> dict:
         api_params = {
@@ -251,9 +362,10 @@ class Agent:
             f"📊 输出token总量: {self.token_counter.total_stats['total_output_tokens']} tokens",
         )
 
-    def _display_tool_params(self, function_name: str, function_args: dict) -> None:
+    def _display_tool_params(self, function_name: str, function_args: dict, output=None) -> None:
+        output = output or self.frontend.output
         if not function_args:
-            self.frontend.output("tool_progress", "    参数: (无)\n")
+            output("tool_progress", "    参数: (无)\n")
             return
 
         param_lines = []
@@ -262,16 +374,55 @@ class Agent:
             param_lines.append(f"    • {key}: {value_str}")
 
         params_text = "\n".join(param_lines)
-        self.frontend.output("tool_progress", f"    参数:\n{params_text}\n")
+        output("tool_progress", f"    参数:\n{params_text}\n")
+
+    def _save_last_message(self) -> None:
+        # 只追加刚加入的消息，以会话内序号为键，无需先查询数据库。
+        conversation_saver.append_message(
+            self.conversation_manager.get_last_message(),
+            self.session_id,
+            self.conversation_manager.get_last_message_seq(),
+        )
+
+    def _execute_tool_calls(
+        self,
+        tool_calls: list,
+        executor: ToolCallExecutor | None = None,
+        dispatched: dict | None = None,
+    ) -> None:
+        """执行一轮工具调用，并按原始顺序记录结果。
+
+        dispatched 为流式阶段已提前提交的调用（tool_call_id -> (待收集项, 待输出的提示)），
+        这些调用不会重复执行；其余调用在此解析参数后提交到 executor。
+
+        等待结果时按 Ctrl+C 会终止工作线程中正在执行的命令并取消未开始的调用，
+        已取消的结果照常写入会话；再次按 Ctrl+C 则向上抛出。
+        """
+        if executor is None:
+            with ToolCallExecutor(
+                max_workers=min(len(tool_calls), MAX_PARALLEL_TOOL_CALLS),
+                affine_runner=self._affine_runner(),
+            ) as own:
+                self._execute_tool_calls(tool_calls, own, dispatched)
+            return
 
-    def _execute_tool_calls(self, tool_calls: list) -> None:
+        dispatched = dispatched or {}
         self.frontend.output("info", "\n工具参数接收完成，开始执行...")
 
+        # 先按顺序解析参数并提交执行，再按原始顺序收集结果写入会话。
+        # 相互独立的调用并发执行；写同一文件的调用由调度器按顺序串行。
+        pending = []
         for tool_call in tool_calls:
-            function_name = tool_call["function"]["name"]
-            tool_call_id = tool_call["id"]
+            if tool_call["id"] in dispatched:
+                entry, notices = dispatched[tool_call["id"]]
+                for kind, text in notices:
+                    self.frontend.output(kind, text)
+                pending.append(entry)
+                continue
 
             try:
+                import json_repair
+
                 function_args = json_repair.loads(tool_call["function"]["arguments"])
             except Exception as e:
                 self.frontend.output(
@@ -280,157 +431,176 @@ class Agent:
                 )
                 continue
 
-            if function_name not in TOOL_FUNCTIONS:
-                error_msg = (
-                    f"工具 '{function_name}' 不存在。"
-                    f"请检查可用工具列表，使用存在的工具重新尝试。"
-                )
-                self.frontend.output("error", f"❌ 未找到工具函数：{function_name}")
-                self.conversation_manager.add_tool_result(
-                    tool_call_id, f"[错误] {error_msg}"
-                )
-                conversation_saver.save_conversation(
-                    [self.conversation_manager.get_last_message()],
-                    self.session_id,
-                )
-                self.token_counter.add_tool_result(error_msg)
-                self.frontend.output(
-                    "info",
-                    f"📊 工具返回token量: {self.token_counter.count_tokens(error_msg)}",
-                )
+            pending.append(self._submit_tool_call(executor, tool_call, function_args))
+
+        interrupted = False
+        for tool_call_id, function_name, future in pending:
+            if future is None:
+                self._record_missing_tool(tool_call_id, function_name)
                 continue
 
-            try:
-                self._display_tool_params(function_name, function_args)
+            while True:
+                try:
+                    response = future.result()
+                except KeyboardInterrupt:
+                    # 工作线程中的命令收不到 Ctrl+C，由执行器终止
+                    if interrupted:
+                        raise
+                    interrupted = True
+                    executor.interrupt()
+                    self.frontend.output("warning", "\n⚠️  用户中断，已终止正在执行的命令")
+                    continue
+                except CancelledError:
+                    self._record_tool_failure(
+                        tool_call_id, function_name, RuntimeError("用户中断，调用未执行")
+                    )
+                except Exception as e:
+                    self._record_tool_failure(tool_call_id, function_name, e)
+                else:
+                    self._record_tool_response(tool_call_id, response)
+                break
 
-                import inspect
+        self.frontend.output(
+            "info",
+            f"📊 本轮工具返回累计: {self.token_counter.current_round_stats['tool_result_tokens']} tokens",
+        )
 
-                tool_func = TOOL_FUNCTIONS[function_name]
-                sig = inspect.signature(tool_func)
-                valid_params = list(sig.parameters.keys())
-                filtered_args = {k: v for k, v in function_args.items() if k in valid_params}
+    def _submit_tool_call(
+        self,
+        executor: ToolCallExecutor,
+        tool_call: dict,
+        function_args: dict,
+        notices: list | None = None,
+    ) -> tuple:
+        """提交一次参数已解析的工具调用，返回 (tool_call_id, function_name, future)。
+
+        工具不存在时 future 为 None；参数处理出错时 future 携带该异常。
+        notices 不为 None 时，参数展示与警告以 (类型, 文本) 追加到其中，由调用方稍后输出。
+        """
+        function_name = tool_call["function"]["name"]
+        tool_call_id = tool_call["id"]
+        output = self.frontend.output if notices is None else lambda kind, text: notices.append((kind, text))
+
+        spec = TOOL_REGISTRY.get(function_name)
+        if spec is None:
+            output("error", f"❌ 未找到工具函数：{function_name}")
+            return tool_call_id, function_name, None
 
-                ignored_params = set(function_args.keys()) - set(filtered_args.keys())
-                if ignored_params:
-                    self.frontend.output(
-                        "warning",
-                        f"⚠️  工具 '{function_name}' 忽略了不支持的参数: {ignored_params}",
-                    )
+        try:
+            if not isinstance(function_args, dict):
+                raise ValueError(f"工具参数需为 JSON 对象，实际为 {type(function_args).__name__}")
+            self._display_tool_params(function_name, function_args, output)
 
-                function_response = tool_func(**filtered_args)
-
-                if (
-                    isinstance(function_response, dict)
-                    and function_response.get("type") == "image"
-                ):
-                    image_data = function_response.get("data", "")
-                    filename = function_response.get("filename", "image")
-                    mime_type = function_response.get("mime_type", "image/jpeg")
-                    size = function_response.get("size", 0)
-                    text_content = f"图像文件: {filename} ({mime_type}, {size} bytes)"
-
-                    self.conversation_manager.add_tool_result_with_image(
-                        tool_call_id,
-                        text_content,
-                        image_data,
-                    )
-                    conversation_saver.save_conversation(
-                        [self.conversation_manager.get_last_message()],
-                        self.session_id,
-                    )
+            filtered_args = {k: v for k, v in function_args.items() if k in spec.parameters}
 
-                    self.frontend.output("tool_result", f"[图像] {text_content}")
-                    self.frontend.output("info", "📊 图像已添加到对话上下文")
+            ignored_params = function_args.keys() - filtered_args.keys()
+            if ignored_params:
+                output(
+                    "warning",
+                    f"⚠️  工具 '{function_name}' 忽略了不支持的参数: {ignored_params}",
+                )
 
-                    self.token_counter.add_tool_result(text_content)
-                    self.frontend.output(
-                        "info",
-                        f"📊 工具返回token量: {self.token_counter.count_tokens(text_content)}",
-                    )
-                    continue
+            # 在提交执行前拦截类型错误、缺少必填项等问题，错误信息回传给模型修正
+            errors = spec.validate(filtered_args)
+            if errors:
+                raise ValueError("参数校验失败：" + "；".join(errors))
 
-                if (
-                    isinstance(function_response, dict)
-                    and function_response.get("type") == "error"
-                ):
-                    error_message = function_response.get("message", "未知错误")
-                    self.conversation_manager.add_tool_result(
-                        tool_call_id,
-                        f"[错误] {error_message}",
-                    )
-                    conversation_saver.save_conversation(
-                        [self.conversation_manager.get_last_message()],
-                        self.session_id,
-                    )
+            future = executor.submit(function_name, spec.func, filtered_args)
+        except Exception as e:
+            future = Future()
+            future.set_exception(e)
 
-                    self.frontend.output("tool_result", f"[错误] {error_message}")
-                    self.token_counter.add_tool_result(error_message)
-                    self.frontend.output(
-                        "info",
-                        f"📊 工具返回token量: {self.token_counter.count_tokens(error_message)}",
-                    )
-                    continue
+        return tool_call_id, function_name, future
 
-                if (
-                    isinstance(function_response, dict)
-                    and function_response.get("type") == "overflow"
-                ):
-                    content = function_response.get("content", "")
-                    url = function_response.get("url", "")
-                    title = function_response.get("title", "")
-                    source_type = function_response.get("source_type", "网页内容")
-
-                    temp_path = self._create_managed_temp_file(content, url=url)
-                    response_str = build_overflow_message(
-                        file_path=temp_path,
-                        total_chars=len(content),
-                        url=url,
-                        title=title,
-                        source_type=source_type,
-                    )
+    def _record_missing_tool(self, tool_call_id: str, function_name: str) -> None:
+        error_msg = (
+            f"工具 '{function_name}' 不存在。"
+            f"请检查可用工具列表，使用存在的工具重新尝试。"
+        )
+        self.conversation_manager.add_tool_result(tool_call_id, f"[错误] {error_msg}")
+        self._save_last_message()
+        self.token_counter.add_tool_result(error_msg)
+        self.frontend.output(
+            "info",
+            f"📊 工具返回token量: {self.token_counter.count_tokens(error_msg)}",
+        )
 
-                    self.conversation_manager.add_tool_result(tool_call_id, response_str)
-                    conversation_saver.save_conversation(
-                        [self.conversation_manager.get_last_message()],
-                        self.session_id,
-                    )
+    def _record_tool_failure(self, tool_call_id: str, function_name: str, error: Exception) -> None:
+        self.frontend.output("error", f"❌ 工具执行失败：{function_name} - {str(error)}")
+        self.conversation_manager.add_tool_result(tool_call_id, f"[错误] {str(error)}")
+        self._save_last_message()
+        self.token_counter.add_tool_result(str(error))
+        self.frontend.output(
+            "info",
+            f"📊 工具返回token量: {self.token_counter.count_tokens(str(error))}",
+        )
 
-                    self.frontend.output("tool_result", response_str)
-                    self.token_counter.add_tool_result(response_str)
-                    self.frontend.output(
-                        "info",
-                        f"📊 工具返回token量: {self.token_counter.count_tokens(response_str)}",
-                    )
-                    continue
+    def _record_tool_response(self, tool_call_id: str, function_response) -> None:
+        if isinstance(function_response, dict) and function_response.get("type") == "image":
+            image_data = function_response.get("data", "")
+            filename = function_response.get("filename", "image")
+            mime_type = function_response.get("mime_type", "image/jpeg")
+            size = function_response.get("size", 0)
+            text_content = f"图像文件: {filename} ({mime_type}, {size} bytes)"
+
+            self.conversation_manager.add_tool_result_with_image(
+                tool_call_id,
+                text_content,
+                image_data,
+            )
+            self._save_last_message()
 
-                response_str = str(function_response)
-                self.conversation_manager.add_tool_result(tool_call_id, response_str)
-                conversation_saver.save_conversation(
-                    [self.conversation_manager.get_last_message()],
-                    self.session_id,
-                )
+            self.frontend.output("tool_result", f"[图像] {text_content}")
+            self.frontend.output("info", "📊 图像已添加到对话上下文")
 
-                self.frontend.output("tool_result", response_str)
-                self.token_counter.add_tool_result(response_str)
-                self.frontend.output(
-                    "info",
-                    f"📊 工具返回token量: {self.token_counter.count_tokens(response_str)}",
-                )
+            self.token_counter.add_tool_result(text_content)
+            self.frontend.output(
+                "info",
+                f"📊 工具返回token量: {self.token_counter.count_tokens(text_content)}",
+            )
+            return
 
-            except Exception as e:
-                self.frontend.output("error", f"❌ 工具执行失败：{function_name} - {str(e)}")
-                self.conversation_manager.add_tool_result(tool_call_id, f"[错误] {str(e)}")
-                conversation_saver.save_conversation(
-                    [self.conversation_manager.get_last_message()],
-                    self.session_id,
-                )
-                self.token_counter.add_tool_result(str(e))
-                self.frontend.output(
-                    "info",
-                    f"📊 工具返回token量: {self.token_counter.count_tokens(str(e))}",
-                )
+        if isinstance(function_response, dict) and function_response.get("type") == "error":
+            error_message = function_response.get("message", "未知错误")
+            self.conversation_manager.add_tool_result(
+                tool_call_id,
+                f"[错误] {error_message}",
+            )
+            self._save_last_message()
 
+            self.frontend.output("tool_result", f"[错误] {error_message}")
+            self.token_counter.add_tool_result(error_message)
+            self.frontend.output(
+                "info",
+                f"📊 工具返回token量: {self.token_counter.count_tokens(error_message)}",
+            )
+            return
+
+        if isinstance(function_response, dict) and function_response.get("type") == "overflow":
+            content = function_response.get("content", "")
+            url = function_response.get("url", "")
+            title = function_response.get("title", "")
+            source_type = function_response.get("source_type", "网页内容")
+
+            from .tools.web_browser import build_overflow_message
+
+            temp_path = self._create_managed_temp_file(content, url=url)
+            response_str = build_overflow_message(
+                file_path=temp_path,
+                total_chars=len(content),
+                url=url,
+                title=title,
+                source_type=source_type,
+            )
+        else:
+            response_str = str(function_response)
+
+        self.conversation_manager.add_tool_result(tool_call_id, response_str)
+        self._save_last_message()
+
+        self.frontend.output("tool_result", response_str)
+        self.token_counter.add_tool_result(response_str)
         self.frontend.output(
             "info",
-            f"📊 本轮工具返回累计: {self.token_counter.current_round_stats['tool_result_tokens']} tokens",
+            f"📊 工具返回token量: {self.token_counter.count_tokens(response_str)}",
         )
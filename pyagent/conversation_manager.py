@@ -2,10 +2,23 @@
 Conversation state and stream event handling.
 """
 
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
+
+from .streaming_json import JSONObjectScanner, parse_complete_object
+
+# Automatic context compaction. Budgets are in estimated tokens as reported
+# by TokenCounter; a budget <= 0 disables compaction.
+DEFAULT_CONTEXT_TOKEN_BUDGET = 100_000
+# The most recent rounds are never elided.
+COMPACT_KEEP_RECENT_ROUNDS = 2
+# Older tool outputs longer than this many characters are cut down to a stub.
+COMPACT_TOOL_OUTPUT_CHARS = 2000
+COMPACT_TOOL_OUTPUT_HEAD_CHARS = 500
+
+ELIDED_IMAGE_TEXT = "[旧图像已省略以节省上下文]"
 
 
 class MessageRole(Enum):
@@ -24,6 +37,9 @@ class Message:
     tool_call_id: Optional[str] = None
     thinking: Optional[str] = None
     timestamp: Optional[str] = None
+    # Monotonically increasing per-session sequence number, used as the
+    # append key when persisting. Not part of the stored/SDK dict format.
+    seq: Optional[int] = None
 
     def _base_dict(self) -> Dict[str, Any]:
         result = {"role": self.role.value}
@@ -79,11 +95,25 @@ class StreamEvent:
 class ConversationManager:
     def __init__(self, system_prompt: str):
         self.messages: List[Message] = []
+        # SDK-ready dicts, built once per message and kept parallel to
+        # self.messages. Rebuilt only when the history is rewritten.
+        self._sdk_messages: List[Dict[str, Any]] = []
         self.system_prompt = system_prompt
+        self._next_seq = 0
+        # Messages removed by compact_context so far (for the placeholder text).
+        self._dropped_message_count = 0
         self._add_system_message(system_prompt)
 
+    def _append(self, message: Message):
+        # Sequence numbers keep growing across clear(), so persisted
+        # (session_id, seq) keys are never reused within a session.
+        message.seq = self._next_seq
+        self._next_seq += 1
+        self.messages.append(message)
+        self._sdk_messages.append(message.to_sdk_dict())
+
     def _add_system_message(self, content: str):
-        self.messages.append(
+        self._append(
             Message(
                 role=MessageRole.SYSTEM,
                 content=content,
@@ -93,7 +123,7 @@ class ConversationManager:
 
     def add_user_message(self, content: str, content_parts: Optional[List[Dict[str, Any]]] = None):
         if content_parts:
-            self.messages.append(
+            self._append(
                 Message(
                     role=MessageRole.USER,
                     content_parts=content_parts,
@@ -101,7 +131,7 @@ class ConversationManager:
                 )
             )
         else:
-            self.messages.append(
+            self._append(
                 Message(
                     role=MessageRole.USER,
                     content=content,
@@ -120,7 +150,7 @@ class ConversationManager:
         if thinking is None:
             thinking = ""
 
-        self.messages.append(
+        self._append(
             Message(
                 role=MessageRole.ASSISTANT,
                 content=content,
@@ -131,7 +161,7 @@ class ConversationManager:
         )
 
     def add_tool_result(self, tool_call_id: str, content: str):
-        self.messages.append(
+        self._append(
             Message(
                 role=MessageRole.TOOL,
                 content=content,
@@ -153,7 +183,7 @@ class ConversationManager:
             }
         )
 
-        self.messages.append(
+        self._append(
             Message(
                 role=MessageRole.TOOL,
                 content_parts=content_parts,
@@ -163,13 +193,23 @@ class ConversationManager:
         )
 
     def get_messages_for_sdk(self) -> List[Dict[str, Any]]:
-        return [msg.to_sdk_dict() for msg in self.messages]
+        # Shallow copy: callers may reorder the list, but the cached dicts
+        # themselves are shared and must be treated as read-only.
+        return list(self._sdk_messages)
+
+    def __len__(self) -> int:
+        return len(self.messages)
 
     def get_last_message(self) -> Optional[Dict[str, Any]]:
         if not self.messages:
             return None
         return self.messages[-1].to_dict()
 
+    def get_last_message_seq(self) -> Optional[int]:
+        if not self.messages:
+            return None
+        return self.messages[-1].seq
+
     def get_system_message(self) -> Optional[Dict[str, Any]]:
         if not self.messages:
             return None
@@ -186,22 +226,188 @@ class ConversationManager:
     def get_recent_messages(self, count: int) -> List[Message]:
         return self.messages[-count:] if len(self.messages) > count else self.messages
 
+    def _round_starts(self) -> List[int]:
+        """Indices of user messages, i.e. where each conversation round begins."""
+        return [
+            i for i, msg in enumerate(self.messages)
+            if i > 0 and msg.role == MessageRole.USER and msg.seq is not None
+        ]
+
+    def _block_starts(self) -> List[int]:
+        """Indices where history may be cut without orphaning tool results.
+
+        A block is a user message, or an assistant message together with the
+        tool results answering its tool_calls.
+        """
+        return [
+            i for i, msg in enumerate(self.messages)
+            if i > 0 and msg.seq is not None
+            and msg.role in (MessageRole.USER, MessageRole.ASSISTANT)
+        ]
+
     def compress_context(self, keep_recent_rounds: int) -> List[Dict[str, Any]]:
         if keep_recent_rounds <= 0:
             return self.get_messages_for_sdk()
 
-        system_msg = self.messages[0]
-        recent_messages = self.get_recent_messages(keep_recent_rounds * 2)
+        # Cut on round boundaries so tool_calls always travel with their results.
+        round_starts = self._round_starts()
+        if len(round_starts) <= keep_recent_rounds:
+            return self.get_messages_for_sdk()
+
+        start_index = round_starts[-keep_recent_rounds]
+        return self._sdk_messages[:1] + self._sdk_messages[start_index:]
+
+    def compact_context(self, token_counter, token_budget: int) -> Optional[Dict[str, int]]:
+        """Shrink the in-memory history until it fits token_budget.
+
+        1. Replace old images with a text stub and cut long old tool outputs
+           down to their head: first outside the last COMPACT_KEEP_RECENT_ROUNDS
+           rounds, then, if still needed, everywhere but the latest block.
+        2. If still over budget, drop the oldest blocks (see _block_starts),
+           keeping the user message of the current round, and put a single
+           placeholder user message in their place.
+
+        Only the context sent to the model changes; persisted history is not
+        touched. Returns None when nothing was changed, otherwise counts of
+        elided and dropped messages plus the new estimate.
+        """
+        if token_budget is None or token_budget <= 0:
+            return None
+
+        base_tokens = token_counter.initial_tokens["total_initial_tokens"]
+
+        def over_budget() -> bool:
+            tokens = token_counter.count_messages_tokens(self._sdk_messages)
+            return base_tokens + sum(tokens) > token_budget
+
+        if not over_budget():
+            return None
+
+        recent_rounds = self._round_starts()[-COMPACT_KEEP_RECENT_ROUNDS:]
+        block_starts = self._block_starts()
+        elide_limits = [
+            recent_rounds[0] if recent_rounds else 1,
+            block_starts[-1] if block_starts else 1,
+        ]
+
+        elided = 0
+        for limit in elide_limits:
+            elided += self._elide_before(limit)
+            if not over_budget():
+                break
+
+        dropped = 0
+        if over_budget():
+            dropped = self._drop_oldest_blocks(token_counter, token_budget - base_tokens)
+
+        if elided == 0 and dropped == 0:
+            return None
+
+        return {
+            "elided_messages": elided,
+            "dropped_messages": dropped,
+            "context_tokens": token_counter.calculate_conversation_tokens(self._sdk_messages),
+        }
+
+    def _elide_before(self, limit: int) -> int:
+        elided = 0
+        for i in range(1, limit):
+            compacted = self._elide_message(self.messages[i])
+            if compacted is not None:
+                self.messages[i] = compacted
+                self._sdk_messages[i] = compacted.to_sdk_dict()
+                elided += 1
+        return elided
+
+    def _drop_oldest_blocks(self, token_counter, message_budget: int) -> int:
+        block_starts = self._block_starts()
+        if len(block_starts) < 2:
+            return 0
+
+        round_starts = self._round_starts()
+        pinned = round_starts[-1] if round_starts else None
+        tokens = token_counter.count_messages_tokens(self._sdk_messages)
+        total = sum(tokens)
+
+        # Smallest cut that fits; never cut past the latest block.
+        first = block_starts[0]
+        cut_index = block_starts[-1]
+        for candidate in block_starts[1:]:
+            removed = sum(tokens[first:candidate])
+            if pinned is not None and first <= pinned < candidate:
+                removed -= tokens[pinned]
+            if total - removed <= message_budget:
+                cut_index = candidate
+                break
+
+        kept = [pinned] if pinned is not None and pinned < cut_index else []
+        dropped = [
+            i for i in range(1, cut_index)
+            if i not in kept and self.messages[i].seq is not None
+        ]
+        if not dropped:
+            return 0
+
+        self._dropped_message_count += len(dropped)
+        placeholder = Message(
+            role=MessageRole.USER,
+            content=(
+                f"[上下文已自动压缩：为控制上下文长度，"
+                f"省略了较早的 {self._dropped_message_count} 条消息]"
+            ),
+            timestamp=datetime.now().isoformat(),
+        )
+        # The placeholder has no seq, so it is never persisted and is replaced
+        # (not counted) by the next compaction.
+        self.messages = (
+            [self.messages[0], placeholder]
+            + [self.messages[i] for i in kept]
+            + self.messages[cut_index:]
+        )
+        self._sdk_messages = (
+            [self._sdk_messages[0], placeholder.to_sdk_dict()]
+            + [self._sdk_messages[i] for i in kept]
+            + self._sdk_messages[cut_index:]
+        )
+        return len(dropped)
+
+    @staticmethod
+    def _elide_message(message: Message) -> Optional[Message]:
+        """Return a slimmer copy of message, or None if nothing can be elided."""
+        changed = False
+        content = message.content
+        content_parts = message.content_parts
 
-        compressed = [system_msg]
-        for msg in recent_messages:
-            if msg not in compressed:
-                compressed.append(msg)
+        if content_parts:
+            new_parts = []
+            for part in content_parts:
+                if isinstance(part, dict) and part.get("type") == "image_url":
+                    new_parts.append({"type": "text", "text": ELIDED_IMAGE_TEXT})
+                    changed = True
+                else:
+                    new_parts.append(part)
+            content_parts = new_parts
+
+        if (
+            message.role == MessageRole.TOOL
+            and isinstance(content, str)
+            and len(content) > COMPACT_TOOL_OUTPUT_CHARS
+        ):
+            omitted = len(content) - COMPACT_TOOL_OUTPUT_HEAD_CHARS
+            content = (
+                content[:COMPACT_TOOL_OUTPUT_HEAD_CHARS]
+                + f"\n...[旧工具输出已省略 {omitted} 字符以节省上下文]"
+            )
+            changed = True
 
-        return [msg.to_sdk_dict() for msg in compressed]
+        if not changed:
+            return None
+        return replace(message, content=content, content_parts=content_parts)
 
     def clear(self):
         self.messages = [self.messages[0]]
+        self._sdk_messages = self._sdk_messages[:1]
+        self._dropped_message_count = 0
 
     def get_stats(self) -> Dict[str, Any]:
         return {
@@ -212,26 +418,74 @@ class ConversationManager:
         }
 
 
+class _ChunkBuffer:
+    """Accumulates streamed text fragments; joined only when the value is read."""
+
+    __slots__ = ("_chunks", "_length")
+
+    def __init__(self):
+        self._chunks: List[str] = []
+        self._length = 0
+
+    def append(self, text: str) -> int:
+        """Append a fragment and return the new total length."""
+        self._chunks.append(text)
+        self._length += len(text)
+        return self._length
+
+    def getvalue(self) -> str:
+        if len(self._chunks) > 1:
+            # Collapse so repeated reads don't join again.
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    def __len__(self) -> int:
+        return self._length
+
+
 class StreamResponseHandler:
-    def __init__(self, frontend):
+    def __init__(
+        self,
+        frontend,
+        on_tool_call_ready: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]] = None,
+    ):
         self.frontend = frontend
-        self.full_content = ""
-        self.full_thinking = ""
+        # Deltas are buffered and joined once; repeated str += is quadratic on
+        # long reasoning streams made of tiny fragments.
+        self._content = _ChunkBuffer()
+        self._thinking = _ChunkBuffer()
         self.tool_calls_cache: Dict[int, Dict[str, Any]] = {}
         self.has_received_thinking = False
         self.finish_reason = None
 
+        # Called with (tool_call, parsed_arguments) as soon as a call's arguments
+        # form a complete JSON object, while the rest of the stream is still arriving.
+        self.on_tool_call_ready = on_tool_call_ready
+        self._argument_scanners: Dict[int, JSONObjectScanner] = {}
+        self._ready_indexes: set = set()
+        # Set once a call cannot be dispatched early; later calls then wait for the
+        # end of the stream too, so calls are always dispatched in their original order.
+        self._early_dispatch_blocked = False
+
+    @property
+    def full_content(self) -> str:
+        return self._content.getvalue()
+
+    @property
+    def full_thinking(self) -> str:
+        return self._thinking.getvalue()
+
     def handle_stream_event(self, event: StreamEvent):
         if event.event_type == "thinking":
             if not self.has_received_thinking:
                 self.has_received_thinking = True
             thinking_content = event.data
-            self.full_thinking += thinking_content
+            self._thinking.append(thinking_content)
             self.frontend.output("thinking", thinking_content)
 
         elif event.event_type == "content":
             content = event.data
-            self.full_content += content
+            self._content.append(content)
             self.frontend.output("content", content)
 
         elif event.event_type == "tool_call":
@@ -259,7 +513,7 @@ class StreamResponseHandler:
         if tool_index not in self.tool_calls_cache:
             self.tool_calls_cache[tool_index] = {
                 "id": "",
-                "function": {"name": "", "arguments": ""},
+                "function": {"name": "", "arguments": _ChunkBuffer()},
             }
             if function_name:
                 self.frontend.output("tool_call", function_name)
@@ -274,18 +528,53 @@ class StreamResponseHandler:
         if function_name:
             self.tool_calls_cache[tool_index]["function"]["name"] = function_name
         if function_args:
-            self.tool_calls_cache[tool_index]["function"]["arguments"] += function_args
-            if len(self.tool_calls_cache[tool_index]["function"]["arguments"]) % 50 == 0:
+            arguments_length = self.tool_calls_cache[tool_index]["function"]["arguments"].append(
+                function_args
+            )
+            if arguments_length % 50 == 0:
                 self.frontend.output("tool_progress", ".")
 
+            if self.on_tool_call_ready is not None:
+                scanner = self._argument_scanners.setdefault(tool_index, JSONObjectScanner())
+                if scanner.feed(function_args) and tool_index not in self._ready_indexes:
+                    self._dispatch_ready_tool_calls()
+
+    def _dispatch_ready_tool_calls(self):
+        """Hand completed tool calls to on_tool_call_ready, in index order."""
+        if self._early_dispatch_blocked:
+            return
+
+        for tool_index in sorted(self.tool_calls_cache):
+            if tool_index in self._ready_indexes:
+                continue
+
+            scanner = self._argument_scanners.get(tool_index)
+            if scanner is None or not scanner.complete:
+                return
+
+            tool_call = self.tool_calls_cache[tool_index]
+            arguments = None
+            if not scanner.invalid:
+                arguments = parse_complete_object(tool_call["function"]["arguments"].getvalue())
+            if arguments is None or not tool_call["id"] or not tool_call["function"]["name"]:
+                # Leave it (and everything after it) to the end-of-stream path,
+                # which repairs malformed arguments.
+                self._early_dispatch_blocked = True
+                return
+
+            self._ready_indexes.add(tool_index)
+            self.on_tool_call_ready(self._format_tool_call(tool_call), arguments)
+
     def get_result(self) -> Dict[str, Any]:
+        content = self.full_content
+        thinking = self.full_thinking
         return {
-            "content": self.full_content,
-            "thinking": self.full_thinking,
+            "content": content,
+            "thinking": thinking,
             "tool_calls": self._get_tool_calls_list(),
             "finish_reason": self.finish_reason,
-            "has_content": bool(self.full_content),
-            "has_thinking": bool(self.full_thinking),
+            "has_content": bool(content),
+            "has_thinking": bool(thinking),
             "has_tool_calls": bool(self.tool_calls_cache),
         }
 
@@ -294,14 +583,15 @@ class StreamResponseHandler:
             return None
 
         sorted_tool_calls = sorted(self.tool_calls_cache.items(), key=lambda item: item[0])
-        return [
-            {
-                "id": tool_call["id"],
-                "type": "function",
-                "function": {
-                    "name": tool_call["function"]["name"],
-                    "arguments": tool_call["function"]["arguments"],
-                },
-            }
-            for _, tool_call in sorted_tool_calls
-        ]
+        return [self._format_tool_call(tool_call) for _, tool_call in sorted_tool_calls]
+
+    @staticmethod
+    def _format_tool_call(tool_call: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": tool_call["id"],
+            "type": "function",
+            "function": {
+                "name": tool_call["function"]["name"],
+                "arguments": tool_call["function"]["arguments"].getvalue(),
+            },
+        }
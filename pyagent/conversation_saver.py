@@ -1,127 +1,332 @@
+import atexit
+import logging
 import os
+import queue
 import sqlite3
 import json
+import threading
+import time
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
+# 写入线程攒批的最长等待时间（秒）与单批最大消息数
+FLUSH_INTERVAL = 0.05
+MAX_BATCH_SIZE = 256
+
+# 数据库结构版本（PRAGMA user_version）
+# 1: 新增 seq 列与 (session_id, seq) 唯一索引
+SCHEMA_VERSION = 1
+
+# 写入队列的结束标记
+_STOP = object()
+
+
+class ConversationSaveError(RuntimeError):
+    """后台写入失败的消息，在下一次 flush() / close() 时报告给调用方"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        sessions = sorted({session_id for session_id, _ in failures})
+        super().__init__(
+            f"{len(failures)} 组消息保存失败（会话: {', '.join(map(str, sessions))}）: {failures[-1][1]}"
+        )
+
+
 class ConversationDatabase:
     def __init__(self, db_path=None):
         if db_path is None:
             script_dir = os.path.dirname(os.path.abspath(__file__))
             db_path = os.path.join(script_dir, "conversations.db")
         self.db_path = db_path
+
+        # 进程内共享一个长连接，所有访问通过 _lock 串行化
+        self._lock = threading.RLock()
+        self._conn = None
+        self._connect()
         self.init_database()
-    
+
+        # 写后队列：save_conversation 只负责入队，由后台线程攒批提交
+        self._closed = False
+        # 写入失败的 (session_id, 异常)，由 flush() / close() 取出并抛给调用方
+        self._failures = []
+        self._failures_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(
+            target=self._writer_loop,
+            name="pyagent-db-writer",
+            daemon=True,
+        )
+        self._writer.start()
+
+    def _connect(self):
+        """打开长连接并启用 WAL，减少每次提交的 fsync 开销"""
+        self._conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            isolation_level=None,  # 手动管理事务
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+
     def init_database(self):
-        """初始化数据库表结构"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # 创建对话表 - content字段使用TEXT类型存储JSON字符串（包含base64编码的图片）
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS conversations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT,
-                role TEXT NOT NULL,
-                thinking TEXT,
-                content TEXT,  -- 存储文本或JSON字符串（包含base64图片编码）
-                tool_calls TEXT,
-                tool_call_id TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 创建索引以提高查询性能
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_session_timestamp 
-            ON conversations(session_id, timestamp)
-        ''')
-        
-        conn.commit()
-        conn.close()
-    
-
-    
+        """初始化数据库表结构，并把旧版数据库迁移到最新结构"""
+        with self._lock:
+            cursor = self._conn.cursor()
+
+            # 创建对话表 - content字段使用TEXT类型存储JSON字符串（包含base64编码的图片）
+            # seq 为会话内单调递增的消息序号，用于只追加写入和排序
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT,
+                    role TEXT NOT NULL,
+                    thinking TEXT,
+                    content TEXT,  -- 存储文本或JSON字符串（包含base64图片编码）
+                    tool_calls TEXT,
+                    tool_call_id TEXT,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    seq INTEGER
+                )
+            ''')
+
+            # 创建索引以提高查询性能
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_session_timestamp
+                ON conversations(session_id, timestamp)
+            ''')
+
+            self._migrate(cursor)
+
+            cursor.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_session_seq
+                ON conversations(session_id, seq)
+            ''')
+
+    def _migrate(self, cursor):
+        """按 PRAGMA user_version 逐级迁移旧版数据库"""
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+
+        cursor.execute("BEGIN")
+        try:
+            if version < 1:
+                # v1：新增 seq 列，并按 (timestamp, id) 顺序为已有消息回填会话内序号
+                columns = {row[1] for row in cursor.execute("PRAGMA table_info(conversations)")}
+                if "seq" not in columns:
+                    cursor.execute("ALTER TABLE conversations ADD COLUMN seq INTEGER")
+
+                rows = cursor.execute('''
+                    SELECT id, session_id FROM conversations
+                    WHERE seq IS NULL
+                    ORDER BY session_id, timestamp, id
+                ''').fetchall()
+                next_seq = {}
+                updates = []
+                for row_id, session_id in rows:
+                    seq = next_seq.get(session_id, 0)
+                    next_seq[session_id] = seq + 1
+                    updates.append((seq, row_id))
+                cursor.executemany("UPDATE conversations SET seq = ? WHERE id = ?", updates)
+
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+
+    def append_message(self, message, session_id, seq):
+        """
+        追加一条消息（只追加写入，不读取已有记录）
+
+        同一会话内 seq 必须单调递增。重复的 (session_id, seq) 说明两个写入方使用了
+        同一个会话 ID，该消息不会写入，并在 flush() / close() 时以 ConversationSaveError 报告。
+        :param message: 消息字典
+        :param session_id: 会话ID
+        :param seq: 消息在会话内的序号
+        """
+        if self._closed:
+            raise RuntimeError("数据库已关闭，无法继续保存对话")
+
+        self._queue.put(("append", session_id, seq, message))
+
     def save_conversation(self, messages, session_id="default"):
         """
-        保存对话消息到数据库（只保存增量消息）
+        保存对话消息到数据库（只保存增量消息，兼容旧接口）
+
+        通过会话内最新时间戳判断哪些消息是新的；新代码请使用 append_message。
+        消息先进入写后队列，由后台线程批量写入；需要立即可见时调用 flush()。
         :param messages: 消息列表，每个消息是一个字典
         :param session_id: 会话ID，用于区分不同的对话会话
         """
         if not messages:
             return
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # 获取数据库中该会话的最后一条消息的时间戳
+
+        # 在调用方线程完成校验，格式错误仍然直接抛给调用方
+        for msg in messages:
+            msg_timestamp = msg.get("timestamp")
+            if msg_timestamp is None:
+                raise ValueError(f"消息缺少timestamp字段: {msg}")
+            try:
+                datetime.fromisoformat(msg_timestamp.replace('Z', '+00:00'))
+            except (ValueError, TypeError, AttributeError) as e:
+                raise ValueError(f"消息timestamp格式错误: {msg_timestamp} - {str(e)}")
+
+        if self._closed:
+            raise RuntimeError("数据库已关闭，无法继续保存对话")
+
+        self._queue.put(("save", session_id, list(messages)))
+
+    def flush(self, session_id=None):
+        """
+        阻塞直到写后队列中的消息全部提交
+
+        此前有消息写入失败时抛出 ConversationSaveError；指定 session_id 时只报告该会话的失败。
+        """
+        self._wait_for_writer()
+        self._raise_failures(session_id)
+
+    def _wait_for_writer(self):
+        if self._writer.is_alive():
+            self._queue.join()
+
+    def _raise_failures(self, session_id=None):
+        with self._failures_lock:
+            if session_id is None:
+                failures, self._failures = self._failures, []
+            else:
+                failures = [f for f in self._failures if f[0] == session_id]
+                self._failures = [f for f in self._failures if f[0] != session_id]
+        if failures:
+            raise ConversationSaveError(failures)
+
+    def _writer_loop(self):
+        """后台写入线程：攒批后在单个事务中提交"""
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                return
+
+            # 短暂等待后续消息，把同一轮的多条消息合并进一个事务
+            batch = [item]
+            stop_requested = False
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < MAX_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    next_item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if next_item is _STOP:
+                    stop_requested = True
+                    break
+                batch.append(next_item)
+
+            try:
+                self._write_batch(batch)
+            except Exception:
+                # 整批回滚后逐条重试，避免一条坏消息连累同批中其它会话的消息
+                self._write_items_separately(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            if stop_requested:
+                self._queue.task_done()
+                return
+
+    def _write_items_separately(self, batch):
+        for item in batch:
+            try:
+                self._write_batch([item])
+            except Exception as e:
+                logger.exception("保存对话失败（会话 %s）", item[1])
+                with self._failures_lock:
+                    self._failures.append((item[1], e))
+
+    def _write_batch(self, batch):
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute("BEGIN")
+            try:
+                for item in batch:
+                    if item[0] == "append":
+                        _, session_id, seq, message = item
+                        self._insert_message(cursor, message, session_id, seq)
+                    else:
+                        _, session_id, messages = item
+                        self._insert_new_messages(cursor, messages, session_id)
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+
+    def _insert_new_messages(self, cursor, messages, session_id):
+        # 获取数据库中该会话的最后一条消息的时间戳与序号
         cursor.execute('''
-            SELECT MAX(timestamp) FROM conversations 
+            SELECT MAX(timestamp), MAX(seq) FROM conversations
             WHERE session_id = ?
         ''', (session_id,))
-        
+
         result = cursor.fetchone()
         last_timestamp = result[0] if result and result[0] else None
-        
+        next_seq = result[1] + 1 if result and result[1] is not None else 0
+
         # 筛选出新消息
         new_messages = []
         for msg in messages:
-            # 检查消息必须有timestamp
-            if msg.get("timestamp") is None:
-                raise ValueError(f"消息缺少timestamp字段: {msg}")
-            
             msg_timestamp = msg["timestamp"]
             if last_timestamp is None:
                 new_messages.append(msg)
             else:
-                try:
-                    msg_time = datetime.fromisoformat(msg_timestamp.replace('Z', '+00:00'))
-                    db_time = datetime.fromisoformat(last_timestamp.replace('Z', '+00:00'))
-                    if msg_time > db_time:
-                        new_messages.append(msg)
-                except (ValueError, TypeError) as e:
-                    raise ValueError(f"消息timestamp格式错误: {msg_timestamp} - {str(e)}")
-        
+                msg_time = datetime.fromisoformat(msg_timestamp.replace('Z', '+00:00'))
+                db_time = datetime.fromisoformat(last_timestamp.replace('Z', '+00:00'))
+                if msg_time > db_time:
+                    new_messages.append(msg)
+
         # 保存新消息
         for msg in new_messages:
-            content = msg.get("content")
-            if isinstance(content, list):
-                # 如果content是列表（包含图片base64编码），序列化为JSON字符串
-                content_str = json.dumps(content, ensure_ascii=False)
-            else:
-                content_str = content
-            
-            # 获取消息的timestamp，必须存在
-            msg_timestamp = msg.get("timestamp")
-            if not msg_timestamp:
-                raise ValueError(f"消息缺少timestamp字段: {msg}")
-            
-            conv = {
-                "role": msg["role"],
-                "thinking": msg.get("thinking"),
-                "content": content_str,
-                "tool_calls": json.dumps(msg.get("tool_calls")) if msg.get("tool_calls") else None,
-                "tool_call_id": msg.get("tool_call_id"),
-                "session_id": session_id,
-                "timestamp": msg_timestamp
-            }
-            
-            cursor.execute('''
-                INSERT INTO conversations 
-                (session_id, role, thinking, content, tool_calls, tool_call_id, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                conv["session_id"],
-                conv["role"],
-                conv["thinking"],
-                conv["content"],
-                conv["tool_calls"],
-                conv["tool_call_id"],
-                conv["timestamp"]
-            ))
-        
-        conn.commit()
-        conn.close()
-    
+            self._insert_message(cursor, msg, session_id, next_seq)
+            next_seq += 1
+
+    def _insert_message(self, cursor, msg, session_id, seq):
+        content = msg.get("content")
+        if isinstance(content, list):
+            # 如果content是列表（包含图片base64编码），序列化为JSON字符串
+            content_str = json.dumps(content, ensure_ascii=False)
+        else:
+            content_str = content
+
+        conv = {
+            "role": msg["role"],
+            "thinking": msg.get("thinking"),
+            "content": content_str,
+            "tool_calls": json.dumps(msg.get("tool_calls")) if msg.get("tool_calls") else None,
+            "tool_call_id": msg.get("tool_call_id"),
+            "session_id": session_id,
+            "timestamp": msg.get("timestamp") or datetime.now().isoformat(),
+            "seq": seq
+        }
+
+        cursor.execute('''
+            INSERT INTO conversations
+            (session_id, role, thinking, content, tool_calls, tool_call_id, timestamp, seq)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            conv["session_id"],
+            conv["role"],
+            conv["thinking"],
+            conv["content"],
+            conv["tool_calls"],
+            conv["tool_call_id"],
+            conv["timestamp"],
+            conv["seq"]
+        ))
+
     def get_conversations(self, session_id="default", limit=None):
         """
         获取指定会话的对话历史
@@ -129,26 +334,27 @@ class ConversationDatabase:
         :param limit: 限制返回的记录数量
         :return: 对话消息列表
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        self._wait_for_writer()
+
         query = '''
             SELECT role, thinking, content, tool_calls, tool_call_id, timestamp
-            FROM conversations 
-            WHERE session_id = ? 
-            ORDER BY timestamp ASC
+            FROM conversations
+            WHERE session_id = ?
+            ORDER BY seq ASC, id ASC
         '''
-        
+
         if limit:
-            query += f" LIMIT {limit}"
-        
-        cursor.execute(query, (session_id,))
-        rows = cursor.fetchall()
-        
+            query += f" LIMIT {int(limit)}"
+
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute(query, (session_id,))
+            rows = cursor.fetchall()
+
         conversations = []
         for row in rows:
             content = row[2]
-            
+
             # 尝试解析content为JSON（处理content列表格式）
             try:
                 if content and content.startswith('[') and content.endswith(']'):
@@ -158,61 +364,72 @@ class ConversationDatabase:
             except (json.JSONDecodeError, ValueError):
                 # 如果解析失败，保持原样
                 pass
-            
+
             conv = {
                 "role": row[0],
                 "thinking": row[1],
                 "content": content,
                 "timestamp": row[5]
             }
-            
+
             if row[3]:  # tool_calls
                 conv["tool_calls"] = json.loads(row[3])
             if row[4]:  # tool_call_id
                 conv["tool_call_id"] = row[4]
-                
+
             conversations.append(conv)
-        
-        conn.close()
+
         return conversations
-    
+
     def get_all_sessions(self):
         """获取所有会话ID列表"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT session_id, MIN(timestamp) as first_message_time
-            FROM conversations 
-            GROUP BY session_id
-            ORDER BY first_message_time DESC
-        ''')
-        
-        sessions = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        return sessions
-    
+        self._wait_for_writer()
+
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute('''
+                SELECT session_id, MIN(timestamp) as first_message_time
+                FROM conversations
+                GROUP BY session_id
+                ORDER BY first_message_time DESC
+            ''')
+            return [row[0] for row in cursor.fetchall()]
+
     def delete_session(self, session_id):
         """删除指定会话的所有对话记录"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('DELETE FROM conversations WHERE session_id = ?', (session_id,))
-        conn.commit()
-        conn.close()
-    
+        self._wait_for_writer()
+
+        with self._lock:
+            self._conn.execute('DELETE FROM conversations WHERE session_id = ?', (session_id,))
+
     def close(self):
-        """关闭数据库连接（实际上每次操作都会关闭，这里为了兼容性保留）"""
-        pass
+        """刷新写后队列并关闭长连接"""
+        if self._closed:
+            return
+        self._closed = True
+
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+        self._raise_failures()
 
 # 全局数据库实例
 _db_instance = None
+_db_instance_lock = threading.Lock()
 
 def get_database():
     """获取全局数据库实例"""
     global _db_instance
     if _db_instance is None:
-        _db_instance = ConversationDatabase()
+        with _db_instance_lock:
+            if _db_instance is None:
+                _db_instance = ConversationDatabase()
     return _db_instance
 
 def save_conversation(messages, session_id="default"):
@@ -222,4 +439,29 @@ def save_conversation(messages, session_id="default"):
     :param session_id: 会话ID，默认为"default"
     """
     db = get_database()
-    db.save_conversation(messages, session_id)
\ No newline at end of file
+    db.save_conversation(messages, session_id)
+
+def append_message(message, session_id, seq):
+    """
+    追加一条消息到全局数据库实例
+    :param message: 消息字典
+    :param session_id: 会话ID
+    :param seq: 消息在会话内的序号
+    """
+    db = get_database()
+    db.append_message(message, session_id, seq)
+
+def flush(session_id=None):
+    """将全局实例写后队列中的消息全部提交；有写入失败时抛出 ConversationSaveError"""
+    if _db_instance is not None:
+        _db_instance.flush(session_id)
+
+def close_database():
+    """关闭全局数据库实例（进程退出时自动调用）"""
+    global _db_instance
+    with _db_instance_lock:
+        if _db_instance is not None:
+            db, _db_instance = _db_instance, None
+            db.close()
+
+atexit.register(close_database)
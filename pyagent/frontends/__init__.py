@@ -3,7 +3,23 @@
 前端模块初始化
 """
 
+import importlib
+
 from .base import FrontendInterface
-from .commandline import CommandlineFrontend
 
-__all__ = ["FrontendInterface", "CommandlineFrontend"]
\ No newline at end of file
+# 具体前端首次访问时才导入（命令行前端依赖较重的 prompt_toolkit）
+_LAZY_ATTRIBUTES = {
+    "CommandlineFrontend": ".commandline",
+    "JSONSocketFrontend": ".json_socket",
+}
+
+__all__ = ["FrontendInterface", "CommandlineFrontend", "JSONSocketFrontend"]
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
\ No newline at end of file
@@ -27,6 +27,10 @@ class FrontendInterface:
         """
         raise NotImplementedError
     
+    def flush(self) -> None:
+        """立即写出前端缓冲中尚未显示的输出（无缓冲的前端无需实现）"""
+        pass
+    
     def start_session(self) -> None:
         """开始一个新的会话"""
         pass
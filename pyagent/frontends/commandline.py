@@ -6,6 +6,10 @@ import sys
 from typing import Tuple
 from .base import FrontendInterface
 from .commandline_input import get_multiline_input, sanitize_unicode, _ensure_utf8_stdio
+from .output_buffer import CoalescingOutputBuffer
+
+# 逐 token 到达的流式输出类型，经合并缓冲批量写出
+_STREAMED_TYPES = frozenset({"thinking", "content", "tool_progress"})
 
 
 def _safe_write(text: str) -> None:
@@ -49,30 +53,40 @@ class CommandlineFrontend(FrontendInterface):
         # 解决 Windows GBK 编码对扩展 Unicode 的限制
         _ensure_utf8_stdio()
         self.thinking_mode = False
+        self._stream_buffer = CoalescingOutputBuffer(_safe_write)
         
     def get_input(self) -> Tuple[str, bool]:
         """
         获取多行用户输入
         """
+        self.flush()
         return get_multiline_input()
     
+    def flush(self) -> None:
+        """立即写出合并缓冲中的流式输出"""
+        self._stream_buffer.flush()
+    
     def output(self, message_type: str, content: str, **kwargs) -> None:
         """
         根据消息类型输出到控制台
         """
+        # 类型变化时先写出缓冲中的增量，保证与直接 print 的内容顺序一致
+        if message_type not in _STREAMED_TYPES or message_type != self._stream_buffer.pending_type:
+            self._stream_buffer.flush()
+
         # 思考过程 - 灰色
         if message_type == "thinking":
             if not self.thinking_mode:
                 print("\n\033[38;5;245m思考过程：", end="")
                 self.thinking_mode = True
-            _safe_write(content)
+            self._stream_buffer.write(message_type, content)
         
         # 自然语言内容 - 默认颜色
         elif message_type == "content":
             if self.thinking_mode:
                 print("\n\033[0m", end="")  # 结束思考模式
                 self.thinking_mode = False
-            _safe_write(content)
+            self._stream_buffer.write(message_type, content)
         
         # 工具调用 - 蓝色
         elif message_type == "tool_call":
@@ -86,7 +100,7 @@ class CommandlineFrontend(FrontendInterface):
             if self.thinking_mode:
                 print("\033[0m", end="")  # 确保重置颜色
                 self.thinking_mode = False
-            _safe_write('\033[93m' + content + '\033[0m')
+            self._stream_buffer.write(message_type, '\033[93m' + content + '\033[0m')
         
         # 工具结果 - 绿色
         elif message_type == "tool_result":
@@ -159,6 +173,7 @@ class CommandlineFrontend(FrontendInterface):
     
     def end_session(self) -> None:
         """结束会话时重置终端颜色"""
+        self._stream_buffer.close()
         if self.thinking_mode:
             print("\033[0m", end="")  # 确保重置颜色
             self.thinking_mode = False
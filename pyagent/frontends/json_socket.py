@@ -0,0 +1,120 @@
+# frontends/json_socket.py
+"""
+基于 socket 的前端实现（多会话服务使用）
+
+按行分隔的 JSON 协议，每行一个消息：
+
+客户端 → 服务端:
+    {"type": "auth", "token": "..."}    连接后的第一条消息，令牌不符时连接被关闭
+    {"type": "input", "text": "..."}    一条用户输入
+    {"type": "exit"}                     结束会话（直接关闭连接效果相同）
+
+任何一行不是 JSON 对象时立即关闭连接：其他协议（例如浏览器发来的 HTTP 请求）
+的请求行和头部不会被逐行跳过，请求体也就不会被当作用户输入。
+
+服务端 → 客户端:
+    {"type": "input_request"}            等待下一条用户输入
+    {"type": "<消息类型>", "content": "...", ...}
+                                         Agent 输出，类型与 FrontendInterface.output 一致
+"""
+import hmac
+import json
+import threading
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+from .base import FrontendInterface
+
+
+class JSONSocketFrontend(FrontendInterface):
+    """
+    通过 socket 读写流与远端客户端交互的前端
+
+    Args:
+        rfile: 连接的读取端（二进制、按行读取）
+        wfile: 连接的写入端（二进制）
+    """
+    def __init__(self, rfile: BinaryIO, wfile: BinaryIO):
+        self._rfile = rfile
+        self._wfile = wfile
+        # 工具可能在线程池中并发输出，写入需要加锁
+        self._write_lock = threading.Lock()
+        self.closed = False
+
+    def send(self, payload: Dict[str, Any]) -> None:
+        """发送一条 JSON 消息；连接已断开时静默丢弃"""
+        if self.closed:
+            return
+        line = json.dumps(payload, ensure_ascii=False, default=str) + "\n"
+        data = line.encode("utf-8", errors="replace")
+        with self._write_lock:
+            try:
+                self._wfile.write(data)
+                self._wfile.flush()
+            except (OSError, ValueError):
+                self.closed = True
+
+    def _read_message(self) -> Optional[Dict[str, Any]]:
+        """读取一条 JSON 对象消息；连接关闭或消息无法解析时关闭连接并返回 None"""
+        try:
+            line = self._rfile.readline()
+        except (OSError, ValueError):
+            line = b""
+        if not line:
+            self.closed = True
+            return None
+
+        try:
+            message = json.loads(line.decode("utf-8", errors="replace"))
+        except ValueError:
+            message = None
+        if not isinstance(message, dict):
+            self.send({"type": "error", "content": "无法解析的消息，需为单行 JSON 对象，连接已关闭"})
+            self.closed = True
+            return None
+        return message
+
+    def authenticate(self, token: str) -> bool:
+        """
+        读取第一条消息并校验令牌；失败时通知客户端并关闭连接
+        """
+        message = self._read_message()
+        if message is None:
+            return False
+        supplied = message.get("token")
+        if (
+            message.get("type") != "auth"
+            or not isinstance(supplied, str)
+            or not hmac.compare_digest(supplied.encode("utf-8"), token.encode("utf-8"))
+        ):
+            self.send({"type": "error", "content": "认证失败，连接已关闭"})
+            self.closed = True
+            return False
+        return True
+
+    def get_input(self) -> Tuple[str, bool]:
+        """
+        请求并读取下一条用户输入；连接关闭、收到 exit 或无法解析的消息时返回无效输入
+        """
+        while not self.closed:
+            self.send({"type": "input_request"})
+            message = self._read_message()
+            if message is None:
+                break
+
+            message_type = message.get("type")
+            if message_type == "exit":
+                break
+            if message_type == "input" and isinstance(message.get("text"), str):
+                return message["text"], True
+            self.send({"type": "error", "content": f"不支持的消息类型：{message_type}"})
+
+        return "", False
+
+    def output(self, message_type: str, content: str, **kwargs) -> None:
+        """
+        将输出作为一条 JSON 消息发送给客户端
+        """
+        self.send({"type": message_type, "content": content, **kwargs})
+
+    def end_session(self) -> None:
+        """结束会话时通知客户端"""
+        self.send({"type": "session_end"})
@@ -0,0 +1,112 @@
+# frontends/output_buffer.py
+"""
+流式输出合并缓冲
+
+模型流式返回的增量通常只有一两个字符，逐个 write + flush 在输出被重定向到
+文件或经由 SSH 时会占用大量 CPU 并拖慢显示。CoalescingOutputBuffer 将同类
+增量合并后批量写出，写出时机为：
+- 距本批第一个增量超过 interval 秒（由后台线程定时写出）
+- 增量中包含换行
+- 增量类型发生变化（如思考过程切换为正文），或调用方主动 flush()
+"""
+import threading
+import time
+from typing import Callable, List, Optional
+
+# 默认合并窗口（秒），约为 30~60 FPS 的刷新间隔
+DEFAULT_FLUSH_INTERVAL = 0.025
+
+
+class CoalescingOutputBuffer:
+    """
+    合并同类型的流式增量，按时间窗口 / 换行 / 类型变化批量写出。
+
+    Args:
+        sink: 实际写出函数，接收合并后的文本（每批调用一次）
+        interval: 合并窗口（秒）；<= 0 时不做缓冲，每个增量直接写出
+    """
+
+    def __init__(self, sink: Callable[[str], None], interval: float = DEFAULT_FLUSH_INTERVAL):
+        self._sink = sink
+        self.interval = interval
+        self._chunks: List[str] = []
+        self._pending_type: Optional[str] = None
+        self._deadline: Optional[float] = None
+        self._cond = threading.Condition()
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = False
+
+    @property
+    def pending_type(self) -> Optional[str]:
+        """当前缓冲中增量的类型；缓冲为空时为 None"""
+        return self._pending_type
+
+    def write(self, message_type: str, text: str) -> None:
+        """追加一个增量；类型与缓冲中的不同时先写出已有内容"""
+        if not text:
+            return
+        with self._cond:
+            if self._pending_type is not None and message_type != self._pending_type:
+                self._flush_locked()
+
+            self._chunks.append(text)
+            self._pending_type = message_type
+
+            if self.interval <= 0 or self._closed or "\n" in text:
+                self._flush_locked()
+            elif self._deadline is None:
+                self._deadline = time.monotonic() + self.interval
+                self._ensure_flusher()
+                self._cond.notify()
+            elif time.monotonic() >= self._deadline:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        """立即写出缓冲中的全部内容"""
+        with self._cond:
+            self._flush_locked()
+
+    def close(self) -> None:
+        """写出剩余内容并停止后台线程；之后的写入不再缓冲"""
+        with self._cond:
+            self._flush_locked()
+            self._closed = True
+            self._cond.notify()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join(timeout=1)
+            self._flusher = None
+
+    def _flush_locked(self) -> None:
+        self._deadline = None
+        if not self._chunks:
+            return
+        text = "".join(self._chunks)
+        self._chunks = []
+        self._pending_type = None
+        self._sink(text)
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None:
+            self._flusher = threading.Thread(
+                target=self._run_flusher,
+                name="pyagent-output-flusher",
+                daemon=True,
+            )
+            self._flusher.start()
+
+    def _run_flusher(self) -> None:
+        """后台线程：到达合并窗口截止时间后写出缓冲内容"""
+        with self._cond:
+            while not self._closed:
+                if self._deadline is None:
+                    self._cond.wait()
+                    continue
+                remaining = self._deadline - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                try:
+                    self._flush_locked()
+                except Exception:
+                    # 写出失败（如终端已关闭）时丢弃本批，避免后台线程退出
+                    pass
@@ -2,9 +2,35 @@
 LLM 适配器 —— 基于 OpenAI Chat Completion API。
 
 提供 UnifiedLLMClient，直接使用 openai SDK 进行流式聊天完成，
-将响应转换为统一的 StreamEvent 流。
+将响应转换为统一的 StreamEvent 流；AsyncUnifiedLLMClient 为其 asyncio 版本，
+配合 http_pool 中共享的 HTTP/2 长连接池使用。
 """
 
+import importlib
+
 from .client import UnifiedLLMClient
 
-__all__ = ["UnifiedLLMClient"]
+# 异步客户端与连接池依赖 asyncio / httpx，首次访问时才导入
+_LAZY_ATTRIBUTES = {
+    "AsyncUnifiedLLMClient": ".async_client",
+    "HTTPPoolConfig": ".http_pool",
+    "close_async_http_clients": ".http_pool",
+    "get_async_http_client": ".http_pool",
+}
+
+__all__ = [
+    "AsyncUnifiedLLMClient",
+    "HTTPPoolConfig",
+    "UnifiedLLMClient",
+    "close_async_http_clients",
+    "get_async_http_client",
+]
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,23 @@
+"""
+Asyncio streaming adapter for OpenAI-compatible chat completions.
+"""
+
+from typing import AsyncIterator
+
+from ..conversation_manager import StreamEvent
+from .client import UnifiedLLMClient, chunk_to_events
+
+
+class AsyncUnifiedLLMClient(UnifiedLLMClient):
+    """UnifiedLLMClient 的异步版本，包装 openai.AsyncOpenAI 等异步 SDK 客户端。
+
+    chat_completions_create_with_events 返回异步迭代器，事件与同步版本一致；
+    多个会话可在同一事件循环中并发读取各自的流。
+    """
+
+    async def chat_completions_create_with_events(self, **kwargs) -> AsyncIterator[StreamEvent]:
+        stream = await self.client.chat.completions.create(**self._prepare_request(kwargs))
+
+        async for chunk in stream:
+            for event in chunk_to_events(chunk):
+                yield event
@@ -23,43 +23,50 @@ class UnifiedLLMClient:
                 self._supports_stream_options = False
         return self._supports_stream_options
 
-    def chat_completions_create_with_events(self, **kwargs) -> Iterator[StreamEvent]:
+    def _prepare_request(self, kwargs: dict) -> dict:
         kwargs.setdefault("stream", True)
         kwargs.setdefault("model", self.model_name)
 
         # 向支持的提供商请求在流末尾返回 usage 信息。
         if self._has_stream_options() and "stream_options" not in kwargs:
             kwargs["stream_options"] = {"include_usage": True}
+        return kwargs
 
-        stream = self.client.chat.completions.create(**kwargs)
+    def chat_completions_create_with_events(self, **kwargs) -> Iterator[StreamEvent]:
+        stream = self.client.chat.completions.create(**self._prepare_request(kwargs))
 
         for chunk in stream:
-            usage = getattr(chunk, "usage", None)
-            if usage is not None:
-                yield StreamEvent(event_type="usage", data=usage)
+            yield from chunk_to_events(chunk)
+
+    def get_model_name(self) -> str:
+        return self.model_name
 
-            if not chunk.choices:
-                continue
 
-            choice = chunk.choices[0]
+def chunk_to_events(chunk) -> Iterator[StreamEvent]:
+    """将一个 chat.completion.chunk 转换为 StreamEvent（同步 / 异步客户端共用）。"""
+    usage = getattr(chunk, "usage", None)
+    if usage is not None:
+        yield StreamEvent(event_type="usage", data=usage)
 
-            if choice.finish_reason:
-                yield StreamEvent(event_type="finish", data=choice.finish_reason)
-                continue
+    if not chunk.choices:
+        return
 
-            delta = choice.delta
+    choice = chunk.choices[0]
 
-            reasoning_content = getattr(delta, "reasoning_content", None)
-            reasoning = getattr(delta, "reasoning", None)
-            if reasoning_content is not None:
-                yield StreamEvent(event_type="thinking", data=reasoning_content)
-            elif reasoning is not None:
-                yield StreamEvent(event_type="thinking", data=reasoning)
-            elif getattr(delta, "content", None):
-                yield StreamEvent(event_type="content", data=delta.content)
-            elif getattr(delta, "tool_calls", None):
-                for tc in delta.tool_calls:
-                    yield StreamEvent(event_type="tool_call", data=tc)
+    if choice.finish_reason:
+        yield StreamEvent(event_type="finish", data=choice.finish_reason)
+        return
 
-    def get_model_name(self) -> str:
-        return self.model_name
+    delta = choice.delta
+
+    reasoning_content = getattr(delta, "reasoning_content", None)
+    reasoning = getattr(delta, "reasoning", None)
+    if reasoning_content is not None:
+        yield StreamEvent(event_type="thinking", data=reasoning_content)
+    elif reasoning is not None:
+        yield StreamEvent(event_type="thinking", data=reasoning)
+    elif getattr(delta, "content", None):
+        yield StreamEvent(event_type="content", data=delta.content)
+    elif getattr(delta, "tool_calls", None):
+        for tc in delta.tool_calls:
+            yield StreamEvent(event_type="tool_call", data=tc)
@@ -0,0 +1,117 @@
+"""
+共享的 HTTP 连接池。
+
+同一事件循环中的所有异步 LLM 客户端共用一个 httpx.AsyncClient
+（多会话服务中的同步客户端则共用 create_http_client() 创建的 httpx.Client）：
+连接保持长连接（keep-alive）并在可用时启用 HTTP/2 多路复用，
+多个并发会话的流式请求无需各自建立连接，也不需要每个流占用一个线程。
+
+HTTP/2 依赖 h2 包（随 httpx[http2] 安装），缺失时记录一次警告并退回 HTTP/1.1。
+"""
+
+import asyncio
+import importlib.util
+import logging
+import weakref
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+_http2_fallback_logged = False
+
+
+@dataclass(frozen=True)
+class HTTPPoolConfig:
+    """连接池参数；from_dict() 可由配置字典（忽略未知键）构造。"""
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 60.0
+    connect_timeout: float = 10.0
+    # 流式响应两个分块之间的最长等待时间
+    read_timeout: float = 600.0
+    http2: bool = True
+
+    @classmethod
+    def from_dict(cls, config: Optional[Dict[str, Any]]) -> "HTTPPoolConfig":
+        if not config:
+            return cls()
+        known = {name: value for name, value in config.items() if name in cls.__dataclass_fields__}
+        return cls(**known)
+
+
+def is_http2_available() -> bool:
+    """是否安装了 HTTP/2 所需的 h2 包。"""
+    return importlib.util.find_spec("h2") is not None
+
+
+def _use_http2(config: HTTPPoolConfig) -> bool:
+    """配置要求 HTTP/2 且 h2 可用时返回 True；缺少 h2 时只警告一次。"""
+    global _http2_fallback_logged
+    if not config.http2:
+        return False
+    if is_http2_available():
+        return True
+    if not _http2_fallback_logged:
+        _http2_fallback_logged = True
+        logger.warning('未安装 h2 包，LLM 连接池退回 HTTP/1.1（pip install "httpx[http2]" 可启用 HTTP/2）')
+    return False
+
+
+def create_async_http_client(config: Optional[HTTPPoolConfig] = None) -> httpx.AsyncClient:
+    """按配置创建一个新的 httpx.AsyncClient。"""
+    config = config or HTTPPoolConfig()
+    return httpx.AsyncClient(
+        http2=_use_http2(config),
+        limits=httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(config.read_timeout, connect=config.connect_timeout),
+        follow_redirects=True,
+    )
+
+
+def create_http_client(config: Optional[HTTPPoolConfig] = None) -> httpx.Client:
+    """按配置创建同步 httpx.Client（线程安全，可供多个会话线程共享）。"""
+    config = config or HTTPPoolConfig()
+    return httpx.Client(
+        http2=_use_http2(config),
+        limits=httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(config.read_timeout, connect=config.connect_timeout),
+        follow_redirects=True,
+    )
+
+
+# 连接绑定在创建它的事件循环上，因此按事件循环分别缓存
+_shared_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[HTTPPoolConfig, httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_async_http_client(config: Optional[HTTPPoolConfig] = None) -> httpx.AsyncClient:
+    """返回当前事件循环中按配置共享的 httpx.AsyncClient（需在协程中调用）。"""
+    config = config or HTTPPoolConfig()
+    loop = asyncio.get_running_loop()
+    clients = _shared_clients.setdefault(loop, {})
+    client = clients.get(config)
+    if client is None or client.is_closed:
+        client = create_async_http_client(config)
+        clients[config] = client
+    return client
+
+
+async def close_async_http_clients() -> None:
+    """关闭当前事件循环中的所有共享连接池（事件循环结束前调用）。"""
+    loop = asyncio.get_running_loop()
+    clients: Tuple[httpx.AsyncClient, ...] = tuple(_shared_clients.pop(loop, {}).values())
+    for client in clients:
+        await client.aclose()
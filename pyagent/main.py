@@ -1,11 +1,7 @@
 import os
 import json
 import importlib
-from .agent import Agent
 from .config import get_system_prompt
-from .frontends import CommandlineFrontend
-from .llm_adapter import UnifiedLLMClient
-from .sdk_factory import SDKFactory
 
 def load_provider_config():
     # 获取当前脚本所在目录的绝对路径
@@ -35,7 +31,10 @@ def load_all_models(provider_config: dict) -> list:
                     "api_key_env": config["api_key_env"],
                     "base_url": config["base_url"],
                     "sdk_name": config.get("sdk_name", "openai"),  # 默认使用openai
-                    "parameters": model.get("parameters", [])
+                    "parameters": model.get("parameters", []),
+                    "context_token_budget": model.get("context_token_budget"),
+                    "tokenizer": model.get("tokenizer"),
+                    "http_pool": config.get("http_pool")
                 })
     return models
 
@@ -132,6 +131,12 @@ def main():
                 # 用户选择返回或重新加载，继续循环
                 continue
     
+    # 选定模型后才导入 Agent / 前端 / SDK 等较重的模块，缩短到首个提示的启动时间
+    from .agent import Agent
+    from .frontends import CommandlineFrontend
+    from .llm_adapter import UnifiedLLMClient
+    from .sdk_factory import SDKFactory
+
     # 创建 OpenAI SDK 客户端
     sdk_client = SDKFactory.create_client(
         selected_model["sdk_name"],
@@ -151,7 +156,11 @@ def main():
         frontend=frontend,
         system_prompt=get_system_prompt(),
         model_name=selected_model["name"],
-        model_parameters=selected_model.get("parameters", [])
+        model_parameters=selected_model.get("parameters", []),
+        context_token_budget=selected_model.get("context_token_budget"),
+        tokenizer=selected_model.get("tokenizer"),
+        # PYAGENT_PERSISTENT_SHELL=1 时命令复用同一个 bash 进程（保留 cd / export 状态）
+        persistent_shell=os.getenv("PYAGENT_PERSISTENT_SHELL") == "1",
     )
     
     agent.run()
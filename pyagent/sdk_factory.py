@@ -2,7 +2,10 @@
 SDK工厂模块 - 负责创建各种LLM SDK的客户端实例
 """
 import importlib
-from typing import Any
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    from .llm_adapter.http_pool import HTTPPoolConfig
 
 
 class SDKFactory:
@@ -46,18 +49,18 @@ class SDKFactory:
             raise RuntimeError(f"创建SDK客户端失败: {e}")
     
     @staticmethod
-    def _create_openai_client(api_key: str, base_url: str, **kwargs) -> Any:
-        """创建OpenAI客户端"""
+    def _create_openai_client(api_key: str, base_url: str, client_class: str = 'OpenAI', **kwargs) -> Any:
+        """创建OpenAI客户端（client_class='AsyncOpenAI' 时创建异步客户端）"""
         openai_module = importlib.import_module('openai')
-        return openai_module.OpenAI(
+        return getattr(openai_module, client_class)(
             api_key=api_key, 
             base_url=base_url,
             **kwargs
         )
     
     @staticmethod
-    def _create_anthropic_client(api_key: str, base_url: str, **kwargs) -> Any:
-        """创建Anthropic客户端"""
+    def _create_anthropic_client(api_key: str, base_url: str, client_class: str = 'Anthropic', **kwargs) -> Any:
+        """创建Anthropic客户端（client_class='AsyncAnthropic' 时创建异步客户端）"""
         anthropic_module = importlib.import_module('anthropic')
         
         # 检查是否为Minimax的Anthropic兼容API
@@ -80,7 +83,57 @@ class SDKFactory:
         # 合并额外的参数
         client_kwargs.update(kwargs)
         
-        return anthropic_module.Anthropic(**client_kwargs)
+        return getattr(anthropic_module, client_class)(**client_kwargs)
+    
+    @staticmethod
+    def create_async_client(
+        sdk_name: str,
+        api_key: str,
+        base_url: str,
+        pool_config: Optional["HTTPPoolConfig"] = None,
+        **kwargs,
+    ) -> Any:
+        """
+        创建异步SDK客户端，底层使用当前事件循环中共享的 httpx 连接池
+        （HTTP/2 + keep-alive）。需在协程中调用。
+        
+        Args:
+            sdk_name: SDK名称，如 'openai', 'anthropic' 等
+            api_key: API密钥
+            base_url: 基础URL
+            pool_config: 连接池参数，默认使用 HTTPPoolConfig()
+            **kwargs: 额外的客户端参数（传入 http_client 时不使用共享连接池）
+        
+        Returns:
+            对应的异步SDK客户端实例。共享连接池由 close_async_http_clients()
+            统一关闭，不要对该客户端调用 close()。
+        
+        Raises:
+            ImportError: 当所需的SDK模块未安装时
+            RuntimeError: 当创建客户端失败时
+        """
+        sdk_name = sdk_name.lower()
+        
+        try:
+            if 'http_client' not in kwargs:
+                from .llm_adapter.http_pool import get_async_http_client
+                kwargs['http_client'] = get_async_http_client(pool_config)
+            
+            if sdk_name == 'anthropic':
+                return SDKFactory._create_anthropic_client(
+                    api_key, base_url, client_class='AsyncAnthropic', **kwargs
+                )
+            
+            if sdk_name != 'openai':
+                print(f"警告: 未知的SDK类型 '{sdk_name}'，尝试使用OpenAI兼容模式")
+            return SDKFactory._create_openai_client(
+                api_key, base_url, client_class='AsyncOpenAI', **kwargs
+            )
+                
+        except ImportError as e:
+            raise ImportError(f"无法导入所需的SDK模块 '{sdk_name}'，请确保已安装对应的包: {e}")
+        except Exception as e:
+            raise RuntimeError(f"创建SDK客户端失败: {e}")
     
     @staticmethod
     def is_sdk_available(sdk_name: str) -> bool:
@@ -0,0 +1,247 @@
+"""
+多会话 Agent 服务
+
+在一个进程中同时托管多个 Agent 会话：每个 Unix socket / TCP 连接对应一个会话，
+在独立线程中运行，协议见 frontends/json_socket.py。所有会话共享：
+- 同一个 LLM SDK 客户端及其 HTTP 连接池（HTTP/2 + keep-alive）
+- conversation_saver 的单一数据库连接与写入线程
+- BrowserPool 中的同一个 Chromium 进程（每个会话独立的 context）
+
+会话可以执行任意命令，因此连接必须先发送认证令牌：令牌在每次启动时随机生成，
+写入仅当前用户可读（0600）的令牌文件。默认监听权限同为 0600 的 Unix socket；
+TCP 端口可被本机任意进程（包括浏览器中的网页）连接，只靠令牌保护，仅在必要时使用。
+
+用法：
+    pyagent-server --model <模型名> [--unix PATH | --host 127.0.0.1 --port 8765] [--token-file PATH]
+"""
+
+import argparse
+import os
+import secrets
+import socketserver
+import sys
+import threading
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from . import conversation_saver
+from .agent import Agent
+from .config import get_system_prompt
+from .frontends import JSONSocketFrontend
+from .llm_adapter import HTTPPoolConfig, UnifiedLLMClient
+from .llm_adapter.http_pool import create_http_client
+from .main import load_all_models, load_provider_config
+from .sdk_factory import SDKFactory
+from .tools.browser_manager import BrowserPool
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_SESSIONS = 32
+# 默认的 Unix socket 与令牌文件（与 conversations.db 同级的 cache 目录）
+_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+DEFAULT_UNIX_PATH = os.path.join(_CACHE_DIR, "server.sock")
+DEFAULT_TOKEN_FILE = os.path.join(_CACHE_DIR, "server_token")
+
+
+class _SessionHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.agent_server.run_session(self.rfile, self.wfile)
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class _ThreadingUnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+else:  # Windows 不支持 Unix socket
+    _ThreadingUnixServer = None
+
+
+class AgentServer:
+    """
+    托管多个 Agent 会话的服务
+
+    Args:
+        client: 所有会话共享的 UnifiedLLMClient
+        model: load_all_models() 返回的模型配置
+        host / port: 监听的 TCP 地址（port=0 时由系统分配）
+        unix_path: 指定时改为监听 Unix socket
+        max_sessions: 同时运行的会话上限，超出的连接收到错误后被关闭
+        browser_pool: 共享浏览器池，默认新建
+        persistent_shell: 每个会话使用各自的持久 shell 执行命令
+        token: 客户端连接后必须首先提交的认证令牌，默认随机生成
+    """
+
+    def __init__(
+        self,
+        client: UnifiedLLMClient,
+        model: dict,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        unix_path: Optional[str] = None,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        system_prompt: Optional[str] = None,
+        browser_pool: Optional[BrowserPool] = None,
+        persistent_shell: bool = False,
+        token: Optional[str] = None,
+    ):
+        self.client = client
+        self.model = model
+        self.system_prompt = system_prompt if system_prompt is not None else get_system_prompt()
+        self.browser_pool = browser_pool or BrowserPool()
+        self.max_sessions = max_sessions
+        self.persistent_shell = persistent_shell
+        self.token = token or secrets.token_urlsafe(32)
+        self._session_slots = threading.BoundedSemaphore(max_sessions)
+        self._active_sessions = 0
+        self._lock = threading.Lock()
+
+        if unix_path:
+            if _ThreadingUnixServer is None:
+                raise RuntimeError("当前平台不支持 Unix socket，请改用 --host/--port")
+            if os.path.exists(unix_path):
+                os.unlink(unix_path)
+            self._server = _ThreadingUnixServer(unix_path, _SessionHandler)
+            os.chmod(unix_path, 0o600)
+        else:
+            self._server = _ThreadingTCPServer((host, port), _SessionHandler)
+        self._server.agent_server = self
+
+    @classmethod
+    def from_model_config(cls, model: dict, api_key: str, **kwargs) -> "AgentServer":
+        """按模型配置创建共享的 SDK 客户端（带可调的连接池）并构建服务。"""
+        pool_config = HTTPPoolConfig.from_dict(model.get("http_pool"))
+        sdk_client = SDKFactory.create_client(
+            model["sdk_name"],
+            api_key,
+            model["base_url"],
+            http_client=create_http_client(pool_config),
+        )
+        return cls(UnifiedLLMClient(sdk_client, model["name"]), model, **kwargs)
+
+    @property
+    def address(self):
+        """实际监听的地址：(host, port) 或 Unix socket 路径"""
+        return self._server.server_address
+
+    @property
+    def active_sessions(self) -> int:
+        with self._lock:
+            return self._active_sessions
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def shutdown(self) -> None:
+        """停止接受新连接并释放共享资源。"""
+        self._server.shutdown()
+        self._server.server_close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+        self.browser_pool.close()
+        try:
+            conversation_saver.flush()
+        except conversation_saver.ConversationSaveError as e:
+            print(f"对话记录保存失败: {e}", file=sys.stderr)
+
+    def run_session(self, rfile, wfile) -> None:
+        """在当前（连接专属）线程中运行一个 Agent 会话直到连接结束。"""
+        frontend = JSONSocketFrontend(rfile, wfile)
+        if not frontend.authenticate(self.token):
+            return
+        if not self._session_slots.acquire(blocking=False):
+            frontend.output("error", f"会话数已达上限（{self.max_sessions}），请稍后重试")
+            return
+
+        with self._lock:
+            self._active_sessions += 1
+        try:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            # 随机后缀保证服务重启后同一秒内创建的会话也不会与已保存的会话重名
+            session_id = f"conversation_{timestamp}_{uuid.uuid4().hex}"
+            agent = Agent(
+                client=self.client,
+                frontend=frontend,
+                system_prompt=self.system_prompt,
+                model_name=self.model["name"],
+                model_parameters=self.model.get("parameters", []),
+                context_token_budget=self.model.get("context_token_budget"),
+                tokenizer=self.model.get("tokenizer"),
+                session_id=session_id,
+                browser_pool=self.browser_pool,
+                persistent_shell=self.persistent_shell,
+            )
+            frontend.send({"type": "session", "session_id": session_id, "model": self.model["name"]})
+            agent.run()
+        finally:
+            with self._lock:
+                self._active_sessions -= 1
+            self._session_slots.release()
+
+
+def write_token_file(path: str, token: str) -> None:
+    """将令牌写入仅当前用户可读写（0600）的文件。"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        # 文件已存在时 os.open 不会修改权限
+        if hasattr(os, "fchmod"):
+            os.fchmod(f.fileno(), 0o600)
+        f.write(token + "\n")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="在一个进程中托管多个 Agent 会话")
+    parser.add_argument("--model", required=True, help="provider_config.json 中的模型名称")
+    parser.add_argument("--unix", metavar="PATH", help=f"监听的 Unix socket（默认 {DEFAULT_UNIX_PATH}）")
+    parser.add_argument("--host", help=f"改为监听 TCP（默认 {DEFAULT_HOST}）；本机任意进程均可连接，只靠令牌保护")
+    parser.add_argument("--port", type=int, help=f"改为监听 TCP 端口（默认 {DEFAULT_PORT}）")
+    parser.add_argument("--token-file", default=DEFAULT_TOKEN_FILE, help="写入认证令牌的文件（权限 0600）")
+    parser.add_argument("--max-sessions", type=int, default=DEFAULT_MAX_SESSIONS)
+    parser.add_argument("--persistent-shell", action="store_true", help="每个会话复用一个长期运行的 bash 执行命令")
+    args = parser.parse_args(argv)
+
+    use_tcp = args.host is not None or args.port is not None or _ThreadingUnixServer is None
+    if use_tcp and args.unix:
+        parser.error("--unix 不能与 --host/--port 同时使用")
+    unix_path = None if use_tcp else (args.unix or DEFAULT_UNIX_PATH)
+    if unix_path:
+        os.makedirs(os.path.dirname(os.path.abspath(unix_path)), exist_ok=True)
+
+    models = [m for m in load_all_models(load_provider_config()) if m["name"] == args.model]
+    if not models:
+        sys.exit(f"未找到模型 {args.model}，请检查 config/provider_config.json 配置")
+    model = models[0]
+
+    api_key = os.getenv(model["api_key_env"])
+    if not api_key:
+        sys.exit(f"未找到环境变量 {model['api_key_env']}")
+
+    server = AgentServer.from_model_config(
+        model,
+        api_key,
+        host=args.host or DEFAULT_HOST,
+        port=DEFAULT_PORT if args.port is None else args.port,
+        unix_path=unix_path,
+        max_sessions=args.max_sessions,
+        persistent_shell=args.persistent_shell,
+    )
+    write_token_file(args.token_file, server.token)
+    print(f"PyAgent 服务已启动: {server.address}（模型 {model['name']}，最多 {args.max_sessions} 个会话）")
+    print(f"认证令牌已写入 {args.token_file}，客户端连接后需先发送 {{\"type\": \"auth\", \"token\": \"...\"}}")
+    if use_tcp:
+        print("警告：TCP 端口可被本机任意进程和浏览器网页连接，仅由令牌保护；请优先使用 Unix socket", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n正在关闭服务...")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
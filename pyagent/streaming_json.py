@@ -0,0 +1,83 @@
+"""
+流式 JSON 扫描 —— 在工具调用参数仍在流式到达时判断其是否已经完整。
+
+JSONObjectScanner 逐段接收参数片段，只维护嵌套深度、是否处于字符串中、转义等
+少量状态，每个字符只扫描一次；顶层对象闭合时 complete 变为 True，此时再对完整
+文本做一次严格解析即可提前派发该工具调用，而不必等整个响应流结束。
+"""
+
+import json
+import re
+from typing import Any, Dict, Optional
+
+# 只有这些字符会改变扫描状态，其余字符整段跳过
+_STRUCTURAL_RE = re.compile(r'["\\{}\[\]]')
+
+
+class JSONObjectScanner:
+    """增量判断一个 JSON 对象文本是否已经闭合。"""
+
+    def __init__(self) -> None:
+        self.complete = False
+        # 闭合后又出现了非空白字符，说明不是单个 JSON 对象
+        self.invalid = False
+        self._depth = 0
+        self._in_string = False
+        # 上一段以反斜杠结尾：本段第一个字符被转义
+        self._escape_pending = False
+
+    def feed(self, fragment: str) -> bool:
+        """追加一段文本，返回顶层对象是否已闭合。"""
+        if not fragment or self.invalid:
+            return self.complete
+        if self.complete:
+            if fragment.strip():
+                self.invalid = True
+            return self.complete
+
+        skip_to = 0
+        if self._escape_pending:
+            self._escape_pending = False
+            skip_to = 1
+
+        for match in _STRUCTURAL_RE.finditer(fragment, skip_to):
+            index = match.start()
+            if index < skip_to:
+                continue
+            char = fragment[index]
+
+            if self._in_string:
+                if char == "\\":
+                    if index + 1 < len(fragment):
+                        skip_to = index + 2
+                    else:
+                        self._escape_pending = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth < 0:
+                    self.invalid = True
+                    return self.complete
+                if self._depth == 0:
+                    self.complete = True
+                    if fragment[index + 1:].strip():
+                        self.invalid = True
+                    return self.complete
+
+        return self.complete
+
+
+def parse_complete_object(text: str) -> Optional[Dict[str, Any]]:
+    """严格解析已闭合的参数文本；不是合法的 JSON 对象时返回 None。"""
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
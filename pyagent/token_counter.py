@@ -1,22 +1,23 @@
 import json
-import re
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-# 当服务商没有返回用量信息时的兜底策略：统计中文字符 + 单词数量。
-# 中文按单个字符计数；英文等其它单词按空白分隔的非中文字符串计数。
-_CHINESE_CHAR_RE = re.compile(r"[\u4e00-\u9fff]")
-_WHITESPACE_RE = re.compile(r"\s+")
+from .tokenizer_backends import HeuristicTokenizer, get_tokenizer
 
 
 class TokenCounter:
     """Token 统计器。
 
     优先使用 LLM 服务商（OpenAI 兼容接口）返回的真实用量；当服务商未返回
-    用量信息时，回退到简单的“中文字符数 + 单词数”估算。
+    用量信息时，使用模型配置的分词后端估算（默认“中文字符数 + 单词数”，
+    可在 provider_config.json 中为模型配置本地 BPE 词表）。
     """
 
-    def __init__(self, model_name: str = "qwen3-235b-a22b"):
+    def __init__(self, model_name: str = "qwen3-235b-a22b", tokenizer: Any = None):
         self.model_name = model_name
+        # tokenizer 可以是分词后端实例，或传给 get_tokenizer() 的配置
+        if tokenizer is None or isinstance(tokenizer, (str, dict)):
+            tokenizer = get_tokenizer(tokenizer)
+        self.tokenizer = tokenizer
 
         self.current_round_stats = {
             "user_input_tokens": 0,
@@ -37,26 +38,23 @@ class TokenCounter:
             "total_initial_tokens": 0,
         }
 
-        # "provider usage" 或 "words+chars"
-        self._round_strategy = "words+chars"
+        # "provider usage" 或分词后端名称（"words+chars" / "bpe"）
+        self._round_strategy = self.tokenizer.name
+
+        # 上次统计的上下文：[(消息, token 数)]，按位置对应，用于增量统计
+        self._message_token_cache: List[Tuple[Dict[str, Any], int]] = []
 
     # ------------------------------------------------------------------
-    # 基础计数（兜底策略）
+    # 基础计数
     # ------------------------------------------------------------------
     @staticmethod
     def _count_text_tokens(text: str) -> int:
         """统计文本中的中文字符数与单词数之和。"""
-        if not text:
-            return 0
-        text = str(text)
-        chinese_chars = len(_CHINESE_CHAR_RE.findall(text))
-        non_chinese = _CHINESE_CHAR_RE.sub(" ", text)
-        words = len([w for w in _WHITESPACE_RE.split(non_chinese.strip()) if w])
-        return chinese_chars + words
+        return HeuristicTokenizer().count(text)
 
     def count_tokens(self, text: str) -> int:
-        """返回文本的 token 估算值；在移除 tiktoken 后使用单词+中文字符兜底。"""
-        return self._count_text_tokens(text)
+        """返回文本的 token 估算值（由分词后端计算）。"""
+        return self.tokenizer.count(text)
 
     # ------------------------------------------------------------------
     # 消息 / 工具 / 会话级别的估算
@@ -139,11 +137,38 @@ class TokenCounter:
             "total_initial_tokens": system_tokens + tools_tokens,
         }
 
+    def count_messages_tokens(self, messages: List[Dict[str, Any]]) -> List[int]:
+        """逐条估算消息的 token 数，返回与 messages 等长的列表。
+
+        按位置缓存每条消息的计数：与上次调用同一位置的消息相同（同一对象或
+        内容相等）时直接复用，因此只追加新消息时只需统计新增部分。一旦某个
+        位置不一致（上下文被清空或压缩），其后的消息全部重新统计。
+        """
+        previous = self._message_token_cache
+        cache: List[Tuple[Dict[str, Any], int]] = []
+        reuse = True
+
+        for index, message in enumerate(messages):
+            tokens = None
+            if reuse and index < len(previous):
+                cached_message, cached_tokens = previous[index]
+                # 会话管理器缓存的 SDK 字典通常是同一对象；内容相等时同样复用
+                if cached_message is message or cached_message == message:
+                    tokens = cached_tokens
+                else:
+                    reuse = False
+            if tokens is None:
+                tokens = self.count_message_tokens(message)
+            cache.append((message, tokens))
+
+        self._message_token_cache = cache
+        return [tokens for _, tokens in cache]
+
     def calculate_conversation_tokens(self, messages: List[Dict[str, Any]]) -> int:
-        total_tokens = self.initial_tokens["total_initial_tokens"]
-        for message in messages:
-            total_tokens += self.count_message_tokens(message)
-        return total_tokens
+        """估算完整上下文的 token 数（含系统提示与工具定义）。"""
+        return self.initial_tokens["total_initial_tokens"] + sum(
+            self.count_messages_tokens(messages)
+        )
 
     # ------------------------------------------------------------------
     # 轮次 / 总量统计
@@ -155,7 +180,7 @@ class TokenCounter:
             "tool_result_tokens": 0,
             "total_round_tokens": 0,
         }
-        self._round_strategy = "words+chars"
+        self._round_strategy = self.tokenizer.name
 
     def add_api_usage(
         self,
@@ -0,0 +1,246 @@
+"""
+Token 计数后端 —— TokenCounter 可插拔的分词策略。
+
+- HeuristicTokenizer：中文字符数 + 空白分隔的单词数（无依赖的兜底策略）
+- BPETokenizer：从本地 tiktoken 格式词表文件（每行 "base64(token) rank"）离线加载，
+  首次计数时才读取词表；安装了 tiktoken 时交给它编码，否则使用纯 Python BPE 合并
+- get_tokenizer()：按 provider_config.json 中模型的 "tokenizer" 配置创建并缓存后端，
+  词表缺失或加载失败时回退到启发式策略
+
+配置示例（provider_config.json 中的模型条目）：
+    "tokenizer": {"type": "bpe", "vocab_file": "cl100k_base.tiktoken"}
+相对路径的词表文件在 pyagent/config/tokenizers/ 下查找。
+"""
+
+import base64
+import importlib
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 启发式策略：中文按单个字符计数；其它按空白分隔的非中文字符串计数。
+_CHINESE_CHAR_RE = re.compile(r"[\u4e00-\u9fff]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# 相对路径词表文件的查找目录
+TOKENIZER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config", "tokenizers")
+
+# cl100k / o200k 系列使用的预分词正则（tiktoken 原始写法，需要 \p{..} 支持）
+CL100K_PATTERN = (
+    r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}+|\p{N}{1,3}"""
+    r"""| ?[^\s\p{L}\p{N}]++[\r\n]*|\s*[\r\n]|\s+(?!\S)|\s+"""
+)
+
+# 标准库 re 不支持 \p{..}，用 \w 系列近似：字母 ≈ [^\W\d_]，数字 ≈ \d
+_CL100K_RE_PATTERN = (
+    r"""'(?i:[sdmt]|ll|ve|re)|(?:[^\r\n\w]|_)?[^\W\d_]+|\d{1,3}"""
+    r"""| ?(?:[^\s\w]|_)+[\r\n]*|\s*[\r\n]|\s+(?!\S)|\s+"""
+)
+
+# 纯 Python BPE 合并是 O(n²)，超长片段按此长度分段处理（计数略有偏差）
+_MAX_PIECE_BYTES = 256
+# 片段计数缓存的上限，超出后整体清空
+_PIECE_CACHE_LIMIT = 200_000
+
+
+class HeuristicTokenizer:
+    """统计文本中的中文字符数与单词数之和。"""
+
+    name = "words+chars"
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        text = str(text)
+        chinese_chars = len(_CHINESE_CHAR_RE.findall(text))
+        non_chinese = _CHINESE_CHAR_RE.sub(" ", text)
+        words = len([w for w in _WHITESPACE_RE.split(non_chinese.strip()) if w])
+        return chinese_chars + words
+
+
+class BPETokenizer:
+    """基于本地词表文件的 BPE 计数器（词表在首次使用时加载）。"""
+
+    name = "bpe"
+
+    def __init__(self, vocab_file: str, pattern: Optional[str] = None):
+        self.vocab_file = vocab_file
+        self.pattern = pattern
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._encoding = None  # tiktoken.Encoding（可选加速）
+        self._ranks: Dict[bytes, int] = {}
+        self._splitter: Optional[re.Pattern] = None
+        self._piece_cache: Dict[bytes, int] = {}
+        # 词表加载失败时改用的兜底策略
+        self._fallback: Optional[HeuristicTokenizer] = None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        self._ensure_loaded()
+        text = str(text)
+
+        if self._fallback is not None:
+            return self._fallback.count(text)
+        if self._encoding is not None:
+            return len(self._encoding.encode_ordinary(text))
+
+        total = 0
+        for piece in self._splitter.findall(text):
+            total += self._count_piece(piece.encode("utf-8", errors="surrogatepass"))
+        return total
+
+    # ------------------------------------------------------------------
+    # 内部方法
+    # ------------------------------------------------------------------
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                ranks = load_bpe_ranks(self.vocab_file)
+            except (OSError, ValueError) as e:
+                logger.warning("加载 BPE 词表 %s 失败，使用启发式计数：%s", self.vocab_file, e)
+                self._fallback = HeuristicTokenizer()
+                self._loaded = True
+                return
+            self._encoding = self._try_create_tiktoken_encoding(ranks)
+            if self._encoding is None:
+                self._splitter = self._compile_splitter()
+            self._ranks = ranks
+            self._loaded = True
+
+    def _compile_splitter(self) -> re.Pattern:
+        """编译纯 Python BPE 使用的预分词正则；标准库 re 不支持的写法（如 \\p{L}）回退到内置近似。"""
+        if self.pattern:
+            try:
+                return re.compile(self.pattern)
+            except re.error as e:
+                logger.warning("预分词正则无法由标准库 re 编译，改用内置近似：%s", e)
+        return re.compile(_CL100K_RE_PATTERN)
+
+    def _try_create_tiktoken_encoding(self, ranks: Dict[bytes, int]):
+        try:
+            tiktoken = importlib.import_module("tiktoken")
+        except ImportError:
+            return None
+        try:
+            return tiktoken.Encoding(
+                name=os.path.basename(self.vocab_file),
+                pat_str=self.pattern or CL100K_PATTERN,
+                mergeable_ranks=ranks,
+                special_tokens={},
+            )
+        except Exception as e:
+            logger.warning("tiktoken 初始化失败，改用纯 Python BPE：%s", e)
+            return None
+
+    def _count_piece(self, piece: bytes) -> int:
+        cached = self._piece_cache.get(piece)
+        if cached is not None:
+            return cached
+
+        if len(piece) <= _MAX_PIECE_BYTES:
+            count = self._bpe_merge_count(piece)
+        else:
+            count = sum(
+                self._bpe_merge_count(piece[i:i + _MAX_PIECE_BYTES])
+                for i in range(0, len(piece), _MAX_PIECE_BYTES)
+            )
+
+        if len(self._piece_cache) >= _PIECE_CACHE_LIMIT:
+            self._piece_cache.clear()
+        self._piece_cache[piece] = count
+        return count
+
+    def _bpe_merge_count(self, piece: bytes) -> int:
+        """按 rank 从小到大反复合并相邻片段，返回最终 token 数。"""
+        ranks = self._ranks
+        if piece in ranks:
+            return 1
+
+        parts = [piece[i:i + 1] for i in range(len(piece))]
+        while len(parts) > 1:
+            best_rank = None
+            best_index = -1
+            for i in range(len(parts) - 1):
+                rank = ranks.get(parts[i] + parts[i + 1])
+                if rank is not None and (best_rank is None or rank < best_rank):
+                    best_rank = rank
+                    best_index = i
+            if best_index < 0:
+                break
+            parts[best_index:best_index + 2] = [parts[best_index] + parts[best_index + 1]]
+        return len(parts)
+
+
+def resolve_vocab_path(vocab_file: str) -> str:
+    """解析词表路径：支持 ~ 展开，相对路径在 TOKENIZER_DIR 下查找。"""
+    path = os.path.expanduser(vocab_file)
+    if not os.path.isabs(path):
+        path = os.path.join(TOKENIZER_DIR, path)
+    return path
+
+
+def load_bpe_ranks(vocab_file: str) -> Dict[bytes, int]:
+    """读取 tiktoken 格式的词表文件：每行 "base64(token) rank"。"""
+    ranks: Dict[bytes, int] = {}
+    with open(resolve_vocab_path(vocab_file), "rb") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            token, rank = line.split()
+            ranks[base64.b64decode(token)] = int(rank)
+    return ranks
+
+
+# ---------------------------------------------------------------------------
+# 工厂与缓存
+# ---------------------------------------------------------------------------
+
+_tokenizers: Dict[Any, Any] = {}
+_tokenizers_lock = threading.Lock()
+
+
+def get_tokenizer(config: Optional[Any] = None):
+    """根据模型配置返回（缓存的）分词后端。
+
+    config 可以是 None / "heuristic"，或 {"type": "bpe", "vocab_file": ..., "pattern": ...}。
+    BPE 词表不存在时记录警告并回退到启发式策略。
+    """
+    if isinstance(config, str):
+        config = {"type": config}
+    config = config or {}
+    tokenizer_type = str(config.get("type", "heuristic")).lower()
+
+    if tokenizer_type != "bpe":
+        if tokenizer_type not in ("heuristic", "words+chars"):
+            logger.warning("未知的 tokenizer 类型 %r，使用启发式计数", tokenizer_type)
+        return _get_cached(("heuristic",), HeuristicTokenizer)
+
+    vocab_file = config.get("vocab_file")
+    if not vocab_file or not os.path.isfile(resolve_vocab_path(vocab_file)):
+        logger.warning("未找到 BPE 词表文件 %r，使用启发式计数", vocab_file)
+        return _get_cached(("heuristic",), HeuristicTokenizer)
+
+    pattern = config.get("pattern")
+    key = ("bpe", resolve_vocab_path(vocab_file), pattern)
+    return _get_cached(key, lambda: BPETokenizer(resolve_vocab_path(vocab_file), pattern))
+
+
+def _get_cached(key, factory):
+    with _tokenizers_lock:
+        tokenizer = _tokenizers.get(key)
+        if tokenizer is None:
+            tokenizer = factory()
+            _tokenizers[key] = tokenizer
+        return tokenizer
@@ -0,0 +1,154 @@
+"""
+工具调用调度器 —— 并发执行同一轮助手回复中的多个工具调用。
+
+- 相互独立的调用（read_file / list_directory / execute_command 等）在线程池中并发执行
+- 写同一路径的调用（write_file / edit_file）按原始顺序串行，并经由文件变更队列加锁
+- 绑定调用线程的工具（browser_use 使用 Playwright 同步 API）直接在调用方线程执行；
+  提供 affine_runner 时（多会话服务中的共享浏览器池）改由它代为执行，并按提交顺序串行
+- 调度器只负责执行，结果由调用方按 tool_calls 原始顺序取回并写入会话
+- 工作线程继承提交方的 contextvars 上下文（如会话的持久 shell）
+- 工作线程收不到 Ctrl+C：中断时由 interrupt() 终止仍在运行的命令进程，异常退出时取消未开始的调用
+"""
+
+import contextvars
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from typing import Any, Callable, Dict, List, Optional
+
+from .tools import TOOL_REGISTRY
+from .tools.cmdline import RunningProcesses, activate_running_processes
+from .tools.file_write import _resolve_path
+
+# 单轮最多同时执行的工具调用数
+MAX_PARALLEL_TOOL_CALLS = 8
+
+# 写文件类工具：同一路径上的调用按提交顺序串行
+FILE_MUTATION_TOOLS = TOOL_REGISTRY.names(lambda spec: spec.path_param is not None)
+
+# 必须在调用方线程执行的工具（Playwright 同步 API 不能跨线程使用）
+THREAD_AFFINE_TOOLS = TOOL_REGISTRY.names(lambda spec: spec.thread_affine)
+
+# 经 affine_runner 执行的调用共用的串行键
+_AFFINE_ORDER_KEY = "<thread-affine>"
+
+
+class ToolCallExecutor:
+    """单轮工具调用的执行器。
+
+    submit() 立即返回 Future；max_workers <= 1 时退化为在调用方线程串行执行，
+    与原有逐个执行的行为（包括 Ctrl+C 中断命令）保持一致。
+
+    affine_runner(tool_func, kwargs) 用于执行绑定线程的工具；未提供时这些工具
+    直接在调用方线程执行。
+    """
+
+    def __init__(
+        self,
+        max_workers: int = MAX_PARALLEL_TOOL_CALLS,
+        affine_runner: Optional[Callable[[Callable[..., Any], Dict[str, Any]], Any]] = None,
+    ):
+        self.max_workers = max_workers
+        self.affine_runner = affine_runner
+        self._pool: Optional[ThreadPoolExecutor] = None
+        # 每个被写入路径上最后一次提交的调用，后续同路径调用需等待它完成
+        self._path_tails: Dict[str, Future] = {}
+        # 提交到线程池的调用
+        self._futures: List[Future] = []
+        # 工作线程中正在执行命令的子进程
+        self._running = RunningProcesses()
+
+    def __enter__(self) -> "ToolCallExecutor":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # 异常（如 Ctrl+C）退出时取消尚未开始的调用，并终止正在运行的命令，
+        # 否则工作线程会一直等待命令结束，使解释器无法退出
+        if exc_type is not None:
+            self.interrupt()
+        self.shutdown(wait=exc_type is None)
+
+    def submit(self, function_name: str, tool_func: Callable[..., Any], kwargs: Dict[str, Any]) -> Future:
+        """提交一次工具调用。"""
+        if function_name in THREAD_AFFINE_TOOLS:
+            if self.affine_runner is None:
+                return self._run_inline(tool_func, kwargs)
+            kwargs = {"tool_func": tool_func, "kwargs": kwargs}
+            tool_func = self._run_affine
+            mutation_path = _AFFINE_ORDER_KEY
+        else:
+            mutation_path = self._get_mutation_path(function_name, kwargs)
+
+        if self.max_workers <= 1:
+            return self._run_inline(tool_func, kwargs)
+
+        previous = self._path_tails.get(mutation_path) if mutation_path else None
+
+        context = contextvars.copy_context()
+        context.run(activate_running_processes, self._running)
+        future = self._get_pool().submit(context.run, self._run_after, previous, tool_func, kwargs)
+        self._futures.append(future)
+        if mutation_path:
+            self._path_tails[mutation_path] = future
+        return future
+
+    def interrupt(self) -> int:
+        """取消尚未开始的调用并终止工作线程中正在运行的命令，返回终止的命令数。
+
+        被终止的命令照常返回结果（标记为用户中断）。
+        """
+        for future in self._futures:
+            # 已开始执行的调用无法取消，cancel() 对其无效
+            future.cancel()
+        return self._running.kill_all()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """释放线程池；wait=True 时等待所有已提交的调用结束。"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=not wait)
+            self._pool = None
+        self._path_tails.clear()
+        self._futures.clear()
+
+    # ------------------------------------------------------------------
+    # 内部方法
+    # ------------------------------------------------------------------
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="pyagent-tool",
+            )
+        return self._pool
+
+    @staticmethod
+    def _get_mutation_path(function_name: str, kwargs: Dict[str, Any]) -> Optional[str]:
+        """返回写文件类调用的目标绝对路径，其余调用返回 None。"""
+        if function_name not in FILE_MUTATION_TOOLS:
+            return None
+        path = kwargs.get(TOOL_REGISTRY[function_name].path_param)
+        if not path or not isinstance(path, str):
+            return None
+        return _resolve_path(path)
+
+    def _run_affine(self, tool_func: Callable[..., Any], kwargs: Dict[str, Any]) -> Any:
+        return self.affine_runner(tool_func, kwargs)
+
+    @staticmethod
+    def _run_after(previous: Optional[Future], tool_func: Callable[..., Any], kwargs: Dict[str, Any]) -> Any:
+        # 线程池按 FIFO 取任务，前序调用一定已被其它工作线程领取，不会死锁
+        if previous is not None:
+            wait_futures([previous])
+            # 前序写入因中断被取消时，后续同路径写入也不再执行
+            if previous.cancelled():
+                raise CancelledError()
+        return tool_func(**kwargs)
+
+    @staticmethod
+    def _run_inline(tool_func: Callable[..., Any], kwargs: Dict[str, Any]) -> Future:
+        future: Future = Future()
+        try:
+            future.set_result(tool_func(**kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
@@ -1,24 +1,41 @@
 from .cmdline import COMMAND_FUNCTIONS, COMMAND_TOOLS
+from .code_index import SEARCH_CODE_FUNCTIONS, SEARCH_CODE_TOOLS
+from .command_jobs import COMMAND_JOB_FUNCTIONS, COMMAND_JOB_TOOLS
 from .directory_list import DIRECTORY_FUNCTIONS, DIRECTORY_TOOLS
 from .edit import EDIT_FUNCTIONS, EDIT_TOOLS
 from .file_write import FILE_WRITE_FUNCTIONS, FILE_WRITE_TOOLS
 from .read_file import READ_FILE_FUNCTIONS, READ_FILE_TOOLS
+from .registry import ToolRegistry, ToolSpec, compile_validator
+from .search_files import SEARCH_FILES_FUNCTIONS, SEARCH_FILES_TOOLS
 from .web_browser import WEB_BROWSER_FUNCTIONS, WEB_BROWSER_TOOLS
 
-TOOLS = [
-    *COMMAND_TOOLS,
-    *DIRECTORY_TOOLS,
-    *EDIT_TOOLS,
-    *FILE_WRITE_TOOLS,
-    *READ_FILE_TOOLS,
-    *WEB_BROWSER_TOOLS,
-]
-
-TOOL_FUNCTIONS = {
-    **COMMAND_FUNCTIONS,
-    **DIRECTORY_FUNCTIONS,
-    **EDIT_FUNCTIONS,
-    **FILE_WRITE_FUNCTIONS,
-    **READ_FILE_FUNCTIONS,
-    **WEB_BROWSER_FUNCTIONS,
+# 各工具的调度元数据，未列出的字段取 ToolSpec 的默认值
+TOOL_METADATA = {
+    "execute_command": {"timeout": 60},
+    "command_job": {},
+    "list_directory": {"read_only": True},
+    "edit_file": {"path_param": "path"},
+    "write_file": {"path_param": "path"},
+    "read_file": {"read_only": True},
+    "search_files": {"read_only": True},
+    "search_code": {"read_only": True},
+    "browser_use": {"thread_affine": True, "timeout": 30},
 }
+
+TOOL_REGISTRY = ToolRegistry()
+for _schemas, _functions in (
+    (COMMAND_TOOLS, COMMAND_FUNCTIONS),
+    (COMMAND_JOB_TOOLS, COMMAND_JOB_FUNCTIONS),
+    (DIRECTORY_TOOLS, DIRECTORY_FUNCTIONS),
+    (EDIT_TOOLS, EDIT_FUNCTIONS),
+    (FILE_WRITE_TOOLS, FILE_WRITE_FUNCTIONS),
+    (READ_FILE_TOOLS, READ_FILE_FUNCTIONS),
+    (SEARCH_FILES_TOOLS, SEARCH_FILES_FUNCTIONS),
+    (SEARCH_CODE_TOOLS, SEARCH_CODE_FUNCTIONS),
+    (WEB_BROWSER_TOOLS, WEB_BROWSER_FUNCTIONS),
+):
+    TOOL_REGISTRY.register_all(_schemas, _functions, TOOL_METADATA)
+
+TOOLS = TOOL_REGISTRY.schemas
+
+TOOL_FUNCTIONS = TOOL_REGISTRY.functions
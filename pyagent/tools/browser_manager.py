@@ -4,13 +4,19 @@
 管理 Playwright 浏览器实例的创建、复用和销毁。
 采用模块级单例模式，Agent 会话期间保持浏览器存活以支持同一网站的多次操作，
 会话结束时统一清理防止内存泄露。
+
+多会话服务（pyagent.server）中使用 BrowserPool：所有会话共享一个 Chromium 进程，
+每个会话拥有独立的 BrowserContext；Playwright 同步 API 绑定线程，因此所有浏览器
+操作都在连接池专属的线程上执行。
 """
 
+import contextvars
 import os
 import sys
 import subprocess
 import logging
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -20,10 +26,18 @@ logger = logging.getLogger(__name__)
 
 _browser_manager: Optional['BrowserManager'] = None
 
+# BrowserPool 在其线程上执行操作时设置的当前会话管理器
+_session_manager: contextvars.ContextVar[Optional['BrowserManager']] = contextvars.ContextVar(
+    "pyagent_browser_session", default=None
+)
+
 
 def get_browser_manager() -> 'BrowserManager':
-    """获取浏览器管理器单例。"""
+    """获取当前会话的浏览器管理器（不在 BrowserPool 中时为模块级单例）。"""
     global _browser_manager
+    session_manager = _session_manager.get()
+    if session_manager is not None:
+        return session_manager
     if _browser_manager is None:
         _browser_manager = BrowserManager()
     return _browser_manager
@@ -32,6 +46,10 @@ def get_browser_manager() -> 'BrowserManager':
 def cleanup_browser() -> None:
     """清理浏览器资源，供 Agent 会话结束时调用。"""
     global _browser_manager
+    session_manager = _session_manager.get()
+    if session_manager is not None:
+        session_manager.cleanup()
+        return
     if _browser_manager is not None:
         _browser_manager.cleanup()
         _browser_manager = None
@@ -49,9 +67,11 @@ class BrowserManager:
     - 会话复用：同一会话中多次调用共享浏览器实例
     - 无头模式：默认以 headless 模式运行，适合服务器/CLI 环境
     - 自动清理：调用 cleanup() 释放所有资源
+    - 共享模式：传入 pool 时复用 BrowserPool 的浏览器，只创建自己的 context / page
     """
 
-    def __init__(self):
+    def __init__(self, pool: Optional['BrowserPool'] = None):
+        self._pool = pool
         self._playwright = None
         self._browser = None
         self._context = None
@@ -69,14 +89,22 @@ class BrowserManager:
         若已有 page 且未关闭，直接复用。
         若检测到 Chromium 浏览器未安装，自动调用 playwright install 安装。
         """
-        if self._playwright is None:
-            from playwright.sync_api import sync_playwright
-            self._playwright = sync_playwright().start()
-
-        if self._browser is None or not self._browser.is_connected():
-            # 使用环境变量或默认配置
-            headless = os.environ.get("PLAYWRIGHT_HEADLESS", "true").lower() != "false"
-            self._browser = self._launch_browser_with_auto_install(headless)
+        if self._pool is not None:
+            browser = self._pool._get_browser()
+            if browser is not self._browser:
+                # 共享浏览器已重启，旧的 context 随之失效
+                self._browser = browser
+                self._context = None
+                self._page = None
+        else:
+            if self._playwright is None:
+                from playwright.sync_api import sync_playwright
+                self._playwright = sync_playwright().start()
+
+            if self._browser is None or not self._browser.is_connected():
+                # 使用环境变量或默认配置
+                headless = os.environ.get("PLAYWRIGHT_HEADLESS", "true").lower() != "false"
+                self._browser = self._launch_browser_with_auto_install(headless)
 
         if self._context is None:
             # 自动读取系统代理环境变量
@@ -340,6 +368,12 @@ class BrowserManager:
             pass
         self._context = None
 
+        if self._pool is not None:
+            # 共享的浏览器由 BrowserPool.close() 关闭
+            self._browser = None
+            self._current_url = ""
+            return
+
         try:
             if self._browser is not None and self._browser.is_connected():
                 self._browser.close()
@@ -367,3 +401,65 @@ class BrowserManager:
             )
         except Exception:
             return False
+
+
+# ---------------------------------------------------------------------------
+# BrowserPool（多会话共享）
+# ---------------------------------------------------------------------------
+
+class BrowserPool:
+    """多个会话共享的浏览器池。
+
+    - 一个 Playwright 实例与一个 Chromium 进程，首次使用时启动
+    - 每个会话通过 create_session() 获得独立的 BrowserManager（独立 context / page）
+    - run() 将操作提交到池的专属线程执行，并在执行期间把该会话的管理器设为当前管理器，
+      因此工具代码中的 get_browser_manager() / cleanup_browser() 无需修改
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pyagent-browser")
+        self._launcher = BrowserManager()
+        self._closed = False
+
+    def create_session(self) -> BrowserManager:
+        """为一个会话创建浏览器管理器（浏览器本身延迟到首次使用时启动）。"""
+        return BrowserManager(pool=self)
+
+    def run(self, manager: BrowserManager, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """在浏览器线程上以 manager 为当前会话执行 func，阻塞直到返回。"""
+        if self._closed:
+            raise RuntimeError("浏览器池已关闭")
+
+        def _call():
+            token = _session_manager.set(manager)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _session_manager.reset(token)
+
+        return self._executor.submit(_call).result()
+
+    def close_session(self, manager: BrowserManager) -> None:
+        """关闭会话的 context / page，共享浏览器保持运行。"""
+        if not self._closed:
+            self.run(manager, manager.cleanup)
+
+    def close(self) -> None:
+        """关闭共享浏览器并停止浏览器线程。"""
+        if self._closed:
+            return
+        self._executor.submit(self._launcher.cleanup).result()
+        self._closed = True
+        self._executor.shutdown(wait=True)
+
+    def _get_browser(self):
+        """返回共享浏览器（仅在浏览器线程上调用）。"""
+        launcher = self._launcher
+        if launcher._playwright is None:
+            from playwright.sync_api import sync_playwright
+            launcher._playwright = sync_playwright().start()
+
+        if launcher._browser is None or not launcher._browser.is_connected():
+            headless = os.environ.get("PLAYWRIGHT_HEADLESS", "true").lower() != "false"
+            launcher._browser = launcher._launch_browser_with_auto_install(headless)
+        return launcher._browser
@@ -1,5 +1,5 @@
 """
-命令行工具 —— 在全新隔离会话中执行命令，完成后自动销毁。
+命令行工具 —— 默认在全新隔离会话中执行命令，完成后自动销毁；可选持久 shell 模式。
 
 移植并增强自 pi 框架（@earendil-works/pi-coding-agent）的 bash 工具：
 - 双维度输出截断：行数限制（默认 2000 行）+ 字节限制（默认 50KB），先到先截
@@ -7,16 +7,24 @@
 - 渐进式展示：保留输出末尾（tail），适合查看命令错误和最终结果
 - 更好的错误处理：区分退出码、超时、中断
 - 跨平台支持：Windows（Git Bash）/ Linux / macOS
+- 可选的持久 shell 模式（ShellSession）：同一 Agent 会话的命令复用一个长期运行的 bash
 """
 
+import codecs
+import contextvars
 import os
+import queue
 import random
+import select
+import selectors
+import shlex
 import shutil
 import signal
 import subprocess
 import tempfile
 import threading
 import time
+from collections import deque
 from pathlib import Path
 
 # ---------------------------------------------------------------------------
@@ -41,6 +49,54 @@ _tracked_pids: set[int] = set()
 _tracked_pids_lock = threading.Lock()
 
 
+
+class RunningProcesses:
+    """
+    一组正在执行命令的子进程。
+
+    工作线程中执行的命令收不到 Ctrl+C，由持有方（ToolCallExecutor）在中断时调用 kill_all()
+    终止它们；被终止的命令照常返回，结果标记为用户中断。
+    """
+
+    def __init__(self):
+        self._pids: set[int] = set()
+        self._killed: set[int] = set()
+        self._lock = threading.Lock()
+
+    def add(self, pid: int) -> None:
+        with self._lock:
+            self._pids.add(pid)
+
+    def discard(self, pid: int) -> None:
+        with self._lock:
+            self._pids.discard(pid)
+            self._killed.discard(pid)
+
+    def was_killed(self, pid: int) -> bool:
+        with self._lock:
+            return pid in self._killed
+
+    def kill_all(self) -> int:
+        """终止所有正在执行命令的进程树，返回终止的数量。"""
+        with self._lock:
+            pids = self._pids - self._killed
+            self._killed |= pids
+        for pid in pids:
+            _kill_process_tree(pid)
+        return len(pids)
+
+
+# 当前上下文中执行的命令登记到的进程集合（由 ToolCallExecutor 为工作线程设置）
+_running_processes: contextvars.ContextVar["RunningProcesses | None"] = contextvars.ContextVar(
+    "pyagent_running_processes", default=None
+)
+
+# 当前 Agent 会话的持久 shell；未设置时每条命令使用全新的 shell
+_current_shell: contextvars.ContextVar["ShellSession | None"] = contextvars.ContextVar(
+    "pyagent_shell_session", default=None
+)
+
+
 # ---------------------------------------------------------------------------
 # 截断工具（移植自 pi 框架 truncate.js）
 # ---------------------------------------------------------------------------
@@ -174,8 +230,8 @@ class OutputAccumulator:
     """
     增量式跟踪流式输出，保持有界内存占用。
 
-    - 使用流式 UTF-8 解码器追加解码块
-    - 仅保留解码后的尾部用于展示快照
+    - 字节数与行数直接在原始字节上统计（UTF-8 中换行符不会出现在多字节字符内部）
+    - 尾部以原始字节块的环形缓冲保存，仅在生成快照时用增量解码器解码一次
     - 当完整输出需要保留时，打开临时文件
     """
 
@@ -191,12 +247,12 @@ class OutputAccumulator:
         self.temp_file_prefix = temp_file_prefix
 
         self._raw_chunks: list[bytes] = []
-        self._tail_text = ""
+        # 尾部环形缓冲：最近的原始字节块，总量超过上限的两倍时从头部整块丢弃
+        self._tail_chunks: deque[bytes] = deque()
         self._tail_bytes = 0
         self._tail_starts_at_line_boundary = True
 
         self.total_raw_bytes = 0
-        self.total_decoded_bytes = 0
         self.completed_lines = 0
         self.total_lines = 0
         self.current_line_bytes = 0
@@ -205,8 +261,6 @@ class OutputAccumulator:
 
         self.temp_file_path: str | None = None
         self._temp_file_handle = None
-        # UTF-8 流式解码器状态
-        self._decoder_state: list[bytes] = []
 
     # ------------------------------------------------------------------
     # 公共 API
@@ -216,38 +270,26 @@ class OutputAccumulator:
         """追加原始字节数据。"""
         if self.finished:
             raise RuntimeError("Cannot append to a finished OutputAccumulator")
+        if not data:
+            return
 
         self.total_raw_bytes += len(data)
-
-        # 流式解码
-        decoded = self._stream_decode(data)
-        if decoded:
-            self._append_decoded_text(decoded)
+        self._count_lines(data)
+        self._append_tail(data)
 
         # 超过阈值时写入临时文件
         if self._temp_file_handle is not None or self._should_use_temp_file():
             self._ensure_temp_file()
             self._temp_file_handle.write(data)
-        elif len(data) > 0:
+        else:
             self._raw_chunks.append(data)
 
     def finish(self) -> None:
-        """完成输出，刷新解码器缓冲区。"""
+        """完成输出；此后快照会将末尾不完整的 UTF-8 字符替换为 U+FFFD。"""
         if self.finished:
             return
         self.finished = True
 
-        # 刷新流式解码器
-        remainder = b"".join(self._decoder_state)
-        if remainder:
-            try:
-                decoded = remainder.decode("utf-8")
-            except UnicodeDecodeError:
-                decoded = remainder.decode("utf-8", errors="replace")
-            if decoded:
-                self._append_decoded_text(decoded)
-            self._decoder_state.clear()
-
         if self._should_use_temp_file():
             self._ensure_temp_file()
 
@@ -261,7 +303,7 @@ class OutputAccumulator:
 
         truncated = (
             self.total_lines > self.max_lines
-            or self.total_decoded_bytes > self.max_bytes
+            or self.total_raw_bytes > self.max_bytes
         )
         truncated_by = (
             tail_truncation["truncated_by"]
@@ -270,7 +312,7 @@ class OutputAccumulator:
         )
         if truncated and truncated_by is None:
             truncated_by = (
-                "bytes" if self.total_decoded_bytes > self.max_bytes else "lines"
+                "bytes" if self.total_raw_bytes > self.max_bytes else "lines"
             )
 
         truncation_info = {
@@ -278,7 +320,7 @@ class OutputAccumulator:
             "truncated": truncated,
             "truncated_by": truncated_by,
             "total_lines": self.total_lines,
-            "total_bytes": self.total_decoded_bytes,
+            "total_bytes": self.total_raw_bytes,
             "max_lines": self.max_lines,
             "max_bytes": self.max_bytes,
         }
@@ -310,86 +352,62 @@ class OutputAccumulator:
     # 内部方法
     # ------------------------------------------------------------------
 
-    def _stream_decode(self, data: bytes) -> str:
-        """流式 UTF-8 解码，正确处理多字节字符边界。"""
-        self._decoder_state.append(data)
-        raw = b"".join(self._decoder_state)
-        # 尝试完整解码，如果失败则保留最后几个字节（可能是截断的多字节字符）
-        for trim in range(4):
-            try:
-                result = raw.decode("utf-8") if trim == 0 else raw[: -(trim)].decode("utf-8")
-                # 只保留未解码的尾部
-                self._decoder_state = [raw[-(trim):]] if trim > 0 else []
-                return result
-            except UnicodeDecodeError:
-                continue
-        # 最终回退
-        self._decoder_state = []
-        return raw.decode("utf-8", errors="replace")
-
-    def _append_decoded_text(self, text: str) -> None:
-        """追加已解码文本。"""
-        if len(text) == 0:
-            return
-
-        byte_count = len(text.encode("utf-8"))
-        self.total_decoded_bytes += byte_count
-        self._tail_text += text
-        self._tail_bytes += byte_count
-
-        # 滚动缓冲区超出上限时裁剪
-        if self._tail_bytes > self.max_rolling_bytes * 2:
-            self._trim_tail()
-
-        # 统计行
-        newlines = text.count("\n")
-        last_newline = text.rfind("\n")
-
-        if newlines == 0:
-            self.current_line_bytes += byte_count
+    def _count_lines(self, data: bytes) -> None:
+        """在原始字节上统计行数与最后一行的字节数。"""
+        last_newline = data.rfind(b"\n")
+        if last_newline == -1:
+            self.current_line_bytes += len(data)
             self.has_open_line = True
         else:
-            self.completed_lines += newlines
-            tail = text[last_newline + 1:]
-            self.current_line_bytes = len(tail.encode("utf-8"))
-            self.has_open_line = len(tail) > 0
+            self.completed_lines += data.count(b"\n")
+            self.current_line_bytes = len(data) - last_newline - 1
+            self.has_open_line = self.current_line_bytes > 0
 
         self.total_lines = self.completed_lines + (1 if self.has_open_line else 0)
 
-    def _trim_tail(self) -> None:
-        """裁剪滚动缓冲区到上限。"""
-        buf = self._tail_text.encode("utf-8")
-        if len(buf) <= self.max_rolling_bytes:
-            self._tail_bytes = len(buf)
+    def _append_tail(self, data: bytes) -> None:
+        """将字节块加入尾部环形缓冲，必要时从头部整块丢弃。"""
+        if len(data) > self.max_rolling_bytes:
+            # 单块已超过上限：只保留它的末尾
+            start = len(data) - self.max_rolling_bytes
+            self._tail_chunks.clear()
+            self._tail_chunks.append(data[start:])
+            self._tail_bytes = self.max_rolling_bytes
+            self._tail_starts_at_line_boundary = data[start - 1] == 0x0A
             return
 
-        start = len(buf) - self.max_rolling_bytes
-        # 找到 UTF-8 字符边界
-        while start < len(buf) and (buf[start] & 0xC0) == 0x80:
-            start += 1
+        self._tail_chunks.append(data)
+        self._tail_bytes += len(data)
+        if self._tail_bytes <= self.max_rolling_bytes * 2:
+            return
 
-        self._tail_starts_at_line_boundary = (
-            start == 0
-            and self._tail_starts_at_line_boundary
-            or (start > 0 and buf[start - 1] == 0x0A)
-        )
-        self._tail_text = buf[start:].decode("utf-8")
-        self._tail_bytes = len(self._tail_text.encode("utf-8"))
+        # 整块丢弃，保证剩余部分不少于 max_rolling_bytes，避免切片复制
+        while self._tail_bytes - len(self._tail_chunks[0]) >= self.max_rolling_bytes:
+            dropped = self._tail_chunks.popleft()
+            self._tail_bytes -= len(dropped)
+            self._tail_starts_at_line_boundary = dropped.endswith(b"\n")
 
     def _get_snapshot_text(self) -> str:
-        """获取用于截断快照的文本（从行边界开始）。"""
-        if self._tail_starts_at_line_boundary:
-            return self._tail_text
-        first_newline = self._tail_text.find("\n")
-        if first_newline == -1:
-            return self._tail_text
-        return self._tail_text[first_newline + 1:]
+        """解码尾部缓冲，得到用于截断快照的文本（从行边界或字符边界开始）。"""
+        raw = b"".join(self._tail_chunks)
+        start = 0
+        if not self._tail_starts_at_line_boundary:
+            first_newline = raw.find(b"\n")
+            if first_newline != -1:
+                start = first_newline + 1
+            else:
+                # 整个尾部都在同一行内：跳过开头被截断的 UTF-8 续字节
+                while start < len(raw) and (raw[start] & 0xC0) == 0x80:
+                    start += 1
+
+        # 输出尚未结束时，末尾不完整的多字节字符留在解码器中而不是替换为乱码
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        return decoder.decode(memoryview(raw)[start:], final=self.finished)
 
     def _should_use_temp_file(self) -> bool:
         """判断是否需要使用临时文件。"""
         return (
             self.total_raw_bytes > self.max_bytes
-            or self.total_decoded_bytes > self.max_bytes
             or self.total_lines > self.max_lines
         )
 
@@ -515,16 +533,133 @@ def _kill_process_tree(pid: int) -> None:
                 pass
 
 
+# ---------------------------------------------------------------------------
+# 输出泵：在调用方线程中读取子进程的 stdout / stderr
+# ---------------------------------------------------------------------------
+
+# 单次读取的初始大小；一次读满时加倍，直到上限
+PUMP_MIN_READ_SIZE = 4096
+PUMP_MAX_READ_SIZE = 1024 * 1024
+# 进程退出后，仍持有管道的后台子进程最多再等待这么久
+PUMP_DRAIN_GRACE = 5.0
+# 无输出时检查进程是否已退出的间隔
+_PUMP_POLL_INTERVAL = 0.05
+
+
+def _pump_process_output(process, sink, deadline: float | None) -> bool:
+    """
+    读取子进程的 stdout / stderr，直到两者都结束或到达 deadline（time.monotonic()）。
+
+    sink(tag, data) 在调用方线程中按读取顺序依次调用，tag 为 "stdout" 或 "stderr"，
+    因此同一个 OutputAccumulator 不会被并发追加。
+
+    Returns:
+        bool: 是否因到达 deadline 而返回
+    """
+    streams = {
+        stream: tag
+        for stream, tag in ((process.stdout, "stdout"), (process.stderr, "stderr"))
+        if stream is not None
+    }
+    if os.name == "nt":
+        # Windows 的管道不支持 select，由读取线程转交给调用方线程
+        return _pump_process_output_threaded(process, streams, sink, deadline)
+
+    read_sizes: dict[int, int] = {}
+    drain_deadline = None
+    with selectors.DefaultSelector() as selector:
+        for stream, tag in streams.items():
+            selector.register(stream.fileno(), selectors.EVENT_READ, tag)
+            read_sizes[stream.fileno()] = PUMP_MIN_READ_SIZE
+
+        while selector.get_map():
+            if _past(deadline):
+                return True
+            if _past(drain_deadline):
+                break
+
+            # 进程退出后开始计算宽限期；后台子进程持续写入管道时也不会一直等下去
+            if drain_deadline is None and process.poll() is not None:
+                drain_deadline = time.monotonic() + PUMP_DRAIN_GRACE
+
+            events = selector.select(_pump_wait_time(deadline, drain_deadline))
+
+            for key, _ in events:
+                size = read_sizes[key.fd]
+                data = os.read(key.fd, size)
+                if not data:
+                    selector.unregister(key.fd)
+                    continue
+                if len(data) == size and size < PUMP_MAX_READ_SIZE:
+                    read_sizes[key.fd] = size * 2
+                sink(key.data, data)
+    return False
+
+
+def _pump_process_output_threaded(process, streams: dict, sink, deadline: float | None) -> bool:
+    """_pump_process_output 在 Windows 上的实现：读取线程只入队，sink 仍在调用方线程执行。"""
+    chunks: queue.Queue = queue.Queue()
+
+    def _read_stream(stream, tag: str) -> None:
+        try:
+            for chunk in iter(lambda: stream.read1(PUMP_MAX_READ_SIZE), b""):
+                chunks.put((tag, chunk))
+        except Exception:
+            pass
+        finally:
+            chunks.put((tag, None))
+
+    for stream, tag in streams.items():
+        threading.Thread(target=_read_stream, args=(stream, tag), daemon=True).start()
+
+    open_streams = len(streams)
+    drain_deadline = None
+    while open_streams:
+        if _past(deadline):
+            return True
+        if _past(drain_deadline):
+            break
+        if drain_deadline is None and process.poll() is not None:
+            drain_deadline = time.monotonic() + PUMP_DRAIN_GRACE
+        try:
+            tag, data = chunks.get(timeout=_pump_wait_time(deadline, drain_deadline))
+        except queue.Empty:
+            continue
+        if data is None:
+            open_streams -= 1
+        else:
+            sink(tag, data)
+    return False
+
+
+def _past(deadline: float | None) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def _pump_wait_time(deadline: float | None, drain_deadline: float | None) -> float:
+    """下一次等待的秒数：不超过轮询间隔和最近的截止时间。"""
+    now = time.monotonic()
+    wait = _PUMP_POLL_INTERVAL
+    for limit in (deadline, drain_deadline):
+        if limit is not None:
+            wait = min(wait, limit - now)
+    return max(wait, 0)
+
+
 # ---------------------------------------------------------------------------
 # 命令执行（移植自 pi 框架 executeBashWithOperations）
 # ---------------------------------------------------------------------------
 
-def execute_command(command: str = None, timeout: int = 60):
+def execute_command(command: str = None, timeout: int = 60, separate_stderr: bool = False):
     """
-    在全新隔离会话中执行一条 shell 命令，完成后自动销毁。
+    执行一条 shell 命令。
+
+    默认每条命令在全新隔离会话中运行，完成后自动销毁，命令之间不共享状态。
+    当前上下文启用了持久 shell（activate_shell_session，Linux/macOS）时，
+    命令交给该 ShellSession 执行：工作目录和环境变量（cd、export 等）在命令间保留；
+    超时或中断会重建 shell，此时只保留最后的工作目录。
 
     特性（移植自 pi 框架）：
-    - 每条命令独立运行，不共享状态。
     - 输出保留末尾（tail）：最多 2000 行或 50KB，先到先截。
     - 截断时自动将完整输出保存到临时文件，返回文件路径。
     - 超时后强制终止并返回已产生的输出。
@@ -533,6 +668,7 @@ def execute_command(command: str = None, timeout: int = 60):
     Args:
         command: 要执行的 shell 命令。
         timeout: 超时秒数（默认 60 秒）。传入 -1 表示无超时限制。
+        separate_stderr: 为 True 时标准错误单独截断并展示（持久 shell 模式下始终合并）。
 
     Returns:
         str: 命令执行结果。若输出被截断，包含临时文件路径供后续读取。
@@ -540,8 +676,13 @@ def execute_command(command: str = None, timeout: int = 60):
     if not command:
         return "❌ 错误：必须提供要执行的命令(command)"
 
+    shell_session = _current_shell.get()
+    if shell_session is not None and os.name != "nt":
+        return shell_session.run(command, timeout)
+
     child_process = None
     output = OutputAccumulator(temp_file_prefix="pi-cmd")
+    stderr_output = OutputAccumulator(temp_file_prefix="pi-cmd-stderr") if separate_stderr else None
     cancelled = False
     timed_out = False
 
@@ -560,47 +701,37 @@ def execute_command(command: str = None, timeout: int = 60):
 
         child_process = subprocess.Popen(**spawn_kwargs)
 
+        running = _running_processes.get()
         if child_process.pid:
             _track_child_pid(child_process.pid)
+            if running is not None:
+                running.add(child_process.pid)
 
         # ------------------------------------------------------------------
-        # 流式读取 stdout 和 stderr
+        # 单线程读取 stdout 和 stderr，直到两者结束或超时
         # ------------------------------------------------------------------
 
-        def _read_stream(stream, is_stderr: bool):
-            """读取输出流并追加到累加器。"""
-            try:
-                for chunk in iter(lambda: stream.read(4096), b""):
-                    if chunk:
-                        output.append(chunk)
-            except Exception:
-                pass
-
-        # 使用线程并发读取 stdout 和 stderr
-        stdout_thread = threading.Thread(
-            target=_read_stream,
-            args=(child_process.stdout, False),
-            daemon=True,
-        )
-        stderr_thread = threading.Thread(
-            target=_read_stream,
-            args=(child_process.stderr, True),
-            daemon=True,
-        )
+        def _sink(tag: str, data: bytes) -> None:
+            if tag == "stderr" and stderr_output is not None:
+                stderr_output.append(data)
+            else:
+                output.append(data)
 
-        stdout_thread.start()
-        stderr_thread.start()
+        _wait_timeout = _wait_timeout_seconds(timeout)
+        deadline = None if _wait_timeout is None else time.monotonic() + _wait_timeout
+        timed_out = _pump_process_output(child_process, _sink, deadline)
 
-        # ------------------------------------------------------------------
-        # 等待进程结束（使用原生 wait(timeout=...) 确保超时可靠）
-        # ------------------------------------------------------------------
-        _wait_timeout = None if (timeout is not None and timeout == -1) else (timeout if timeout and timeout > 0 else 60)
+        # 输出已结束但进程可能仍在运行（例如关闭了自己的输出），继续等到超时
+        if not timed_out:
+            try:
+                child_process.wait(
+                    timeout=None if deadline is None else max(deadline - time.monotonic(), 0)
+                )
+            except subprocess.TimeoutExpired:
+                timed_out = True
 
-        try:
-            child_process.wait(timeout=_wait_timeout)
-        except subprocess.TimeoutExpired:
+        if timed_out:
             # 超时：强制终止进程树并标记超时
-            timed_out = True
             if child_process.pid:
                 _kill_process_tree(child_process.pid)
             # 再给进程一个短暂的宽限期完成清理
@@ -613,14 +744,14 @@ def execute_command(command: str = None, timeout: int = 60):
                     child_process.wait(timeout=5)
                 except Exception:
                     pass
+            # 收集终止前已写入管道的剩余输出
+            _pump_process_output(child_process, _sink, time.monotonic() + PUMP_DRAIN_GRACE)
 
-        # 等待读取线程结束（设上限避免无限阻塞）
-        stdout_thread.join(timeout=5)
-        stderr_thread.join(timeout=5)
+        # 调度器因用户中断终止了进程（命令在工作线程中执行，收不到 Ctrl+C）
+        cancelled = running is not None and running.was_killed(child_process.pid)
 
-        output.finish()
-        snapshot = output.snapshot(persist_if_truncated=True)
-        output.close_temp_file()
+        snapshot = _finish_output(output)
+        stderr_snapshot = _finish_output(stderr_output)
 
         elapsed = int(time.time() - start_time)
 
@@ -631,9 +762,11 @@ def execute_command(command: str = None, timeout: int = 60):
             snapshot=snapshot,
             command=command,
             elapsed=elapsed,
-            exit_code=child_process.returncode,
-            cancelled=False,
-            timed_out=timed_out,
+            exit_code=None if cancelled else child_process.returncode,
+            cancelled=cancelled,
+            timed_out=timed_out and not cancelled,
+            timeout_seconds=timeout,
+            stderr_snapshot=stderr_snapshot,
         )
 
     except KeyboardInterrupt:
@@ -641,9 +774,8 @@ def execute_command(command: str = None, timeout: int = 60):
         cancelled = True
         if child_process and child_process.pid:
             _kill_process_tree(child_process.pid)
-        output.finish()
-        snapshot = output.snapshot(persist_if_truncated=True)
-        output.close_temp_file()
+        snapshot = _finish_output(output)
+        stderr_snapshot = _finish_output(stderr_output)
 
         elapsed = int(time.time() - start_time) if "start_time" in dir() else 0
 
@@ -654,17 +786,17 @@ def execute_command(command: str = None, timeout: int = 60):
             exit_code=None,
             cancelled=True,
             timed_out=False,
+            stderr_snapshot=stderr_snapshot,
         )
 
     except FileNotFoundError as e:
-        output.finish()
-        output.close_temp_file()
+        _finish_output(output)
+        _finish_output(stderr_output)
         return f"❌ 执行命令时发生错误: {str(e)}"
 
     except Exception as e:
-        output.finish()
-        snapshot = output.snapshot(persist_if_truncated=True)
-        output.close_temp_file()
+        snapshot = _finish_output(output)
+        stderr_snapshot = _finish_output(stderr_output)
 
         elapsed = int(time.time() - start_time) if "start_time" in dir() else 0
 
@@ -677,6 +809,7 @@ def execute_command(command: str = None, timeout: int = 60):
                 cancelled=False,
                 timed_out=True,
                 timeout_seconds=timeout,
+                stderr_snapshot=stderr_snapshot,
             )
 
         return f"❌ 执行命令时发生错误: {str(e)}"
@@ -685,6 +818,8 @@ def execute_command(command: str = None, timeout: int = 60):
         if child_process is not None:
             if child_process.pid:
                 _untrack_child_pid(child_process.pid)
+                if running is not None:
+                    running.discard(child_process.pid)
 
             # 确保子进程已终止
             if child_process.poll() is None:
@@ -699,6 +834,43 @@ def execute_command(command: str = None, timeout: int = 60):
                         pass
 
 
+def _finish_output(output: OutputAccumulator | None) -> dict | None:
+    """结束累加器并返回快照（截断时落盘完整输出）。"""
+    if output is None:
+        return None
+    output.finish()
+    snapshot = output.snapshot(persist_if_truncated=True)
+    output.close_temp_file()
+    return snapshot
+
+
+def _format_truncation_note(snapshot: dict) -> str | None:
+    """生成截断提示行（含完整输出的临时文件路径），未截断时返回 None。"""
+    truncation = snapshot["truncation"]
+    if not truncation["truncated"]:
+        return None
+
+    total_lines = truncation["total_lines"]
+    output_lines = truncation["output_lines"]
+
+    truncation_parts = []
+    if snapshot["full_output_path"]:
+        truncation_parts.append(f"完整输出: {snapshot['full_output_path']}")
+
+    if truncation["truncated_by"] == "lines":
+        truncation_parts.append(
+            f"已截断: 显示第 {total_lines - output_lines + 1}-{total_lines} 行"
+            f"（共 {total_lines} 行）"
+        )
+    else:
+        truncation_parts.append(
+            f"已截断: 显示 {output_lines} 行 "
+            f"（限制 {format_size(truncation['max_bytes'])}）"
+        )
+
+    return f"\n[{'；'.join(truncation_parts)}]"
+
+
 def _format_result(
     snapshot: dict,
     command: str,
@@ -707,14 +879,14 @@ def _format_result(
     cancelled: bool,
     timed_out: bool,
     timeout_seconds: int | None = None,
+    notice: str | None = None,
+    stderr_snapshot: dict | None = None,
 ) -> str:
     """
     格式化命令执行结果为展示字符串。
 
     移植自 pi 框架的 formatOutput / 结果渲染逻辑。
     """
-    truncation = snapshot["truncation"]
-    full_output_path = snapshot["full_output_path"]
     output_text = snapshot["content"] or "(无输出)"
 
     lines = []
@@ -738,39 +910,17 @@ def _format_result(
     lines.append(output_text)
 
     # 截断信息
-    if truncation["truncated"]:
-        total_lines = truncation["total_lines"]
-        output_lines = truncation["output_lines"]
-        truncated_by = truncation["truncated_by"]
-
-        truncation_parts = []
-        if full_output_path:
-            truncation_parts.append(f"完整输出: {full_output_path}")
-
-        if truncated_by == "lines":
-            truncation_parts.append(
-                f"已截断: 显示第 {total_lines - output_lines + 1}-{total_lines} 行"
-                f"（共 {total_lines} 行）"
-            )
-        else:
-            if truncation["last_line_partial"]:
-                last_line_size = format_size(
-                    len(output_text.split("\n")[-1].encode("utf-8"))
-                    if output_text
-                    else 0
-                )
-                truncation_parts.append(
-                    f"已截断: 显示 {output_lines} 行 "
-                    f"（限制 {format_size(truncation['max_bytes'])}）"
-                )
-            else:
-                truncation_parts.append(
-                    f"已截断: 显示 {output_lines} 行 "
-                    f"（限制 {format_size(truncation['max_bytes'])}）"
-                )
-
-        if truncation_parts:
-            lines.append(f"\n[{'；'.join(truncation_parts)}]")
+    truncation_note = _format_truncation_note(snapshot)
+    if truncation_note:
+        lines.append(truncation_note)
+
+    # 单独收集的标准错误
+    if stderr_snapshot is not None and stderr_snapshot["truncation"]["total_bytes"] > 0:
+        lines.append("⚠️  标准错误:")
+        lines.append(stderr_snapshot["content"])
+        stderr_note = _format_truncation_note(stderr_snapshot)
+        if stderr_note:
+            lines.append(stderr_note)
 
     lines.append("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
 
@@ -784,9 +934,253 @@ def _format_result(
     else:
         lines.append("📊 执行状态: 执行完毕")
 
+    if notice:
+        lines.append(f"ℹ️  {notice}")
+
     return "\n".join(lines)
 
 
+# ---------------------------------------------------------------------------
+# 持久 shell 会话
+# ---------------------------------------------------------------------------
+
+def _wait_timeout_seconds(timeout) -> float | None:
+    """与 execute_command 一致的超时解析：-1 表示不限，非正数回退到 60 秒。"""
+    if timeout is not None and timeout == -1:
+        return None
+    return timeout if timeout and timeout > 0 else 60
+
+
+class ShellSession:
+    """
+    持久 shell 会话：同一 Agent 会话中的命令复用一个长期运行的 bash 进程（仅 Linux/macOS）。
+
+    - 省去每条命令的进程创建与 shell 初始化，cd / export 等状态在命令间保留
+    - 每条命令经 eval 执行（语法错误不会破坏会话），stdin 为 /dev/null
+    - 命令结束后 shell 打印带随机标记的结束行（退出码 + 当前目录），以此划分命令边界
+    - 超时或中断时与普通模式一样终止整个进程树；shell 随之销毁，
+      下一条命令在最后已知的工作目录中启动新的 shell（环境变量不保留）
+
+    用法：
+        session = ShellSession()
+        token = activate_shell_session(session)
+        try:
+            ...  # 此上下文中的 execute_command 使用该会话
+        finally:
+            deactivate_shell_session(token)
+            session.close()
+    """
+
+    _READ_SIZE = 65536
+
+    def __init__(self, cwd: str | None = None):
+        self.cwd = cwd or os.getcwd()
+        self._process: subprocess.Popen | None = None
+        # 同一个 shell 一次只能执行一条命令，并发的调用依次排队
+        self._lock = threading.Lock()
+
+    @property
+    def pid(self) -> int | None:
+        """当前 shell 进程的 PID（尚未启动或已销毁时为 None）。"""
+        if self._process is None or self._process.poll() is not None:
+            return None
+        return self._process.pid
+
+    def run(self, command: str, timeout: int = 60) -> str:
+        """在持久 shell 中执行一条命令，返回与 execute_command 相同格式的结果。"""
+        with self._lock:
+            return self._run_locked(command, timeout)
+
+    def close(self) -> None:
+        """结束 shell 进程。"""
+        with self._lock:
+            process = self._process
+            if process is None:
+                return
+            if process.poll() is None:
+                try:
+                    process.stdin.write(b"exit\n")
+                    process.stdin.flush()
+                    process.wait(timeout=1)
+                except (OSError, ValueError, subprocess.TimeoutExpired):
+                    pass
+            self._destroy()
+
+    # ------------------------------------------------------------------
+    # 内部方法
+    # ------------------------------------------------------------------
+
+    def _start(self) -> None:
+        cwd = self.cwd if os.path.isdir(self.cwd) else os.getcwd()
+        self._process = subprocess.Popen(
+            ["/bin/bash", "--noprofile", "--norc"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=cwd,
+            env=_get_shell_env(),
+            start_new_session=True,
+        )
+        self.cwd = cwd
+        _track_child_pid(self._process.pid)
+
+    def _destroy(self) -> None:
+        """终止 shell 的整个进程树并释放管道。"""
+        process = self._process
+        self._process = None
+        if process is None:
+            return
+        if process.poll() is None:
+            _kill_process_tree(process.pid)
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                pass
+        _untrack_child_pid(process.pid)
+        for stream in (process.stdin, process.stdout):
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+    def _run_locked(self, command: str, timeout) -> str:
+        output = OutputAccumulator(temp_file_prefix="pi-cmd")
+        start_time = time.time()
+        exit_code = None
+        timed_out = False
+        cancelled = False
+        notice = None
+        running = _running_processes.get()
+        process = None
+
+        try:
+            if self._process is None or self._process.poll() is not None:
+                self._destroy()
+                self._start()
+            process = self._process
+            if running is not None:
+                running.add(process.pid)
+
+            marker = f"__PYAGENT_DONE_{random.getrandbits(64):016x}__"
+            script = (
+                f"eval {shlex.quote(command)} < /dev/null\n"
+                f"printf '%s%d %s\\n' {marker} \"$?\" \"$PWD\"\n"
+            )
+            process.stdin.write(script.encode("utf-8"))
+            process.stdin.flush()
+
+            wait_timeout = _wait_timeout_seconds(timeout)
+            deadline = None if wait_timeout is None else time.monotonic() + wait_timeout
+            trailer = self._pump_output(process, marker.encode("ascii"), output, deadline)
+
+            if running is not None and running.was_killed(process.pid):
+                # 调度器因用户中断终止了 shell（命令在工作线程中执行，收不到 Ctrl+C）
+                cancelled = True
+                self._destroy()
+            elif trailer is None:
+                timed_out = True
+                self._destroy()
+                notice = "命令超时，持久 shell 已终止；下一条命令将在原工作目录启动新的 shell（环境变量不保留）"
+            elif trailer is _SHELL_EXITED:
+                exit_code = process.wait()
+                self._destroy()
+                notice = "shell 已退出；下一条命令将在原工作目录启动新的 shell（环境变量不保留）"
+            else:
+                status, _, cwd = trailer.partition(" ")
+                exit_code = int(status)
+                if cwd:
+                    self.cwd = cwd
+                if os.path.realpath(self.cwd) != os.path.realpath(os.getcwd()):
+                    notice = (
+                        f"shell 当前目录: {self.cwd}"
+                        f"（其它文件工具仍以 {os.getcwd()} 为相对路径基准）"
+                    )
+
+        except KeyboardInterrupt:
+            cancelled = True
+            self._destroy()
+        except (OSError, ValueError) as e:
+            self._destroy()
+            output.finish()
+            output.close_temp_file()
+            return f"❌ 执行命令时发生错误: {str(e)}"
+        finally:
+            if running is not None and process is not None:
+                running.discard(process.pid)
+
+        output.finish()
+        snapshot = output.snapshot(persist_if_truncated=True)
+        output.close_temp_file()
+
+        return _format_result(
+            snapshot=snapshot,
+            command=command,
+            elapsed=int(time.time() - start_time),
+            exit_code=exit_code,
+            cancelled=cancelled,
+            timed_out=timed_out,
+            timeout_seconds=timeout,
+            notice=notice,
+        )
+
+    def _pump_output(self, process, marker: bytes, output: OutputAccumulator, deadline):
+        """
+        读取命令输出直到结束标记行。
+
+        Returns:
+            结束标记后的 "<退出码> <目录>" 文本；超时返回 None；shell 退出返回 _SHELL_EXITED。
+        """
+        fd = process.stdout.fileno()
+        # 末尾可能是被拆开的标记前缀，暂不写入累加器
+        hold = len(marker) - 1
+        pending = b""
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                output.append(pending)
+                return None
+
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(fd, self._READ_SIZE)
+            if not chunk:
+                output.append(pending)
+                return _SHELL_EXITED
+            pending += chunk
+
+            index = pending.find(marker)
+            if index == -1:
+                if len(pending) > hold:
+                    output.append(pending[:-hold])
+                    pending = pending[-hold:]
+                continue
+
+            line_end = pending.find(b"\n", index)
+            if line_end == -1:
+                continue
+            output.append(pending[:index])
+            return os.fsdecode(pending[index + len(marker):line_end])
+
+
+# 标记 shell 在命令结束前退出（例如命令中执行了 exit）
+_SHELL_EXITED = object()
+
+
+def activate_shell_session(session: ShellSession) -> contextvars.Token:
+    """在当前上下文中启用持久 shell，返回用于 deactivate_shell_session 的 token。"""
+    return _current_shell.set(session)
+
+
+def deactivate_shell_session(token: contextvars.Token) -> None:
+    _current_shell.reset(token)
+
+
+def activate_running_processes(processes: RunningProcesses) -> contextvars.Token:
+    """在当前上下文中登记执行命令的进程集合，返回 contextvars token。"""
+    return _running_processes.set(processes)
+
+
 # ---------------------------------------------------------------------------
 # 工具元信息（供 LLM 识别）
 # ---------------------------------------------------------------------------
@@ -808,10 +1202,12 @@ def _build_command_description() -> str:
     base = (
         f"在当前操作系统（{os.name}）的命令行终端中执行 shell 命令。"
         f"shell名称：{shell_name}。"
-        "每条命令在一个全新的隔离会话中运行，命令结束（或超时）后会话自动销毁。"
+        "默认每条命令在一个全新的隔离会话中运行，命令结束（或超时）后会话自动销毁，命令之间不共享状态。"
         f"输出截断至最后 {DEFAULT_MAX_LINES} 行或 {DEFAULT_MAX_BYTES // 1024}KB（先到先截）。"
         "若输出被截断，完整内容保存到临时文件，路径在结果中显示，"
         "可使用 cat/head/tail/grep/less 等命令按需读取。"
+        "耗时较长的命令（构建、完整测试等）请使用 command_job 在后台运行。"
+        "搜索文件内容请优先使用 search_files 工具。"
     )
 
     if os.name == "nt":
@@ -819,6 +1215,12 @@ def _build_command_description() -> str:
             "注意：当前命令行存在长度限制（约 8191 字符）。"
             "如果命令过长，请拆分为多次短命令分步执行。"
         )
+    else:
+        base += (
+            "若启用了持久 shell 模式（PYAGENT_PERSISTENT_SHELL=1 或服务端 --persistent-shell），"
+            "同一会话的命令复用一个 bash：cd 切换的工作目录和 export 的环境变量会保留到后续命令；"
+            "命令超时或被中断后 shell 会重建，只保留工作目录。"
+        )
 
     return base
 
@@ -844,6 +1246,13 @@ COMMAND_TOOLS = [
                             "仅在确实需要无限期执行时使用。"
                         ),
                     },
+                    "separate_stderr": {
+                        "type": "boolean",
+                        "description": (
+                            "是否将标准错误与标准输出分开展示（各自截断）。"
+                            "默认 false，两者按产生顺序合并。"
+                        ),
+                    },
                 },
                 "required": ["command"],
             },
@@ -0,0 +1,862 @@
+"""
+代码搜索索引 —— 基于三元组（trigram）倒排索引的仓库级代码搜索。
+
+search_files 每次都要扫描整个目录树；大仓库中反复搜索时，search_code 先用索引
+筛出可能匹配的候选文件，再只对候选文件做正则校验：
+- 索引保存在 conversations.db 旁的 cache/code_index 目录下（SQLite，每个根目录一个库）
+- 每个文本文件按行（ASCII 小写化）提取字节三元组，倒排表为 三元组 → 文件 ID 列表
+- 每次查询前按 mtime/size 增量刷新：只重新索引新增或变化的文件，删除的文件记为失效 ID
+- 目录列表按目录 mtime 缓存，未变化的目录不必重新列出
+- 正则表达式中必须出现的字面量（含分支）转换为三元组查询条件；无法提取时退化为全部文件
+- 遍历使用共用的 .gitignore 匹配器（含嵌套 .gitignore）；二进制文件不入索引，超大文件总是作为候选
+
+倒排表按刷新批次追加写入，失效 ID 在查询时过滤；失效过多或批次过多时合并压缩。
+"""
+
+import atexit
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from array import array
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from .gitignore import GitignoreMatcher, compile_glob_filter
+from .search_files import (
+    BINARY_SAMPLE_BYTES,
+    DEFAULT_MAX_RESULTS,
+    MAX_CONTEXT_LINES,
+    compile_search_pattern,
+    run_search,
+)
+
+# 索引库所在目录（与 conversations.db 同级的 cache/code_index）
+INDEX_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "code_index"
+)
+# 索引库结构版本（PRAGMA user_version），不一致时重建
+SCHEMA_VERSION = 1
+# 超过该大小的文件不建索引，查询时总是作为候选文件扫描
+MAX_INDEXED_FILE_BYTES = 4 * 1024 * 1024
+# 内存中累积的倒排条目达到该数量时写出一个批次
+FLUSH_POSTINGS = 4 * 1024 * 1024
+# 失效文件数超过有效文件数的该比例，或批次数超过上限时合并压缩
+COMPACT_DEAD_RATIO = 0.5
+COMPACT_MAX_BATCHES = 64
+# 其他进程持有索引库写锁（例如正在建立索引）时最长等待的秒数
+LOCK_TIMEOUT = 120
+# 单个查询分支最多使用的三元组数量
+MAX_QUERY_TRIGRAMS = 32
+
+# 文件状态
+TEXT, BINARY, LARGE = "text", "binary", "large"
+
+
+# ===========================================================================
+# 三元组提取
+# ===========================================================================
+
+def _line_trigrams(lines) -> Set[int]:
+    grams = set()
+    for line in lines:
+        grams.update(zip(line, line[1:], line[2:]))
+    return {a << 16 | b << 8 | c for a, b, c in grams}
+
+
+def file_trigrams(data: bytes) -> Set[int]:
+    """提取文件内容的三元组：按行去重，ASCII 小写化，不跨越换行。"""
+    return _line_trigrams(set(data.lower().split(b"\n")))
+
+
+def literal_trigrams(text: str) -> Set[int]:
+    """提取查询字面量的三元组（规则与 file_trigrams 相同）。"""
+    return _line_trigrams(text.encode("utf-8").lower().split(b"\n"))
+
+
+# ===========================================================================
+# 正则 → 三元组查询
+# ===========================================================================
+
+# 解析结果的节点类型
+_LITERAL, _ZERO_WIDTH, _GROUP, _REPEAT, _OTHER = range(5)
+
+# 反斜杠后表示单个字符的转义
+_CHAR_ESCAPES = {"a": "\a", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v"}
+_HEX_ESCAPE_DIGITS = {"x": 2, "u": 4, "U": 8}
+# 不消耗字符的转义
+_ZERO_WIDTH_ESCAPES = set("AbBZ")
+_QUANTIFIER_RE = re.compile(r"\{(\d*)(,?)(\d*)\}")
+
+
+class _RegexParser:
+    """
+    只提取三元组查询所需结构的正则解析器，不依赖 re 的内部模块。
+
+    解析结果是分支列表，每个分支是 (类型, 值) 节点序列：字面量字符、零宽断言、
+    分组 (是否忽略大小写, 分支列表)、重复 (最少次数, 节点)，其余语法一律视为任意内容。
+    模式本身的合法性仍由 re.compile 校验，此处遇到无法识别的写法抛出 ValueError。
+    """
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.pos = 0
+        self.ignore_case = False
+        self.verbose = False
+
+    def parse(self) -> List[list]:
+        alternatives = self._alternation()
+        if self.pos != len(self.pattern):
+            raise ValueError(f"unbalanced parenthesis at {self.pos}")
+        return alternatives
+
+    def _peek(self, offset: int = 0) -> str:
+        index = self.pos + offset
+        return self.pattern[index] if index < len(self.pattern) else ""
+
+    def _expect(self, char: str) -> None:
+        if self._peek() != char:
+            raise ValueError(f"expected {char!r} at {self.pos}")
+        self.pos += 1
+
+    def _skip_past(self, char: str) -> None:
+        end = self.pattern.find(char, self.pos)
+        if end < 0:
+            raise ValueError(f"missing {char!r}")
+        self.pos = end + 1
+
+    def _alternation(self) -> List[list]:
+        alternatives = [self._sequence()]
+        while self._peek() == "|":
+            self.pos += 1
+            alternatives.append(self._sequence())
+        return alternatives
+
+    def _sequence(self) -> list:
+        items = []
+        while self._peek() not in ("", "|", ")"):
+            node = self._atom()
+            if node is None:
+                continue
+            low = self._quantifier()
+            items.append(node if low is None else (_REPEAT, (low, node)))
+        return items
+
+    def _quantifier(self) -> Optional[int]:
+        """解析量词，返回最少重复次数；没有量词时返回 None。"""
+        char = self._peek()
+        if char in ("*", "?"):
+            self.pos += 1
+            low = 0
+        elif char == "+":
+            self.pos += 1
+            low = 1
+        elif char == "{":
+            match = _QUANTIFIER_RE.match(self.pattern, self.pos)
+            if match is None or not (match.group(1) or match.group(2)):
+                # 不构成量词的 { 是普通字符
+                return None
+            self.pos = match.end()
+            low = int(match.group(1) or 0)
+        else:
+            return None
+        # 非贪婪 / 占有量词后缀
+        if self._peek() in ("?", "+"):
+            self.pos += 1
+        return low
+
+    def _atom(self):
+        char = self._peek()
+        self.pos += 1
+        if char == "(":
+            return self._group()
+        if char == "[":
+            self._char_class()
+            return _OTHER, None
+        if char == "\\":
+            return self._escape()
+        if char in ("^", "$"):
+            return _ZERO_WIDTH, None
+        if char == ".":
+            return _OTHER, None
+        if char in ("*", "+", "?"):
+            raise ValueError(f"nothing to repeat at {self.pos - 1}")
+        return _LITERAL, char
+
+    def _escape(self):
+        char = self._peek()
+        if not char:
+            raise ValueError("trailing backslash")
+        self.pos += 1
+        if char in _CHAR_ESCAPES:
+            return _LITERAL, _CHAR_ESCAPES[char]
+        if char in _HEX_ESCAPE_DIGITS:
+            digits = self.pattern[self.pos:self.pos + _HEX_ESCAPE_DIGITS[char]]
+            if len(digits) != _HEX_ESCAPE_DIGITS[char]:
+                raise ValueError(f"incomplete escape \\{char}")
+            self.pos += len(digits)
+            return _LITERAL, chr(int(digits, 16))
+        if char in _ZERO_WIDTH_ESCAPES:
+            return _ZERO_WIDTH, None
+        if char == "N" and self._peek() == "{":
+            self._skip_past("}")
+            return _OTHER, None
+        if char.isalnum():
+            # \d \w \s 等字符集、反向引用与八进制转义
+            return _OTHER, None
+        return _LITERAL, char
+
+    def _char_class(self) -> None:
+        """跳过 [...] 字符集。"""
+        if self._peek() == "^":
+            self.pos += 1
+        if self._peek() == "]":
+            self.pos += 1
+        while True:
+            char = self._peek()
+            if not char:
+                raise ValueError("unterminated character set")
+            self.pos += 1
+            if char == "\\":
+                self.pos += 1
+            elif char == "]":
+                return
+
+    def _group(self):
+        ignore_case = False
+        zero_width = False
+        if self._peek() == "?":
+            self.pos += 1
+            char = self._peek()
+            self.pos += 1
+            if char == "P" and self._peek() == "<":
+                self._skip_past(">")
+            elif char == "P" and self._peek() == "=":
+                self._skip_past(")")
+                return _OTHER, None
+            elif char == "#":
+                self._skip_past(")")
+                return None
+            elif char in ("=", "!") or (char == "<" and self._peek() in ("=", "!")):
+                if char == "<":
+                    self.pos += 1
+                zero_width = True
+            elif char == "(":
+                # 条件分组 (?(id)yes|no)
+                self._skip_past(")")
+                self._alternation()
+                self._expect(")")
+                return _OTHER, None
+            elif char in (":", ">"):
+                pass
+            else:
+                self.pos -= 1
+                start = self.pos
+                while self._peek().isalpha() or self._peek() == "-":
+                    self.pos += 1
+                flags, _, removed = self.pattern[start:self.pos].partition("-")
+                if not flags and not removed:
+                    raise ValueError(f"unknown extension at {start}")
+                if "x" in flags:
+                    self.verbose = True
+                if self._peek() == ")":
+                    # 全局标志 (?i)
+                    self.pos += 1
+                    self.ignore_case = self.ignore_case or "i" in flags
+                    return None
+                self._expect(":")
+                ignore_case = "i" in flags
+        alternatives = self._alternation()
+        self._expect(")")
+        if zero_width:
+            return _ZERO_WIDTH, None
+        return _GROUP, (ignore_case, alternatives)
+
+
+def _analyze_alternatives(alternatives: List[list], ignore_case: bool) -> List[List[Set[int]]]:
+    if len(alternatives) == 1:
+        return _analyze(alternatives[0], ignore_case)
+    branches = []
+    for branch in alternatives:
+        # 分支内只保留确定必须出现的三元组
+        grams = set()
+        for clause in _analyze(branch, ignore_case):
+            if len(clause) == 1:
+                grams |= clause[0]
+        if not grams:
+            return []
+        branches.append(grams)
+    return [branches]
+
+
+def _analyze(items: list, ignore_case: bool) -> List[List[Set[int]]]:
+    """
+    分析解析后的节点序列，返回查询条件：各条件之间为 AND；
+    每个条件是若干候选分支（OR），每个分支是必须同时出现的三元组集合。
+    """
+    clauses: List[List[Set[int]]] = []
+    run: List[str] = []
+
+    def flush():
+        if run:
+            grams = literal_trigrams("".join(run))
+            if grams:
+                clauses.append([grams])
+            run.clear()
+
+    for kind, value in items:
+        if kind == _LITERAL:
+            if ignore_case and not value.isascii():
+                # 索引只对 ASCII 做大小写归一，非 ASCII 字符在忽略大小写时无法使用
+                flush()
+            else:
+                run.append(value)
+        elif kind == _ZERO_WIDTH:
+            # 零宽断言不消耗字符，不打断字面量
+            continue
+        elif kind == _GROUP:
+            flush()
+            group_ignore_case, alternatives = value
+            clauses.extend(_analyze_alternatives(alternatives, ignore_case or group_ignore_case))
+        elif kind == _REPEAT:
+            flush()
+            low, node = value
+            if low >= 1:
+                clauses.extend(_analyze([node], ignore_case))
+        else:
+            flush()
+    flush()
+    return clauses
+
+
+def regex_query(pattern: str, ignore_case: bool = False, literal: bool = False) -> List[List[Set[int]]]:
+    """将搜索模式转换为三元组查询条件；返回空列表表示无法缩小范围。"""
+    if literal:
+        if ignore_case and not pattern.isascii():
+            return []
+        grams = literal_trigrams(pattern)
+        return [[grams]] if grams else []
+    parser = _RegexParser(pattern)
+    try:
+        alternatives = parser.parse()
+    except ValueError:
+        return []
+    if parser.verbose:
+        # 详细模式中空白与注释不是字面量，不做分析
+        return []
+    return _analyze_alternatives(alternatives, ignore_case or parser.ignore_case)
+
+
+# ===========================================================================
+# 索引
+# ===========================================================================
+
+def _walk_key(relative_path: str) -> Tuple[Tuple[int, str], ...]:
+    """与 search_files 的遍历顺序一致的排序键：同一目录下先文件后子目录，各自按名称排序。"""
+    *directories, name = relative_path.split("/")
+    return (*((1, d) for d in directories), (0, name))
+
+
+class CodeIndex:
+    """
+    一个根目录的三元组索引。所有方法线程安全。
+
+    同一根目录的索引库由所有 pyagent 进程共用：写入在 BEGIN IMMEDIATE 事务中进行，
+    事务内发现其他进程已更新（meta 中的 generation 变化）时先重新加载文件表。
+    """
+
+    def __init__(self, root: str, db_path: Optional[str] = None):
+        self.root = os.path.abspath(root)
+        if db_path is None:
+            digest = hashlib.sha1(self.root.encode("utf-8")).hexdigest()[:16]
+            db_path = os.path.join(INDEX_DIR, f"{digest}.db")
+        self.db_path = db_path
+
+        self._lock = threading.RLock()
+        # 相对路径 -> (文件 ID, 大小, mtime_ns, 状态)
+        self._files: Dict[str, Tuple[int, int, int, str]] = {}
+        self._paths_by_id: Dict[int, str] = {}
+        # 按遍历顺序排列的 (相对路径, 文件 ID, 状态)，文件集合变化时重建
+        self._ordered: Optional[List[Tuple[str, int, str]]] = None
+        # 相对目录 -> (目录 mtime_ns, 文件列表, 子目录列表)
+        self._dirs: Dict[str, Tuple[int, List[str], List[str]]] = {}
+        self._matcher: Optional[GitignoreMatcher] = None
+        # 内存中文件表对应的写入代数
+        self._generation = 0
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(
+            self.db_path, timeout=LOCK_TIMEOUT, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_schema()
+        self._load_files()
+
+    # ------------------------------------------------------------------
+    # 存储
+    # ------------------------------------------------------------------
+
+    def _init_schema(self) -> None:
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            self._conn.executescript(
+                """
+                DROP TABLE IF EXISTS files;
+                DROP TABLE IF EXISTS postings;
+                DROP TABLE IF EXISTS meta;
+                """
+            )
+        self._conn.executescript(
+            f"""
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT UNIQUE NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                state TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                trigram INTEGER NOT NULL,
+                batch INTEGER NOT NULL,
+                ids BLOB NOT NULL,
+                PRIMARY KEY (trigram, batch)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            PRAGMA user_version = {SCHEMA_VERSION};
+            """
+        )
+
+    def _meta(self, key: str) -> int:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _set_meta(self, key: str, value: int) -> None:
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    def _load_files(self) -> None:
+        """从数据库（重新）加载文件表。"""
+        self._files.clear()
+        self._paths_by_id.clear()
+        self._ordered = None
+        # 先读代数：期间有其他进程提交时，下次刷新会再加载一次
+        self._generation = self._meta("generation")
+        for file_id, path, size, mtime_ns, state in self._conn.execute(
+            "SELECT id, path, size, mtime_ns, state FROM files"
+        ):
+            self._files[path] = (file_id, size, mtime_ns, state)
+            self._paths_by_id[file_id] = path
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # 遍历
+    # ------------------------------------------------------------------
+
+    def _refresh_filter(self) -> None:
+        """任一 .gitignore 新增、修改或删除时重建匹配器并清空目录缓存。"""
+        if self._matcher is None or self._matcher.stale():
+            self._matcher = GitignoreMatcher(self.root)
+            self._dirs.clear()
+
+    def _list_dir(self, relative_dir: str, directory: str, mtime_ns: int):
+        """列出目录中未被忽略的 [(相对路径, 绝对路径)] 文件与子目录；目录 mtime 未变时使用缓存。"""
+        cached = self._dirs.get(relative_dir)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1], cached[2]
+
+        files, subdirectories = [], []
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError:
+            entries = []
+        for entry in entries:
+            relative_path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if self._matcher.ignored(relative_path, is_dir):
+                    continue
+                if is_dir:
+                    subdirectories.append((relative_path, entry.path))
+                elif entry.is_file():
+                    files.append((relative_path, entry.path))
+            except OSError:
+                continue
+        self._dirs[relative_dir] = (mtime_ns, files, subdirectories)
+        return files, subdirectories
+
+    def _scan_tree(self) -> Dict[str, Tuple[int, int]]:
+        """遍历目录树，返回现存文件 -> (大小, mtime_ns)。"""
+        self._refresh_filter()
+        present: Dict[str, Tuple[int, int]] = {}
+        seen_dirs = set()
+        stat = os.stat
+        stack = [("", self.root)]
+        while stack:
+            relative_dir, directory = stack.pop()
+            try:
+                mtime_ns = stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            seen_dirs.add(relative_dir)
+            files, subdirectories = self._list_dir(relative_dir, directory, mtime_ns)
+            for relative_path, absolute_path in files:
+                try:
+                    st = stat(absolute_path)
+                except OSError:
+                    continue
+                present[relative_path] = (st.st_size, st.st_mtime_ns)
+            stack.extend(subdirectories)
+        # 丢弃已删除目录的缓存
+        for relative_dir in [d for d in self._dirs if d not in seen_dirs]:
+            del self._dirs[relative_dir]
+        return present
+
+    # ------------------------------------------------------------------
+    # 增量刷新
+    # ------------------------------------------------------------------
+
+    def refresh(self) -> Dict[str, int]:
+        """按 mtime/size 同步索引，返回 {"added", "updated", "removed"} 计数。"""
+        with self._lock:
+            if self._meta("generation") != self._generation:
+                self._load_files()
+            present = self._scan_tree()
+            removed, changed = self._diff(present)
+            if not removed and not changed:
+                return {"added": 0, "updated": 0, "removed": 0}
+
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 持有写锁后，以数据库中的最新文件表为准重新比较
+                if self._meta("generation") != self._generation:
+                    self._load_files()
+                    removed, changed = self._diff(present)
+                stats = {
+                    "added": sum(1 for path in changed if path not in self._files),
+                    "updated": sum(1 for path in changed if path in self._files),
+                    "removed": len(removed),
+                }
+                dead, batch = self._apply_changes(removed, changed, present)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                # 内存状态可能已与数据库不一致，重新加载
+                self._load_files()
+                raise
+
+            live = sum(1 for entry in self._files.values() if entry[3] == TEXT)
+            if dead > live * COMPACT_DEAD_RATIO or batch > COMPACT_MAX_BATCHES:
+                self.compact()
+            return stats
+
+    def _diff(self, present: Dict[str, Tuple[int, int]]) -> Tuple[List[str], List[str]]:
+        """与内存中的文件表比较，返回 (已删除的文件, 新增或变化的文件)。"""
+        files = self._files
+        removed = [path for path in files if path not in present]
+        changed = [
+            path for path, (size, mtime_ns) in present.items()
+            if (entry := files.get(path)) is None or entry[1] != size or entry[2] != mtime_ns
+        ]
+        return removed, changed
+
+    def _apply_changes(self, removed, changed, present) -> Tuple[int, int]:
+        """在调用方的写事务中更新文件表与倒排表，返回更新后的 (失效文件数, 批次数)。"""
+        conn = self._conn
+        dead = self._meta("dead")
+        batch = self._meta("batches")
+        postings: Dict[int, array] = defaultdict(lambda: array("I"))
+        pending = 0
+        self._ordered = None
+
+        def flush():
+            nonlocal batch, pending
+            if postings:
+                batch += 1
+                conn.executemany(
+                    "INSERT INTO postings (trigram, batch, ids) VALUES (?, ?, ?)",
+                    ((gram, batch, ids.tobytes()) for gram, ids in postings.items()),
+                )
+                postings.clear()
+            pending = 0
+
+        # 删除或变化的文件：旧 ID 在倒排表中成为失效 ID
+        for path in [*removed, *(p for p in changed if p in self._files)]:
+            file_id, _size, _mtime, state = self._files.pop(path)
+            self._paths_by_id.pop(file_id, None)
+            conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+            if state == TEXT:
+                dead += 1
+
+        for path in changed:
+            size, mtime_ns = present[path]
+            state, grams = self._read_trigrams(path, size)
+            file_id = conn.execute(
+                "INSERT INTO files (path, size, mtime_ns, state) VALUES (?, ?, ?, ?)",
+                (path, size, mtime_ns, state),
+            ).lastrowid
+            self._files[path] = (file_id, size, mtime_ns, state)
+            self._paths_by_id[file_id] = path
+            for gram in grams:
+                postings[gram].append(file_id)
+            pending += len(grams)
+            if pending >= FLUSH_POSTINGS:
+                flush()
+        flush()
+
+        self._generation += 1
+        self._set_meta("generation", self._generation)
+        self._set_meta("dead", dead)
+        self._set_meta("batches", batch)
+        return dead, batch
+
+    def _read_trigrams(self, path: str, size: int) -> Tuple[str, Set[int]]:
+        if size > MAX_INDEXED_FILE_BYTES:
+            return LARGE, set()
+        try:
+            with open(os.path.join(self.root, path), "rb") as f:
+                data = f.read()
+        except OSError:
+            return BINARY, set()
+        if b"\x00" in data[:BINARY_SAMPLE_BYTES]:
+            return BINARY, set()
+        return TEXT, file_trigrams(data)
+
+    def compact(self) -> None:
+        """合并各批次的倒排表并去除失效 ID。"""
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 以数据库中的文件表为准：其他进程新增的文件不在本实例的内存中
+                live_ids = {file_id for (file_id,) in conn.execute("SELECT id FROM files")}
+                has_dead = self._meta("dead") > 0
+                conn.execute("ALTER TABLE postings RENAME TO postings_old")
+                conn.execute(
+                    "CREATE TABLE postings ("
+                    "trigram INTEGER NOT NULL, batch INTEGER NOT NULL, ids BLOB NOT NULL, "
+                    "PRIMARY KEY (trigram, batch)) WITHOUT ROWID"
+                )
+
+                def merge(gram, parts):
+                    ids_array = array("I")
+                    ids_array.frombytes(b"".join(parts))
+                    if has_dead:
+                        ids_array = array("I", [i for i in ids_array if i in live_ids])
+                    return gram, 1, ids_array.tobytes()
+
+                def merged():
+                    # 按三元组顺序流式读取旧表，逐个三元组合并
+                    current_gram, parts = None, []
+                    rows = conn.cursor().execute("SELECT trigram, ids FROM postings_old ORDER BY trigram, batch")
+                    for gram, ids in rows:
+                        if gram != current_gram and parts:
+                            yield merge(current_gram, parts)
+                            parts = []
+                        current_gram = gram
+                        parts.append(ids)
+                    if parts:
+                        yield merge(current_gram, parts)
+
+                rows = (row for row in merged() if row[2])
+                conn.executemany("INSERT INTO postings (trigram, batch, ids) VALUES (?, ?, ?)", rows)
+                conn.execute("DROP TABLE postings_old")
+                self._set_meta("dead", 0)
+                self._set_meta("batches", 1)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def _posting_ids(self, gram: int, cache: Dict[int, Set[int]]) -> Set[int]:
+        ids = cache.get(gram)
+        if ids is None:
+            ids_array = array("I")
+            for (blob,) in self._conn.execute("SELECT ids FROM postings WHERE trigram = ?", (gram,)):
+                ids_array.frombytes(blob)
+            ids = cache[gram] = set(ids_array)
+        return ids
+
+    def candidates(self, query: List[List[Set[int]]]) -> List[str]:
+        """返回可能满足查询的文件（相对路径，按遍历顺序），包含未建索引的超大文件。"""
+        with self._lock:
+            if self._meta("generation") != self._generation:
+                self._load_files()
+            cache: Dict[int, Set[int]] = {}
+            selected: Optional[Set[int]] = None
+            for clause in query:
+                matched: Set[int] = set()
+                for grams in clause:
+                    ids: Optional[Set[int]] = None
+                    for gram in sorted(grams)[:MAX_QUERY_TRIGRAMS]:
+                        posting = self._posting_ids(gram, cache)
+                        ids = set(posting) if ids is None else ids & posting
+                        if not ids:
+                            break
+                    matched |= ids or set()
+                selected = matched if selected is None else selected & matched
+                if not selected:
+                    break
+
+            if self._ordered is None:
+                self._ordered = sorted(
+                    ((path, file_id, state) for path, (file_id, _size, _mtime, state) in self._files.items()
+                     if state != BINARY),
+                    key=lambda item: _walk_key(item[0]),
+                )
+            return [
+                path for path, file_id, state in self._ordered
+                if state == LARGE or selected is None or file_id in selected
+            ]
+
+    @property
+    def file_count(self) -> int:
+        return len(self._files)
+
+
+_indexes: Dict[str, CodeIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_code_index(root: str) -> CodeIndex:
+    """返回根目录对应的索引（进程内复用同一个实例）。"""
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = CodeIndex(root)
+        return index
+
+
+def close_code_indexes() -> None:
+    with _indexes_lock:
+        for index in _indexes.values():
+            index.close()
+        _indexes.clear()
+
+
+atexit.register(close_code_indexes)
+
+
+# ===========================================================================
+# 工具入口
+# ===========================================================================
+
+def search_code(
+    pattern: str,
+    path: str = ".",
+    glob: str = None,
+    ignore_case: bool = False,
+    literal: bool = False,
+    context: int = 0,
+    max_results: int = DEFAULT_MAX_RESULTS,
+) -> str:
+    """
+    借助三元组索引在目录中搜索代码，参数与输出格式同 search_files。
+
+    首次搜索某个目录时建立索引，之后每次搜索只增量更新变化的文件。
+    """
+    if not pattern:
+        return "❌ 错误：pattern 不能为空"
+    try:
+        regex = compile_search_pattern(pattern, ignore_case, literal)
+    except re.error as e:
+        return f"❌ 错误：无效的正则表达式: {e}"
+
+    root = os.path.abspath(os.path.expanduser(path or "."))
+    if not os.path.isdir(root):
+        return f"❌ 错误：目录不存在: {path}"
+
+    max_results = max(1, max_results or DEFAULT_MAX_RESULTS)
+    context = max(0, min(context or 0, MAX_CONTEXT_LINES))
+
+    try:
+        index = get_code_index(root)
+        index.refresh()
+        paths = index.candidates(regex_query(pattern, ignore_case, literal))
+    except (OSError, sqlite3.Error) as e:
+        return f"❌ 错误：代码索引不可用: {e}"
+
+    if glob:
+        include = compile_glob_filter(glob)
+        paths = [p for p in paths if include.match(p)]
+    files = ((os.path.join(root, p), p) for p in paths)
+    return run_search(files, regex, pattern, context, max_results)
+
+
+# ===========================================================================
+# 工具元信息（供 LLM 识别）
+# ===========================================================================
+
+SEARCH_CODE_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "search_code",
+            "description": (
+                "借助索引在大型代码仓库中快速搜索（参数与输出格式同 search_files）。"
+                "首次搜索某个目录时建立三元组索引（耗时与仓库大小相关），"
+                "之后只增量更新变化的文件，并仅对可能匹配的候选文件执行正则匹配。"
+                "适合在同一个大仓库中反复搜索；小目录或一次性搜索直接使用 search_files。"
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "pattern": {
+                        "type": "string",
+                        "description": "要搜索的正则表达式（Python re 语法）",
+                    },
+                    "path": {
+                        "type": "string",
+                        "description": "要搜索（并建立索引）的根目录，默认为当前目录",
+                    },
+                    "glob": {
+                        "type": "string",
+                        "description": "只搜索匹配该模式的文件（.gitignore 语法，含 / 时相对 path 匹配），如 *.py 或 src/**/*.ts",
+                    },
+                    "ignore_case": {
+                        "type": "boolean",
+                        "description": "是否忽略大小写，默认 false",
+                    },
+                    "literal": {
+                        "type": "boolean",
+                        "description": "将 pattern 作为普通文本而非正则表达式，默认 false",
+                    },
+                    "context": {
+                        "type": "integer",
+                        "description": f"每处匹配前后显示的上下文行数（最多 {MAX_CONTEXT_LINES}），默认 0",
+                    },
+                    "max_results": {
+                        "type": "integer",
+                        "description": f"最多返回的匹配行数，默认 {DEFAULT_MAX_RESULTS}",
+                    },
+                },
+                "required": ["pattern"],
+            },
+        },
+    }
+]
+
+# ===========================================================================
+# 工具函数映射（供 Agent 调用）
+# ===========================================================================
+
+SEARCH_CODE_FUNCTIONS = {
+    "search_code": search_code,
+}
@@ -0,0 +1,361 @@
+"""
+后台命令任务 —— 长时间运行的命令（构建、测试）在后台执行，模型可以继续其它工作。
+
+统一的 command_job 工具通过 action 参数切换：
+- start：启动命令，立即返回任务 ID
+- poll：查看任务状态（可等待一段时间直到结束）；不指定 job_id 时列出全部任务
+- tail：查看任务最近的输出
+- kill：终止任务的整个进程树
+
+每个任务的输出由独立的读取线程写入 OutputAccumulator（截断与临时文件逻辑与 execute_command 相同），
+子进程通过 _track_child_pid 跟踪；Agent 会话结束时终止仍在运行的任务。
+"""
+
+import atexit
+import contextvars
+import itertools
+import os
+import subprocess
+import threading
+import time
+
+from .cmdline import (
+    PUMP_DRAIN_GRACE,
+    OutputAccumulator,
+    _build_command,
+    _finish_output,
+    _format_truncation_note,
+    _get_shell_env,
+    _kill_process_tree,
+    _pump_process_output,
+    _track_child_pid,
+    _untrack_child_pid,
+    truncate_tail,
+)
+
+# 同时运行的后台任务上限
+MAX_RUNNING_JOBS = 8
+# tail 默认返回的行数
+DEFAULT_TAIL_LINES = 50
+# poll 单次最长等待秒数
+MAX_POLL_WAIT = 300
+
+
+class CommandJob:
+    """一个后台运行的命令及其输出。"""
+
+    def __init__(self, job_id: str, command: str, timeout: float | None = None):
+        self.job_id = job_id
+        self.command = command
+        self.timeout = timeout
+        self.output = OutputAccumulator(temp_file_prefix="pi-job")
+        self.started_at = time.time()
+        self.finished_at: float | None = None
+        self.exit_code: int | None = None
+        self.timed_out = False
+        self.killed = False
+        self.error: str | None = None
+
+        # 读取线程追加输出与 poll / tail 生成快照需要互斥
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._process: subprocess.Popen | None = None
+        self._thread: threading.Thread | None = None
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        spawn_kwargs = _build_command(self.command)
+        spawn_kwargs["cwd"] = os.getcwd()
+        spawn_kwargs["env"] = _get_shell_env()
+        self._process = subprocess.Popen(**spawn_kwargs)
+        _track_child_pid(self._process.pid)
+        self._thread = threading.Thread(
+            target=self._run, name=f"pyagent-{self.job_id}", daemon=True
+        )
+        self._thread.start()
+
+    def kill(self) -> None:
+        """终止进程树；读取线程随后收集剩余输出并结束任务。"""
+        if self.running and self._process is not None:
+            self.killed = True
+            _kill_process_tree(self._process.pid)
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """等待任务结束，返回是否已结束。"""
+        return self._done.wait(timeout)
+
+    @property
+    def running(self) -> bool:
+        return not self._done.is_set()
+
+    @property
+    def status(self) -> str:
+        if self.running:
+            return "运行中"
+        if self.error:
+            return f"出错：{self.error}"
+        if self.timed_out:
+            return f"超时终止（{self.timeout:g}秒）"
+        if self.killed:
+            return "已终止"
+        if self.exit_code:
+            return f"以退出码 {self.exit_code} 结束"
+        return "执行完毕"
+
+    @property
+    def elapsed(self) -> int:
+        end = self.finished_at if self.finished_at is not None else time.time()
+        return int(end - self.started_at)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return self.output.snapshot()
+
+    # ------------------------------------------------------------------
+    # 读取线程
+    # ------------------------------------------------------------------
+
+    def _append(self, tag: str, data: bytes) -> None:
+        with self._lock:
+            self.output.append(data)
+
+    def _run(self) -> None:
+        process = self._process
+        try:
+            deadline = None if self.timeout is None else time.monotonic() + self.timeout
+            if _pump_process_output(process, self._append, deadline):
+                self.timed_out = True
+                _kill_process_tree(process.pid)
+                _pump_process_output(process, self._append, time.monotonic() + PUMP_DRAIN_GRACE)
+            try:
+                self.exit_code = process.wait(timeout=PUMP_DRAIN_GRACE)
+            except subprocess.TimeoutExpired:
+                # 输出已关闭但进程仍在运行：继续等待（kill / 超时会终止它）
+                remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+                try:
+                    self.exit_code = process.wait(timeout=remaining)
+                except subprocess.TimeoutExpired:
+                    self.timed_out = True
+                    _kill_process_tree(process.pid)
+                    self.exit_code = process.wait()
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            _untrack_child_pid(process.pid)
+            for stream in (process.stdout, process.stderr):
+                if stream:
+                    try:
+                        stream.close()
+                    except Exception:
+                        pass
+            with self._lock:
+                _finish_output(self.output)
+            self.finished_at = time.time()
+            self._done.set()
+
+
+class JobTable:
+    """一个 Agent 会话的后台任务表。"""
+
+    def __init__(self, max_running: int = MAX_RUNNING_JOBS):
+        self.max_running = max_running
+        self._jobs: dict[str, CommandJob] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def start(self, command: str, timeout: float | None = None) -> CommandJob:
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.running)
+            if running >= self.max_running:
+                raise RuntimeError(
+                    f"后台任务数已达上限（{self.max_running}），请等待或终止已有任务"
+                )
+            job = CommandJob(f"job-{next(self._ids)}", command, timeout)
+            job.start()
+            self._jobs[job.job_id] = job
+        return job
+
+    def get(self, job_id: str) -> CommandJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> list[CommandJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def close(self) -> None:
+        """终止所有仍在运行的任务（会话结束时调用）。"""
+        jobs = self.jobs()
+        for job in jobs:
+            job.kill()
+        for job in jobs:
+            job.wait(PUMP_DRAIN_GRACE)
+
+
+# 当前 Agent 会话的任务表；未设置时使用进程级的默认任务表
+_current_jobs: contextvars.ContextVar[JobTable | None] = contextvars.ContextVar(
+    "pyagent_job_table", default=None
+)
+_default_jobs = JobTable()
+atexit.register(_default_jobs.close)
+
+
+def activate_job_table(table: JobTable) -> contextvars.Token:
+    """在当前上下文中启用任务表，返回用于 deactivate_job_table 的 token。"""
+    return _current_jobs.set(table)
+
+
+def deactivate_job_table(token: contextvars.Token) -> None:
+    _current_jobs.reset(token)
+
+
+def _get_job_table() -> JobTable:
+    return _current_jobs.get() or _default_jobs
+
+
+# ---------------------------------------------------------------------------
+# 工具入口
+# ---------------------------------------------------------------------------
+
+def command_job(
+    action: str,
+    command: str = "",
+    job_id: str = "",
+    timeout: int = -1,
+    wait: int = 0,
+    lines: int = DEFAULT_TAIL_LINES,
+) -> str:
+    """
+    管理后台命令任务。
+
+    Args:
+        action: start / poll / tail / kill
+        command: start 时要执行的命令
+        job_id: poll / tail / kill 的目标任务；poll 不指定时列出全部任务
+        timeout: start 时的超时秒数，-1 表示不限（会话结束时仍会终止）
+        wait: poll 时最多等待任务结束的秒数
+        lines: tail 返回的最大行数
+    """
+    table = _get_job_table()
+
+    if action == "start":
+        if not command:
+            return "❌ 错误：start 需要提供 command"
+        try:
+            job = table.start(command, timeout if timeout and timeout > 0 else None)
+        except (OSError, RuntimeError) as e:
+            return f"❌ 启动后台任务失败: {e}"
+        return (
+            f"🧵 后台任务 {job.job_id} 已启动\n"
+            f"💻 执行命令: {command}\n"
+            f"使用 command_job 的 poll / tail / kill 并指定 job_id=\"{job.job_id}\" 查看或终止。"
+        )
+
+    if action == "poll" and not job_id:
+        jobs = table.jobs()
+        if not jobs:
+            return "当前没有后台任务"
+        return "\n".join(
+            f"{job.job_id}  {job.status}  {job.elapsed}秒  {job.command}" for job in jobs
+        )
+
+    if action not in ("poll", "tail", "kill"):
+        return f"❌ 错误：不支持的 action: {action}"
+
+    job = table.get(job_id)
+    if job is None:
+        return f"❌ 错误：未找到后台任务 {job_id}"
+
+    if action == "kill":
+        job.kill()
+        job.wait(PUMP_DRAIN_GRACE)
+    elif action == "poll" and wait and wait > 0:
+        job.wait(min(wait, MAX_POLL_WAIT))
+
+    return _format_job(job, tail_lines=lines if action == "tail" else None)
+
+
+def _format_job(job: CommandJob, tail_lines: int | None) -> str:
+    snapshot = job.snapshot()
+    truncation = snapshot["truncation"]
+
+    lines = [
+        f"🧵 后台任务 {job.job_id} - {job.status}",
+        f"💻 执行命令: {job.command}",
+        f"⏱️  耗时: {job.elapsed}秒",
+        f"📦 已输出: {truncation['total_lines']} 行 / {truncation['total_bytes']} 字节",
+    ]
+
+    if tail_lines is not None:
+        tail = truncate_tail(snapshot["content"], max_lines=max(tail_lines, 1))
+        lines.append(f"📋 最近输出（最多 {max(tail_lines, 1)} 行）:")
+        lines.append(tail["content"] or "(无输出)")
+        truncation_note = _format_truncation_note(snapshot)
+        if truncation_note:
+            lines.append(truncation_note)
+    elif snapshot["full_output_path"]:
+        lines.append(f"完整输出: {snapshot['full_output_path']}")
+
+    return "\n".join(lines)
+
+
+# ---------------------------------------------------------------------------
+# 工具元信息（供 LLM 识别）
+# ---------------------------------------------------------------------------
+
+COMMAND_JOB_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "command_job",
+            "description": (
+                "在后台运行耗时较长的命令（构建、测试、服务等），不阻塞后续工作。"
+                "start 启动命令并返回 job_id；poll 查看状态（wait 可等待结束，不给 job_id 时列出全部任务）；"
+                "tail 查看最近的输出；kill 终止任务及其子进程。"
+                "输出与 execute_command 一样截断保存，超出部分写入临时文件。会话结束时仍在运行的任务会被终止。"
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "action": {
+                        "type": "string",
+                        "enum": ["start", "poll", "tail", "kill"],
+                        "description": "要执行的操作",
+                    },
+                    "command": {
+                        "type": "string",
+                        "description": "start 时要执行的 shell 命令",
+                    },
+                    "job_id": {
+                        "type": "string",
+                        "description": "目标任务 ID（start 返回的值，如 job-1）",
+                    },
+                    "timeout": {
+                        "type": "integer",
+                        "description": "start 时的超时秒数，超时后终止任务。默认 -1 表示不限",
+                    },
+                    "wait": {
+                        "type": "integer",
+                        "description": f"poll 时最多等待任务结束的秒数（上限 {MAX_POLL_WAIT}），默认 0 立即返回",
+                    },
+                    "lines": {
+                        "type": "integer",
+                        "description": f"tail 返回的最大行数，默认 {DEFAULT_TAIL_LINES}",
+                    },
+                },
+                "required": ["action"],
+            },
+        },
+    }
+]
+
+# ---------------------------------------------------------------------------
+# 工具函数映射（供 Agent 调用）
+# ---------------------------------------------------------------------------
+
+COMMAND_JOB_FUNCTIONS = {
+    "command_job": command_job,
+}
@@ -15,10 +15,11 @@
   若不匹配则拒绝编辑并返回明确错误，确保零误写。
 """
 
-import difflib
 import os
 import unicodedata
 
+from .file_write import _with_file_mutation_queue
+
 
 # ===========================================================================
 # 行尾符处理
@@ -470,6 +471,8 @@ def generate_unified_patch(
     context_lines: int = 4,
 ) -> str:
     """生成标准 unified diff 补丁。"""
+    import difflib  # 仅在实际编辑时才需要，延迟导入以加快启动
+
     old_lines = old_content.splitlines(keepends=True)
     new_lines = new_content.splitlines(keepends=True)
 
@@ -494,6 +497,8 @@ def generate_diff_string(
     Returns:
         {"diff": str, "first_changed_line": int | None}
     """
+    import difflib
+
     old_lines = old_content.split("\n")
     new_lines = new_content.split("\n")
 
@@ -654,30 +659,37 @@ def edit_file(path: str = None, edits: list = None):
         if not os.access(path, os.R_OK | os.W_OK):
             return f"[ERROR] 无法编辑 {path}：权限不足"
 
-        # 读取文件
-        with open(path, "r", encoding="utf-8") as f:
-            raw_content = f.read()
+        def _do_edit():
+            """读取、替换并写回文件（在文件变更队列中执行）。"""
+            # 读取文件
+            with open(path, "r", encoding="utf-8") as f:
+                raw_content = f.read()
 
-        # 去除 BOM
-        bom, content = strip_bom(raw_content)
+            # 去除 BOM
+            bom, content = strip_bom(raw_content)
 
-        # 检测原始行尾符
-        original_ending = detect_line_ending(content)
+            # 检测原始行尾符
+            original_ending = detect_line_ending(content)
 
-        # 统一为 LF
-        normalized_content = normalize_to_lf(content)
+            # 统一为 LF
+            normalized_content = normalize_to_lf(content)
 
-        # 应用编辑
-        base_content, new_content = apply_edits_to_normalized_content(
-            normalized_content, edits, path
-        )
+            # 应用编辑
+            base_content, new_content = apply_edits_to_normalized_content(
+                normalized_content, edits, path
+            )
+
+            # 恢复行尾符并加回 BOM
+            final_content = bom + restore_line_endings(new_content, original_ending)
+
+            # 写入文件
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(final_content)
 
-        # 恢复行尾符并加回 BOM
-        final_content = bom + restore_line_endings(new_content, original_ending)
+            return base_content, new_content
 
-        # 写入文件
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(final_content)
+        # 同一文件的写入与 write_file 共用文件级锁，避免并发调用互相覆盖
+        base_content, new_content = _with_file_mutation_queue(path, _do_edit)
 
         # 生成 diff
         diff_result = generate_diff_string(base_content, new_content)
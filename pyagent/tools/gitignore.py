@@ -0,0 +1,276 @@
+"""
+.gitignore 匹配器 —— list_directory、search_files、search_code 等遍历目录的工具共用。
+
+- 每个 .gitignore 的全部规则合并为一个预编译的正则（倒序排列的多分支），
+  一次 match 即可得到最后一条命中的规则，遵循 "后出现的规则优先" 的语义
+- 支持嵌套 .gitignore：子目录中的规则相对该目录解析，优先级高于上层目录
+- 每个目录适用的规则链按目录缓存，同一目录下的条目只需查找一次
+- 支持 ! 否定、以 / 结尾只匹配目录、含 / 的模式相对 .gitignore 所在目录锚定
+
+遍历方需要在进入目录前判断该目录是否被忽略并剪枝：与 git 一致，
+父目录被忽略时其中的文件无法被 ! 规则重新包含。
+"""
+
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple
+
+GITIGNORE_FILE = ".gitignore"
+
+
+def glob_to_regex(pattern: str) -> str:
+    """
+    将 .gitignore 风格的通配模式转换为正则表达式片段（不含锚定，不含捕获组）。
+
+    - * 匹配任意数量的非斜杠字符
+    - ? 匹配单个非斜杠字符
+    - **/ 匹配零个或多个目录，末尾的 ** 匹配任意内容
+    - [abc]、[a-z] 字符类，[!abc] 否定字符类
+    - \\ 转义下一个字符
+    """
+    i = 0
+    result = []
+    length = len(pattern)
+
+    while i < length:
+        c = pattern[i]
+
+        if c == '*':
+            # 检查是否是 **
+            if i + 1 < length and pattern[i + 1] == '*':
+                if i + 2 < length and pattern[i + 2] == '/':
+                    # **/ 匹配零个或多个目录
+                    result.append('(?:.*/)?')
+                    i += 3
+                elif i + 2 >= length:
+                    # ** 在末尾，匹配任意内容
+                    result.append('.*')
+                    i += 2
+                else:
+                    # ** 后面不是 /，作为普通 *
+                    result.append('[^/]*')
+                    i += 2
+            else:
+                # 单个 * 匹配非斜杠字符
+                result.append('[^/]*')
+                i += 1
+
+        elif c == '?':
+            # ? 匹配单个非斜杠字符
+            result.append('[^/]')
+            i += 1
+
+        elif c == '[':
+            # 字符类
+            j = i + 1
+            negate = j < length and pattern[j] == '!'
+            if negate:
+                j += 1
+
+            # 找到字符类的结束
+            class_content = []
+            while j < length and pattern[j] != ']':
+                if pattern[j] == '\\' and j + 1 < length:
+                    j += 1
+                    class_content.append(re.escape(pattern[j]))
+                elif pattern[j] == '-':
+                    # 保留范围语法 [a-z]
+                    class_content.append('-')
+                else:
+                    class_content.append(re.escape(pattern[j]))
+                j += 1
+
+            if j < length and class_content:
+                # 有效的字符类
+                char_class = ''.join(class_content)
+                result.append(f'[^{char_class}]' if negate else f'[{char_class}]')
+                i = j + 1
+            else:
+                # 未闭合的字符类，当作普通 [
+                result.append(re.escape(c))
+                i += 1
+
+        elif c == '\\':
+            # 转义字符
+            if i + 1 < length:
+                result.append(re.escape(pattern[i + 1]))
+                i += 2
+            else:
+                result.append(re.escape(c))
+                i += 1
+
+        else:
+            # 普通字符
+            result.append(re.escape(c))
+            i += 1
+
+    return ''.join(result)
+
+
+
+def compile_glob_filter(pattern: str) -> Pattern:
+    """
+    将工具的 glob 参数（.gitignore 语法）编译为筛选文件的正则，对相对路径调用 match()。
+
+    与 .gitignore 规则的锚定方式一致：不含 / 的模式匹配任意层级的文件名，
+    含 / 的模式相对搜索根目录锚定；以 / 结尾的模式只匹配目录。
+    文件本身或其任一上级目录匹配时选中，因此 src/ 选中 src 下的全部文件。
+    """
+    dir_only = pattern.rstrip().endswith('/')
+    pattern = pattern.strip().rstrip('/')
+    if not pattern:
+        return re.compile(r'(?!x)x')
+
+    anchored = '/' in pattern
+    prefix = '' if anchored else '(?:.*/)?'
+    suffix = '/' if dir_only else '(?:/|$)'
+    try:
+        return re.compile(f"{prefix}{glob_to_regex(pattern.lstrip('/'))}{suffix}")
+    except re.error:
+        return re.compile(r'(?!x)x')
+
+def _parse_rule(line: str) -> Optional[Tuple[str, bool]]:
+    """
+    将一行 .gitignore 规则转换为 (正则分支, 是否为否定规则)；空行与注释返回 None。
+
+    正则分支需匹配完整路径：规则只判断条目本身，被忽略目录下的内容由遍历方剪枝处理，
+    因此匹配祖先目录的 ! 规则不会重新包含其中的文件。
+    """
+    line = line.rstrip('\r\n')
+    # 末尾未转义的空格会被忽略
+    stripped = line.rstrip(' ')
+    if stripped.endswith('\\') and len(stripped) < len(line):
+        stripped += ' '
+    line = stripped
+    if not line or line.startswith('#'):
+        return None
+
+    negate = line.startswith('!')
+    if negate:
+        line = line[1:]
+    elif line.startswith('\\#') or line.startswith('\\!'):
+        line = line[1:]
+
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+
+    # 开头或中间含 / 的模式相对 .gitignore 所在目录锚定，否则匹配任意层级
+    anchored = '/' in line
+    line = line.lstrip('/')
+    body = glob_to_regex(line)
+    prefix = '' if anchored else '(?:.*/)?'
+    # 待匹配的目录路径以 / 结尾，只匹配目录的规则要求该 /
+    suffix = '/$' if dir_only else '/?$'
+    return f'{prefix}{body}{suffix}', negate
+
+
+class RuleSet:
+    """一组按顺序排列的规则，合并编译为单个正则。"""
+
+    def __init__(self, lines: Iterable[str]):
+        rules = [rule for rule in map(_parse_rule, lines) if rule is not None]
+        self._negations: List[bool] = []
+        branches = []
+        # 倒序排列：从左到右尝试时先命中的就是文件中最后一条匹配的规则
+        for branch, negate in reversed(rules):
+            try:
+                re.compile(branch)
+            except re.error:
+                continue
+            branches.append(f'({branch})')
+            self._negations.append(negate)
+        self._regex = re.compile('|'.join(branches)) if branches else None
+
+    def __bool__(self) -> bool:
+        return self._regex is not None
+
+    def decide(self, path: str) -> Optional[bool]:
+        """
+        返回 True（忽略）、False（由 ! 规则重新包含）或 None（没有规则命中）。
+
+        path 为相对规则所在目录的路径，目录以 / 结尾。
+        """
+        if self._regex is None:
+            return None
+        match = self._regex.match(path)
+        if match is None:
+            return None
+        return not self._negations[match.lastindex - 1]
+
+
+def read_rule_lines(path: str) -> Optional[List[str]]:
+    """读取规则文件的各行；文件不存在或无法读取时返回 None。"""
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return f.read().splitlines()
+    except OSError:
+        return None
+
+
+def _gitignore_signature(path: str):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class GitignoreMatcher:
+    """
+    判断目录树 root 中的条目是否被忽略。
+
+    优先级从高到低：keep 中的模式（总是保留）> 嵌套 .gitignore（越深越优先）> ignore 中的模式。
+    ignore / keep 的模式相对 root 解析。
+    """
+
+    def __init__(self, root: str, ignore: Iterable[str] = ('.git',), keep: Iterable[str] = (),
+                 read_gitignore_files: bool = True):
+        self.root = os.path.abspath(root)
+        self._ignore = RuleSet(ignore)
+        self._keep = RuleSet(keep)
+        self._read_files = read_gitignore_files
+        # 相对目录 -> 适用的规则链 [(目录前缀, 规则集)]，由深到浅
+        self._chains: Dict[str, List[Tuple[str, RuleSet]]] = {}
+        # 已读取的 .gitignore 路径 -> (大小, mtime_ns)，不存在为 None
+        self._signatures: Dict[str, Optional[Tuple[int, int]]] = {}
+
+    def _chain(self, relative_dir: str) -> List[Tuple[str, RuleSet]]:
+        chain = self._chains.get(relative_dir)
+        if chain is not None:
+            return chain
+
+        if relative_dir:
+            parent = relative_dir.rpartition('/')[0]
+            chain = list(self._chain(parent))
+        else:
+            chain = []
+
+        if self._read_files:
+            directory = os.path.join(self.root, relative_dir) if relative_dir else self.root
+            path = os.path.join(directory, GITIGNORE_FILE)
+            self._signatures[path] = _gitignore_signature(path)
+            lines = read_rule_lines(path) if self._signatures[path] is not None else None
+            rules = RuleSet(lines) if lines else None
+            if rules:
+                prefix = f'{relative_dir}/' if relative_dir else ''
+                chain.insert(0, (prefix, rules))
+
+        self._chains[relative_dir] = chain
+        return chain
+
+    def ignored(self, relative_path: str, is_dir: bool = False) -> bool:
+        """relative_path 为相对 root、以 / 分隔的路径；其父目录应已判断为未被忽略。"""
+        path = relative_path + '/' if is_dir else relative_path
+        if self._keep and self._keep.decide(path) is not None:
+            return False
+        for prefix, rules in self._chain(relative_path.rpartition('/')[0]):
+            decision = rules.decide(path[len(prefix):])
+            if decision is not None:
+                return decision
+        return bool(self._ignore.decide(path))
+
+    def stale(self) -> bool:
+        """已读取的 .gitignore 是否有新增、修改或删除（供缓存了遍历结果的调用方使用）。"""
+        return any(_gitignore_signature(path) != signature for path, signature in self._signatures.items())
@@ -0,0 +1,126 @@
+"""
+大文件的稀疏行偏移索引 —— read_file 分页读取时直接定位到目标行。
+
+首次读取时通过 mmap 按固定大小的块扫描一遍文件，记录每个块起点之前的换行符数量
+（即块起点所在的行号）。之后：
+- 任意 offset：二分找到目标行所在的块，只需在该块内定位换行符，无需从头扫描
+- 总行数直接取自索引
+
+索引按 (路径, 大小, mtime) 缓存在进程内，文件变化后自动重建。
+行的划分与 read_file 一致（\n 或 \r\n 换行）；含单独 \r 换行的文件不建索引，
+由 read_file 回退到流式扫描。
+"""
+
+import mmap
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+# 小于该大小的文件直接流式读取，不建索引
+INDEX_MIN_FILE_BYTES = 4 * 1024 * 1024
+# 索引块大小：定位任意行最多扫描一个块
+INDEX_BLOCK_BYTES = 1024 * 1024
+# 缓存的索引数量上限
+_CACHE_LIMIT = 32
+
+
+class LineIndex:
+    """
+    一个文件的稀疏行索引。
+
+    newlines_before[i] 为第 i 个块（起点 i * block_bytes）之前的换行符数量。
+    """
+
+    def __init__(self, size: int, block_bytes: int, newlines_before: array, total_lines: int):
+        self.size = size
+        self.block_bytes = block_bytes
+        self.newlines_before = newlines_before
+        self.total_lines = total_lines
+
+    def line_start(self, f, line: int) -> int:
+        """返回第 line 行（0 起）起点的字节偏移；f 为以二进制模式打开的同一文件。"""
+        if line <= 0:
+            return 0
+        # 第 line 行起始于第 line 个换行符之后：找到该换行符所在的第一个候选块
+        block = bisect_left(self.newlines_before, line) - 1
+        needed = line - self.newlines_before[block]
+        position = block * self.block_bytes
+
+        f.seek(position)
+        while True:
+            data = f.read(self.block_bytes)
+            if not data:
+                return self.size
+            found = data.count(b"\n")
+            if found < needed:
+                needed -= found
+                position += len(data)
+                continue
+            index = -1
+            for _ in range(needed):
+                index = data.find(b"\n", index + 1)
+            return position + index + 1
+
+
+def build_line_index(f, size: int, block_bytes: int = INDEX_BLOCK_BYTES) -> LineIndex | None:
+    """扫描文件建立索引；文件含单独的 \\r 换行时返回 None。"""
+    newlines_before = array("Q")
+    newlines = 0
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        for start in range(0, size, block_bytes):
+            newlines_before.append(newlines)
+            block = mapped[start:start + block_bytes]
+            newlines += block.count(b"\n")
+
+            carriage_returns = block.count(b"\r")
+            if carriage_returns:
+                crlf = block.count(b"\r\n")
+                if block.endswith(b"\r") and mapped[start + len(block):start + len(block) + 1] == b"\n":
+                    crlf += 1
+                if carriage_returns != crlf:
+                    return None
+        ends_with_newline = size > 0 and mapped[size - 1:size] == b"\n"
+
+    # 与 split("\n") 语义一致：末尾不是换行时最后一段也算一行（空文件为一行）
+    total_lines = newlines + (0 if ends_with_newline else 1)
+    return LineIndex(size, block_bytes, newlines_before, total_lines)
+
+
+_cache: "OrderedDict[str, tuple[int, int, LineIndex | None]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_line_index(path: str, f) -> LineIndex | None:
+    """
+    返回文件的行索引（必要时构建并缓存）；文件过小或不适合建索引时返回 None。
+
+    Args:
+        path: 文件的绝对路径（缓存键）
+        f: 以二进制模式打开的该文件
+    """
+    stat = os.fstat(f.fileno())
+    if stat.st_size < INDEX_MIN_FILE_BYTES:
+        return None
+
+    key = (stat.st_size, stat.st_mtime_ns)
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[:2] == key:
+            _cache.move_to_end(path)
+            return cached[2]
+
+    index = build_line_index(f, stat.st_size, INDEX_BLOCK_BYTES)
+
+    with _cache_lock:
+        _cache[path] = (*key, index)
+        _cache.move_to_end(path)
+        while len(_cache) > _CACHE_LIMIT:
+            _cache.popitem(last=False)
+    return index
+
+
+def clear_line_index_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
@@ -6,12 +6,18 @@
 - 文本截断：默认最大 2000 行或 50KB（以先到者为准）
 - 分页读取：通过 offset（1-indexed）和 limit 参数支持大文件分页
 - 截断时自动给出继续读取的提示（offset 建议）
+- 流式读取：逐行读取所需范围，达到 offset/limit 或字节预算即停止，不整体载入文件
+- 大文件建立稀疏行偏移索引（见 line_index），分页读取时直接定位到 offset，总行数取自索引
 - 跨平台支持（Linux / macOS / Windows）
 """
 
+import codecs
+import io
 import os
 import unicodedata
 
+from .line_index import get_line_index
+
 
 # ===========================================================================
 # 常量（与 pi 框架一致）
@@ -20,6 +26,13 @@ import unicodedata
 DEFAULT_MAX_LINES = 2000
 DEFAULT_MAX_BYTES = 50 * 1024  # 50KB
 
+# 二进制检测读取的文件头大小
+BINARY_SAMPLE_BYTES = 8192
+# 逐行读取时单次 readline 的最大字符数（超长行分段读取）
+_READ_CHUNK_CHARS = 64 * 1024
+# 统计剩余行数时单次读取的字符数
+_COUNT_CHUNK_CHARS = 1024 * 1024
+
 # ===========================================================================
 # Unicode 空格规范化（与 pi 框架 UNICODE_SPACES 一致）
 # ===========================================================================
@@ -208,6 +221,94 @@ def _truncate_head(
     }
 
 
+# ===========================================================================
+# 流式读取
+# ===========================================================================
+
+def _looks_binary(sample: bytes, complete: bool) -> bool:
+    """
+    根据文件头判断是否为二进制文件：含 NUL 字节，或不是合法的 UTF-8。
+
+    complete 为 False 时样本只是文件开头，末尾被截断的多字节字符不视为错误。
+    """
+    if b"\x00" in sample:
+        return True
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=complete)
+    except UnicodeDecodeError:
+        return True
+    return False
+
+
+class _LineReader:
+    """
+    逐行读取文本文件，行的划分与 content.split("\n")（以换行结尾时去掉末尾空元素）一致：
+    空文件视为一个空行。超长行分段读取，只保留前 keep_chars 个字符。
+    """
+
+    def __init__(self, f, lines_read: int = 0):
+        # lines_read 非 0 表示 f 已定位到该行的起点
+        self._f = f
+        self.lines_read = lines_read
+        self._eof = False
+
+    def next_line(self, keep_chars: int = 0, measure: bool = False):
+        """
+        读取下一行，返回 (文本, UTF-8 字节数)；没有更多行时返回 None。
+
+        measure 为 False 时不统计字节数（跳过 offset 之前的行时使用）。
+        """
+        if self._eof:
+            return None
+        piece = self._f.readline(_READ_CHUNK_CHARS)
+        if not piece:
+            self._eof = True
+            if self.lines_read == 0:
+                self.lines_read = 1
+                return "", 0
+            return None
+
+        parts = []
+        kept = 0
+        byte_count = 0
+        while True:
+            ended = piece.endswith("\n")
+            if ended:
+                piece = piece[:-1]
+            if measure:
+                byte_count += len(piece.encode("utf-8"))
+            if kept < keep_chars:
+                part = piece[: keep_chars - kept]
+                parts.append(part)
+                kept += len(part)
+            if ended:
+                break
+            piece = self._f.readline(_READ_CHUNK_CHARS)
+            if not piece:
+                self._eof = True
+                break
+
+        self.lines_read += 1
+        return "".join(parts), byte_count
+
+    def count_remaining(self) -> int:
+        """分块统计剩余的行数，不保留内容。"""
+        if self._eof:
+            return 0
+        count = 0
+        last_char = "\n"
+        while True:
+            chunk = self._f.read(_COUNT_CHUNK_CHARS)
+            if not chunk:
+                break
+            count += chunk.count("\n")
+            last_char = chunk[-1]
+        self._eof = True
+        if last_char != "\n":
+            count += 1
+        return count
+
+
 # ===========================================================================
 # 主函数
 # ===========================================================================
@@ -247,71 +348,106 @@ def read_file(
 
     # ---- 读取文本内容 ----
     try:
-        with open(absolute_path, "r", encoding="utf-8") as f:
-            raw_content = f.read()
-    except UnicodeDecodeError:
-        # 可能是二进制文件，尝试以二进制方式读取
-        try:
-            with open(absolute_path, "rb") as f:
-                binary_data = f.read()
-            file_size = len(binary_data)
-            return (
-                f"[Binary file detected]\n"
-                f"File: {path}\n"
-                f"Size: {_format_size(file_size)}\n"
-                f"[Use appropriate tools for binary files]"
-            )
-        except Exception as e:
-            return f"[ERROR] read_file: failed to read file — {e}"
+        with open(absolute_path, "rb") as binary_file:
+            sample = binary_file.read(BINARY_SAMPLE_BYTES)
+            file_size = os.fstat(binary_file.fileno()).st_size
+            if _looks_binary(sample, complete=len(sample) >= file_size):
+                return (
+                    f"[Binary file detected]\n"
+                    f"File: {path}\n"
+                    f"Size: {_format_size(file_size)}\n"
+                    f"[Use appropriate tools for binary files]"
+                )
+
+            # 大文件：通过行索引直接定位到 offset 所在行
+            start_line = max(0, (offset - 1) if offset is not None else 0)
+            index = get_line_index(absolute_path, binary_file)
+            total_lines = None
+            if index is not None:
+                total_lines = index.total_lines
+                start_line = min(start_line, total_lines)
+                binary_file.seek(index.line_start(binary_file, start_line))
+            else:
+                start_line = 0
+                binary_file.seek(0)
+
+            text_file = io.TextIOWrapper(binary_file, encoding="utf-8", errors="replace")
+            try:
+                reader = _LineReader(text_file, lines_read=start_line)
+                return _read_lines(reader, path, offset, limit, total_lines)
+            finally:
+                # 由外层 with 关闭文件
+                text_file.detach()
     except Exception as e:
         return f"[ERROR] read_file: failed to read file — {e}"
 
-    # ---- 拆分为行 ----
-    all_lines = raw_content.split("\n")
-    if raw_content.endswith("\n"):
-        all_lines.pop()
 
-    total_file_lines = len(all_lines)
+def _read_lines(reader: _LineReader, path: str, offset, limit, total_lines: int = None) -> str:
+    """
+    从 reader 中读取 offset/limit 指定的行并按截断规则格式化。
+
+    total_lines 为已知的文件总行数（来自行索引）；为 None 时在需要时扫描剩余内容统计。
+    """
+    def count_total_lines() -> int:
+        if total_lines is not None:
+            return total_lines
+        return reader.lines_read + reader.count_remaining()
 
-    # ---- 应用 offset ----
+    # ---- 跳过 offset 之前的行 ----
     start_line = max(0, (offset - 1) if offset is not None else 0)
     start_line_display = start_line + 1
 
-    if start_line >= total_file_lines:
+    while reader.lines_read < start_line and reader.next_line() is not None:
+        pass
+
+    line = None
+    if total_lines is None or start_line < total_lines:
+        line = reader.next_line(DEFAULT_MAX_BYTES, measure=True)
+    if line is None:
         return (
             f"[ERROR] read_file: offset {offset} is beyond end of file "
-            f"({total_file_lines} lines total)"
+            f"({count_total_lines()} lines total)"
         )
 
-    # ---- 提取选中内容 ----
-    if limit is not None:
-        end_line = min(start_line + limit, total_file_lines)
-        selected_content = "\n".join(all_lines[start_line:end_line])
-        user_limited_lines = end_line - start_line
-    else:
-        selected_content = "\n".join(all_lines[start_line:])
-        user_limited_lines = None
-
-    # ---- 应用截断 ----
-    truncation = _truncate_head(selected_content)
+    # ---- 逐行收集，直到 limit 或截断限制 ----
+    # 与 _truncate_head 一致：以先触发的行数/字节限制为准，从不返回不完整的行
+    output_lines = []
+    output_bytes = 0
+    truncated_by = None
 
-    if truncation["first_line_exceeds_limit"]:
-        first_line_size = _format_size(
-            len(all_lines[start_line].encode("utf-8"))
-        )
-        return (
-            f"[Line {start_line_display} is {first_line_size}, "
-            f"exceeds {_format_size(DEFAULT_MAX_BYTES)} limit. "
-            f"Use bash: sed -n '{start_line_display}p' {path} | "
-            f"head -c {DEFAULT_MAX_BYTES}]"
+    while line is not None:
+        if limit is not None and len(output_lines) >= limit:
+            break
+        text, line_bytes = line
+        if not output_lines and line_bytes > DEFAULT_MAX_BYTES:
+            return (
+                f"[Line {start_line_display} is {_format_size(line_bytes)}, "
+                f"exceeds {_format_size(DEFAULT_MAX_BYTES)} limit. "
+                f"Use bash: sed -n '{start_line_display}p' {path} | "
+                f"head -c {DEFAULT_MAX_BYTES}]"
+            )
+        if len(output_lines) >= DEFAULT_MAX_LINES:
+            truncated_by = "lines"
+            break
+        added_bytes = line_bytes + (1 if output_lines else 0)
+        if output_bytes + added_bytes > DEFAULT_MAX_BYTES:
+            truncated_by = "bytes"
+            break
+        output_lines.append(text)
+        output_bytes += added_bytes
+        line = None if limit is not None and len(output_lines) >= limit else (
+            reader.next_line(DEFAULT_MAX_BYTES, measure=True)
         )
 
-    if truncation["truncated"]:
-        output_text = truncation["content"]
-        end_line_display = start_line_display + truncation["output_lines"] - 1
+    output_text = "\n".join(output_lines)
+
+    if truncated_by is not None:
+        # 触发截断的那一行已被读出，也计入总行数
+        total_file_lines = count_total_lines()
+        end_line_display = start_line_display + len(output_lines) - 1
         next_offset = end_line_display + 1
 
-        if truncation["truncated_by"] == "lines":
+        if truncated_by == "lines":
             output_text += (
                 f"\n\n[Showing lines {start_line_display}-{end_line_display} "
                 f"of {total_file_lines}. Use offset={next_offset} to continue.]"
@@ -325,21 +461,19 @@ def read_file(
         return output_text
 
     # 用户指定的 limit 导致提前结束，但文件还有更多内容
-    if (
-        user_limited_lines is not None
-        and start_line + user_limited_lines < total_file_lines
-    ):
-        remaining = total_file_lines - (start_line + user_limited_lines)
-        next_offset = start_line + user_limited_lines + 1
-        output_text = truncation["content"]
-        output_text += (
-            f"\n\n[{remaining} more lines in file. "
-            f"Use offset={next_offset} to continue.]"
-        )
+    if limit is not None:
+        total_file_lines = count_total_lines()
+        if start_line + limit < total_file_lines:
+            remaining = total_file_lines - (start_line + limit)
+            next_offset = start_line + limit + 1
+            output_text += (
+                f"\n\n[{remaining} more lines in file. "
+                f"Use offset={next_offset} to continue.]"
+            )
         return output_text
 
     # 无截断、完整返回
-    return truncation["content"]
+    return output_text
 
 
 # ===========================================================================
@@ -0,0 +1,209 @@
+"""
+工具注册表 —— 在导入时一次性整理所有工具的调用信息
+
+每个工具对应一个 ToolSpec：
+- func / schema：实现函数与提供给模型的 JSON Schema
+- parameters：函数签名中的参数名（缓存结果，调用时无需再做反射）
+- validator：由 schema 预编译的参数校验函数，在提交执行前拦截错误参数
+- 调度元数据：是否只读、按哪个参数的路径串行写入、是否绑定调用线程、默认超时
+
+参数校验只覆盖工具 schema 中用到的 JSON Schema 子集
+（type / properties / required / items / enum / additionalProperties），不依赖第三方库。
+"""
+
+import inspect
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+# 校验函数：返回错误描述列表，为空表示参数合法
+Validator = Callable[[Any], List[str]]
+
+_TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "string": lambda v: isinstance(v, str),
+    # bool 是 int 的子类，需单独排除；JSON 中的 1.0 也视为整数
+    "integer": lambda v: (isinstance(v, int) and not isinstance(v, bool))
+    or (isinstance(v, float) and v.is_integer()),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "array": lambda v: isinstance(v, list),
+    "object": lambda v: isinstance(v, dict),
+    "null": lambda v: v is None,
+}
+
+
+def compile_validator(schema: Dict[str, Any]) -> Validator:
+    """将 JSON Schema 编译为校验函数（schema 只在此遍历一次）。"""
+    return _compile(schema, "")
+
+
+def _compile(schema: Dict[str, Any], where: str) -> Validator:
+    checks: List[Validator] = []
+    label = where or "参数"
+
+    expected = schema.get("type")
+    if expected is not None:
+        names = [expected] if isinstance(expected, str) else list(expected)
+        type_checks = [_TYPE_CHECKS[name] for name in names if name in _TYPE_CHECKS]
+        if type_checks:
+            expected_text = " / ".join(names)
+
+            def check_type(value, type_checks=type_checks, expected_text=expected_text):
+                if any(check(value) for check in type_checks):
+                    return []
+                return [f"{label} 应为 {expected_text}，实际为 {type(value).__name__}"]
+
+            checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = list(schema["enum"])
+
+        def check_enum(value, allowed=allowed):
+            if value in allowed:
+                return []
+            return [f"{label} 的取值 {value!r} 不在允许范围内：{allowed}"]
+
+        checks.append(check_enum)
+
+    properties = schema.get("properties")
+    required = tuple(schema.get("required", ()))
+    additional = schema.get("additionalProperties", True)
+    if properties is not None or required or additional is False:
+        property_validators = {
+            name: _compile(sub_schema, f"{where}.{name}" if where else name)
+            for name, sub_schema in (properties or {}).items()
+        }
+
+        def check_object(value, property_validators=property_validators):
+            if not isinstance(value, dict):
+                return []  # 类型错误已由 check_type 报告
+            errors = [f"缺少必填参数 {_join(where, name)}" for name in required if name not in value]
+            for name, item in value.items():
+                validator = property_validators.get(name)
+                if validator is not None:
+                    errors.extend(validator(item))
+                elif additional is False:
+                    errors.append(f"不支持的参数 {_join(where, name)}")
+            return errors
+
+        checks.append(check_object)
+
+    items = schema.get("items")
+    if isinstance(items, dict):
+        item_validator = _compile(items, f"{label}[]")
+
+        def check_items(value, item_validator=item_validator):
+            if not isinstance(value, list):
+                return []
+            errors: List[str] = []
+            for item in value:
+                errors.extend(item_validator(item))
+            return errors
+
+        checks.append(check_items)
+
+    if len(checks) == 1:
+        return checks[0]
+
+    def validate(value):
+        errors: List[str] = []
+        for check in checks:
+            errors.extend(check(value))
+        return errors
+
+    return validate
+
+
+def _join(where: str, name: str) -> str:
+    return f"{where}.{name}" if where else name
+
+
+@dataclass(frozen=True)
+class ToolSpec:
+    """一个已注册工具的调用信息与调度元数据。"""
+
+    name: str
+    func: Callable[..., Any]
+    schema: Dict[str, Any]
+    parameters: frozenset
+    validator: Validator
+    # 只读工具不修改文件系统或外部状态
+    read_only: bool = False
+    # 写入路径所在的参数名；同一路径上的调用需按顺序串行
+    path_param: Optional[str] = None
+    # 必须在固定线程执行（如 Playwright 同步 API）
+    thread_affine: bool = False
+    # 工具自身的默认超时（秒），None 表示不限
+    timeout: Optional[float] = None
+
+    @property
+    def concurrency_safe(self) -> bool:
+        """能否与其它调用在线程池中任意并发执行。"""
+        return not self.thread_affine and self.path_param is None
+
+    def validate(self, arguments: Dict[str, Any]) -> List[str]:
+        return self.validator(arguments)
+
+
+class ToolRegistry:
+    """按名称索引的 ToolSpec 集合，保持注册顺序。"""
+
+    def __init__(self):
+        self._specs: Dict[str, ToolSpec] = {}
+
+    def register(self, schema: Dict[str, Any], func: Callable[..., Any], **metadata) -> ToolSpec:
+        """注册一个工具；schema 为 OpenAI function calling 格式的工具定义。"""
+        function = schema["function"]
+        name = function["name"]
+        if name in self._specs:
+            raise ValueError(f"工具 {name} 重复注册")
+        spec = ToolSpec(
+            name=name,
+            func=func,
+            schema=schema,
+            parameters=frozenset(inspect.signature(func).parameters),
+            validator=compile_validator(function.get("parameters") or {"type": "object"}),
+            **metadata,
+        )
+        self._specs[name] = spec
+        return spec
+
+    def register_all(
+        self,
+        schemas: Iterable[Dict[str, Any]],
+        functions: Dict[str, Callable[..., Any]],
+        metadata: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> None:
+        """批量注册一个工具模块导出的 XXX_TOOLS / XXX_FUNCTIONS。"""
+        metadata = metadata or {}
+        for schema in schemas:
+            name = schema["function"]["name"]
+            self.register(schema, functions[name], **metadata.get(name, {}))
+
+    def get(self, name: str) -> Optional[ToolSpec]:
+        return self._specs.get(name)
+
+    def __getitem__(self, name: str) -> ToolSpec:
+        return self._specs[name]
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._specs
+
+    def __iter__(self) -> Iterator[ToolSpec]:
+        return iter(self._specs.values())
+
+    def __len__(self) -> int:
+        return len(self._specs)
+
+    @property
+    def schemas(self) -> List[Dict[str, Any]]:
+        """提供给模型的工具定义列表（注册顺序）。"""
+        return [spec.schema for spec in self._specs.values()]
+
+    @property
+    def functions(self) -> Dict[str, Callable[..., Any]]:
+        """名称到实现函数的映射。"""
+        return {name: spec.func for name, spec in self._specs.items()}
+
+    def names(self, predicate: Callable[[ToolSpec], bool]) -> frozenset:
+        """满足条件的工具名集合，供调度器按元数据分类。"""
+        return frozenset(spec.name for spec in self._specs.values() if predicate(spec))
@@ -0,0 +1,378 @@
+"""
+文件内容搜索工具 —— 在目录树中按正则表达式搜索文本，替代通过 execute_command 调用 grep -r。
+
+- 遍历目录时使用与 list_directory 相同的 .gitignore 匹配器（含嵌套 .gitignore，默认跳过 .git），被忽略的目录整体剪枝
+- 大文件通过 mmap 映射后直接用 bytes 正则匹配，不整体读入内存；二进制文件自动跳过
+- 多个文件在线程池中并行扫描，结果按遍历顺序输出
+- 匹配数与输出字节数都有上限，达到上限后停止扫描并提示缩小范围
+- 支持上下文行（类似 grep -C），输出格式与 grep -n 一致
+"""
+
+import itertools
+import mmap
+import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Pattern, Tuple
+
+from .gitignore import GitignoreMatcher, compile_glob_filter
+
+# 默认最多返回的匹配数
+DEFAULT_MAX_RESULTS = 100
+# 输出总字节上限（与 read_file 一致）
+DEFAULT_MAX_BYTES = 50 * 1024
+# 上下文行数上限
+MAX_CONTEXT_LINES = 10
+# 单行输出的最大字符数，超出部分截断
+MAX_LINE_CHARS = 500
+# 二进制检测读取的文件头大小
+BINARY_SAMPLE_BYTES = 8192
+# 不超过该大小的文件直接读入内存，更大的文件使用 mmap
+MMAP_MIN_FILE_BYTES = 256 * 1024
+# 并行扫描的线程数
+SEARCH_WORKERS = min(8, os.cpu_count() or 1)
+# 每个扫描任务包含的文件数（分摊线程池调度开销）
+SEARCH_BATCH_FILES = 32
+
+
+def _iter_files(root: str, include: Optional[Pattern]):
+    """按名称顺序遍历 root 下未被忽略的文件，产出 (绝对路径, 相对路径)。"""
+    matcher = GitignoreMatcher(root)
+    stack = [("", root)]
+    while stack:
+        relative_dir, directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+
+        subdirectories = []
+        for entry in entries:
+            relative_path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if matcher.ignored(relative_path, is_dir):
+                    continue
+                if is_dir:
+                    subdirectories.append((relative_path, entry.path))
+                elif entry.is_file():
+                    if include is None or include.match(relative_path):
+                        yield entry.path, relative_path
+            except OSError:
+                continue
+        # 逆序入栈，保证子目录按名称顺序出栈
+        stack.extend(reversed(subdirectories))
+
+
+def _line_text(data, start: int, end: int) -> str:
+    if end - start > MAX_LINE_CHARS * 4:
+        end = start + MAX_LINE_CHARS * 4
+    text = bytes(data[start:end]).decode("utf-8", errors="replace").rstrip("\r")
+    if len(text) > MAX_LINE_CHARS:
+        text = text[:MAX_LINE_CHARS] + "…"
+    return text
+
+
+def _scan_file(path: str, regex: Pattern, context: int, max_matches: int) -> Tuple[List[Tuple[int, str, bool]], int]:
+    """
+    扫描单个文件。
+
+    Returns:
+        (输出行列表 [(行号, 文本, 是否匹配行)], 匹配行数)；二进制或无法读取的文件返回 ([], 0)
+    """
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return [], 0
+            if size <= MMAP_MIN_FILE_BYTES:
+                # 小文件直接读入，省去映射的系统调用开销
+                data = f.read()
+                if b"\x00" in data[:BINARY_SAMPLE_BYTES]:
+                    return [], 0
+                return _scan_buffer(data, len(data), regex, context, max_matches)
+            if b"\x00" in f.read(BINARY_SAMPLE_BYTES):
+                return [], 0
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return _scan_buffer(data, size, regex, context, max_matches)
+    except (OSError, ValueError):
+        return [], 0
+
+
+def _scan_batch(batch, regex: Pattern, context: int, max_matches: int):
+    """依次扫描一批文件，返回 [(相对路径, 输出行列表, 匹配行数)]。"""
+    return [
+        (relative_path, *_scan_file(absolute_path, regex, context, max_matches))
+        for absolute_path, relative_path in batch
+    ]
+
+
+def _scan_buffer(data, size: int, regex: Pattern, context: int, max_matches: int):
+    lines: List[Tuple[int, str, bool]] = []
+    emitted_until = 0  # 已输出到的行号（含）
+    matches = 0
+    # 增量统计行号：counted_pos 之前的换行数为 counted_lines
+    counted_pos = 0
+    counted_lines = 0
+
+    position = 0
+    while matches < max_matches and position < size:
+        match = regex.search(data, position)
+        # 以换行结尾时，文件末尾的空匹配不属于任何一行（与 grep 一致）
+        if match is None or (match.start() == size and data[size - 1:size] == b"\n"):
+            break
+        line_start = data.rfind(b"\n", 0, match.start()) + 1
+        line_end = data.find(b"\n", match.start())
+        if line_end == -1:
+            line_end = size
+        counted_lines += data[counted_pos:line_start].count(b"\n")
+        counted_pos = line_start
+        line_number = counted_lines + 1
+        matches += 1
+
+        # 前置上下文
+        before = []
+        cursor = line_start
+        for offset in range(1, context + 1):
+            if line_number - offset <= emitted_until or cursor == 0:
+                break
+            previous_start = data.rfind(b"\n", 0, cursor - 1) + 1
+            before.append((line_number - offset, _line_text(data, previous_start, cursor - 1), False))
+            cursor = previous_start
+        lines.extend(reversed(before))
+        lines.append((line_number, _line_text(data, line_start, line_end), True))
+        emitted_until = line_number
+
+        # 后置上下文（遇到下一处匹配时由下一轮输出）
+        cursor = line_end + 1
+        for offset in range(1, context + 1):
+            if cursor >= size:
+                break
+            next_end = data.find(b"\n", cursor)
+            if next_end == -1:
+                next_end = size
+            if regex.search(data[cursor:next_end]):
+                break
+            lines.append((line_number + offset, _line_text(data, cursor, next_end), False))
+            emitted_until = line_number + offset
+            cursor = next_end + 1
+
+        # 每行只报告一次
+        position = line_end + 1
+
+    return lines, matches
+
+
+def _format_file_lines(relative_path: str, lines: List[Tuple[int, str, bool]]) -> List[str]:
+    output = []
+    previous = None
+    for line_number, text, is_match in lines:
+        if previous is not None and line_number > previous + 1:
+            output.append("--")
+        separator = ":" if is_match else "-"
+        output.append(f"{relative_path}{separator}{line_number}{separator}{text}")
+        previous = line_number
+    return output
+
+
+def compile_search_pattern(pattern: str, ignore_case: bool = False, literal: bool = False) -> Pattern:
+    """将搜索模式编译为按行匹配的 bytes 正则；无效时抛出 re.error。"""
+    source = re.escape(pattern) if literal else pattern
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    return re.compile(source.encode("utf-8"), flags)
+
+
+def search_files(
+    pattern: str,
+    path: str = ".",
+    glob: str = None,
+    ignore_case: bool = False,
+    literal: bool = False,
+    context: int = 0,
+    max_results: int = DEFAULT_MAX_RESULTS,
+) -> str:
+    """
+    在文件中搜索匹配正则表达式的行。
+
+    Args:
+        pattern: 正则表达式（literal 为 True 时按普通文本匹配）
+        path: 搜索的目录或文件，默认为当前目录
+        glob: 只搜索匹配该模式的文件（.gitignore 语法，如 *.py、src/**/*.ts；含 / 的模式相对 path 锚定）
+        ignore_case: 忽略大小写（仅对 ASCII 字符生效）
+        literal: 将 pattern 视为普通文本
+        context: 每处匹配前后显示的上下文行数
+        max_results: 最多返回的匹配行数
+
+    Returns:
+        str: grep -n 格式的匹配结果或错误信息
+    """
+    if not pattern:
+        return "❌ 错误：pattern 不能为空"
+
+    try:
+        regex = compile_search_pattern(pattern, ignore_case, literal)
+    except re.error as e:
+        return f"❌ 错误：无效的正则表达式: {e}"
+
+    root = os.path.abspath(os.path.expanduser(path or "."))
+    if not os.path.exists(root):
+        return f"❌ 错误：路径不存在: {path}"
+
+    max_results = max(1, max_results or DEFAULT_MAX_RESULTS)
+    context = max(0, min(context or 0, MAX_CONTEXT_LINES))
+
+    if os.path.isfile(root):
+        files = [(root, os.path.basename(root))]
+    else:
+        include = compile_glob_filter(glob) if glob else None
+        files = _iter_files(root, include)
+
+    return run_search(files, regex, pattern, context, max_results)
+
+
+def run_search(files, regex: Pattern, pattern: str, context: int, max_results: int) -> str:
+    """
+    并行扫描 files（按顺序产出的 (绝对路径, 相对路径)）并格式化结果。
+
+    结果按 files 的顺序输出；匹配数或输出字节数达到上限后停止提交新的扫描任务。
+    """
+    files = iter(files)
+    output: List[str] = []
+    output_bytes = 0
+    total_matches = 0
+    matched_files = 0
+    scanned_files = 0
+    limit_reason = None
+
+    # 有界的在途任务窗口：按遍历顺序消费结果，达到上限后不再提交
+    with ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="pyagent-search") as pool:
+        pending = deque()
+
+        def submit_next() -> bool:
+            batch = list(itertools.islice(files, SEARCH_BATCH_FILES))
+            if not batch:
+                return False
+            pending.append(pool.submit(_scan_batch, batch, regex, context, max_results))
+            return True
+
+        while len(pending) < SEARCH_WORKERS * 4 and submit_next():
+            pass
+
+        while pending and limit_reason is None:
+            results = pending.popleft().result()
+            submit_next()
+            for relative_path, lines, matches in results:
+                scanned_files += 1
+                if not matches:
+                    continue
+
+                matched_files += 1
+                budget = max_results - total_matches
+                if matches > budget:
+                    # 只保留预算内的匹配行及其上下文
+                    kept, seen = [], 0
+                    for entry in lines:
+                        if entry[2]:
+                            seen += 1
+                            if seen > budget:
+                                break
+                        kept.append(entry)
+                    lines, matches = kept, budget
+                    limit_reason = "results"
+
+                for text in _format_file_lines(relative_path, lines):
+                    line_bytes = len(text.encode("utf-8")) + 1
+                    if output_bytes + line_bytes > DEFAULT_MAX_BYTES:
+                        limit_reason = "bytes"
+                        break
+                    output.append(text)
+                    output_bytes += line_bytes
+                total_matches += matches
+                if total_matches >= max_results:
+                    limit_reason = limit_reason or "results"
+                if limit_reason is not None:
+                    break
+
+        for future in pending:
+            future.cancel()
+
+    if total_matches == 0:
+        return f"未找到匹配 {pattern!r} 的内容（已搜索 {scanned_files} 个文件）"
+
+    if limit_reason == "results":
+        output.append(
+            f"\n[已达到 {max_results} 处匹配的上限，搜索提前结束。"
+            f"请使用更具体的 pattern，或通过 path / glob 缩小范围]"
+        )
+    elif limit_reason == "bytes":
+        output.append(
+            f"\n[输出已达到 {DEFAULT_MAX_BYTES // 1024}KB 上限，搜索提前结束。"
+            f"请使用更具体的 pattern，或通过 path / glob 缩小范围]"
+        )
+    else:
+        output.append(f"\n[共 {total_matches} 处匹配，分布在 {matched_files} 个文件中]")
+    return "\n".join(output)
+
+
+# ===========================================================================
+# 工具元信息（供 LLM 识别）
+# ===========================================================================
+
+SEARCH_FILES_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "search_files",
+            "description": (
+                "在目录中按正则表达式搜索文件内容（类似 grep -rn），比通过 execute_command 调用 grep 更快。"
+                "自动跳过 .gitignore 中忽略的文件、.git 目录和二进制文件。"
+                "结果格式为 路径:行号:内容，上下文行为 路径-行号-内容。"
+                f"默认最多返回 {DEFAULT_MAX_RESULTS} 处匹配，输出上限 {DEFAULT_MAX_BYTES // 1024}KB。"
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "pattern": {
+                        "type": "string",
+                        "description": "要搜索的正则表达式（Python re 语法）",
+                    },
+                    "path": {
+                        "type": "string",
+                        "description": "搜索的目录或文件，默认为当前目录",
+                    },
+                    "glob": {
+                        "type": "string",
+                        "description": "只搜索匹配该模式的文件（.gitignore 语法，含 / 时相对 path 匹配），如 *.py 或 src/**/*.ts",
+                    },
+                    "ignore_case": {
+                        "type": "boolean",
+                        "description": "是否忽略大小写，默认 false",
+                    },
+                    "literal": {
+                        "type": "boolean",
+                        "description": "将 pattern 作为普通文本而非正则表达式，默认 false",
+                    },
+                    "context": {
+                        "type": "integer",
+                        "description": f"每处匹配前后显示的上下文行数（最多 {MAX_CONTEXT_LINES}），默认 0",
+                    },
+                    "max_results": {
+                        "type": "integer",
+                        "description": f"最多返回的匹配行数，默认 {DEFAULT_MAX_RESULTS}",
+                    },
+                },
+                "required": ["pattern"],
+            },
+        },
+    }
+]
+
+# ===========================================================================
+# 工具函数映射（供 Agent 调用）
+# ===========================================================================
+
+SEARCH_FILES_FUNCTIONS = {
+    "search_files": search_files,
+}
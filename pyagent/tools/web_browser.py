@@ -10,7 +10,6 @@ import os
 import tempfile
 from typing import Union
 
-from .browser_manager import get_browser_manager
 
 # ---------------------------------------------------------------------------
 # 常量
@@ -153,6 +152,9 @@ def browser_use(
 
     # ---- 获取浏览器管理器 ----
     try:
+        # 浏览器管理模块在首次使用浏览器时才导入
+        from .browser_manager import get_browser_manager
+
         bm = get_browser_manager()
     except Exception as e:
         return f"[错误] 无法初始化浏览器：{str(e)}"
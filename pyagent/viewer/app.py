@@ -40,6 +40,13 @@ def convert_to_local_time(timestamp_str):
     except Exception:
         return str(timestamp_str)[:19] if timestamp_str else ""
 
+def get_message_order(cursor):
+    """会话内消息的排序子句：按保存时的序号 seq，旧数据（无 seq）按时间戳"""
+    cursor.execute("PRAGMA table_info(conversations)")
+    if any(column[1] == "seq" for column in cursor.fetchall()):
+        return "seq IS NULL, seq ASC, timestamp ASC, id ASC"
+    return "timestamp ASC, id ASC"
+
 def get_all_sessions():
     """获取所有会话列表"""
     if not check_db_exists():
@@ -56,14 +63,16 @@ def get_all_sessions():
         ORDER BY first_message_time DESC
     ''')
     
+    rows = cursor.fetchall()
+    order = get_message_order(cursor)
     sessions = []
-    for row in cursor.fetchall():
+    for row in rows:
         session_id, first_message_time, message_count = row
         
-        cursor.execute('''
+        cursor.execute(f'''
             SELECT content FROM conversations 
             WHERE session_id = ? AND role = 'user'
-            ORDER BY timestamp ASC 
+            ORDER BY {order}
             LIMIT 1
         ''', (session_id,))
         
@@ -106,11 +115,11 @@ def get_conversations(session_id):
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
-    cursor.execute('''
+    cursor.execute(f'''
         SELECT role, thinking, content, tool_calls, tool_call_id, timestamp
         FROM conversations 
         WHERE session_id = ? 
-        ORDER BY timestamp ASC
+        ORDER BY {get_message_order(cursor)}
     ''', (session_id,))
     
     conversations = []
@@ -0,0 +1,175 @@
+"""AsyncUnifiedLLMClient 单元测试（本地伪造的 SSE 服务）"""
+import asyncio
+import json
+import threading
+import unittest
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pyagent.llm_adapter import http_pool
+from pyagent.llm_adapter import (
+    AsyncUnifiedLLMClient,
+    HTTPPoolConfig,
+    close_async_http_clients,
+    get_async_http_client,
+)
+from pyagent.sdk_factory import SDKFactory
+
+
+def _chunk(delta=None, finish_reason=None, usage=None):
+    choices = [] if delta is None and finish_reason is None else [
+        {"index": 0, "delta": delta or {}, "finish_reason": finish_reason}
+    ]
+    body = {
+        "id": "chatcmpl-test",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "fake-model",
+        "choices": choices,
+    }
+    if usage is not None:
+        body["usage"] = usage
+    return body
+
+
+SSE_CHUNKS = [
+    _chunk({"role": "assistant", "reasoning_content": "想一想"}),
+    _chunk({"content": "Hello "}),
+    _chunk({"content": "world"}),
+    _chunk({"tool_calls": [{"index": 0, "id": "call_0", "type": "function",
+                            "function": {"name": "read_file", "arguments": "{\"path\": "}}]}),
+    _chunk({"tool_calls": [{"index": 0, "function": {"arguments": "\"a.txt\"}"}}]}),
+    _chunk(finish_reason="tool_calls"),
+    _chunk(usage={"prompt_tokens": 7, "completion_tokens": 5, "total_tokens": 12}),
+]
+
+
+class _FakeSSEHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = set()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.server.requests.append(json.loads(self.rfile.read(length)))
+        type(self).connections.add(self.client_address)
+
+        payload = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in SSE_CHUNKS)
+        if self.server.send_done:
+            payload += "data: [DONE]\n\n"
+        encoded = payload.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AsyncUnifiedLLMClientTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeSSEHandler)
+        cls.server.requests = []
+        cls.server.send_done = True
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}/v1"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.requests.clear()
+        self.server.send_done = True
+        _FakeSSEHandler.connections.clear()
+
+    async def _collect(self, client):
+        return [event async for event in client.chat_completions_create_with_events(messages=[])]
+
+    def test_streams_events_from_sse(self):
+        async def scenario():
+            sdk_client = SDKFactory.create_async_client("openai", "test-key", self.base_url)
+            client = AsyncUnifiedLLMClient(sdk_client, "fake-model")
+            try:
+                return await self._collect(client)
+            finally:
+                await close_async_http_clients()
+
+        events = asyncio.run(scenario())
+
+        types = [event.event_type for event in events]
+        self.assertEqual(
+            types, ["thinking", "content", "content", "tool_call", "tool_call", "finish", "usage"]
+        )
+        self.assertEqual(events[1].data + events[2].data, "Hello world")
+        self.assertEqual(events[5].data, "tool_calls")
+        self.assertEqual(events[6].data.total_tokens, 12)
+        self.assertEqual(self.server.requests[0]["model"], "fake-model")
+        self.assertTrue(self.server.requests[0]["stream"])
+
+    def test_concurrent_sessions_share_pool(self):
+        async def scenario():
+            shared = get_async_http_client()
+            clients = [
+                AsyncUnifiedLLMClient(
+                    SDKFactory.create_async_client("openai", "test-key", self.base_url),
+                    "fake-model",
+                )
+                for _ in range(4)
+            ]
+            try:
+                self.assertTrue(all(c.client._client is shared for c in clients))
+                first = await self._collect(clients[0])
+                rest = await asyncio.gather(*(self._collect(c) for c in clients[1:]))
+                return [first, *rest]
+            finally:
+                await close_async_http_clients()
+
+        results = asyncio.run(scenario())
+
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(len(events) == 7 for events in results))
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_keep_alive_reuses_connection(self):
+        # openai SDK 在收到 [DONE] 时即关闭响应：HTTP/1.1 下只有读到响应末尾的连接
+        # 才能放回连接池（HTTP/2 关闭的只是单个 stream）。这里让服务端以 EOF 结束流。
+        self.server.send_done = False
+
+        async def scenario():
+            client = AsyncUnifiedLLMClient(
+                SDKFactory.create_async_client("openai", "test-key", self.base_url),
+                "fake-model",
+            )
+            try:
+                for _ in range(3):
+                    await self._collect(client)
+            finally:
+                await close_async_http_clients()
+
+        asyncio.run(scenario())
+        # 顺序的三次请求复用同一条长连接
+        self.assertEqual(len(_FakeSSEHandler.connections), 1)
+
+    def test_pool_config_from_dict_ignores_unknown_keys(self):
+        config = HTTPPoolConfig.from_dict({"max_connections": 5, "unknown": 1})
+        self.assertEqual(config.max_connections, 5)
+        self.assertEqual(HTTPPoolConfig.from_dict(None), HTTPPoolConfig())
+
+    def test_missing_h2_falls_back_with_one_warning(self):
+        with mock.patch.object(http_pool, "is_http2_available", return_value=False), \
+                mock.patch.object(http_pool, "_http2_fallback_logged", False), \
+                self.assertLogs(http_pool.logger, "WARNING") as logs:
+            for _ in range(2):
+                http_pool.create_http_client().close()
+            http_pool.create_http_client(HTTPPoolConfig(http2=False)).close()
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("HTTP/1.1", logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
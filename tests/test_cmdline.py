@@ -1,4 +1,8 @@
+import os
 import subprocess
+import tempfile
+import threading
+import time
 import unittest
 from unittest.mock import MagicMock, patch
 
@@ -100,6 +104,38 @@ class CmdlineTests(unittest.TestCase):
         self.assertEqual(snapshot["truncation"]["output_lines"], 10)
         acc.close_temp_file()
 
+    def test_output_accumulator_multibyte_split_across_chunks(self):
+        """多字节字符被拆到两个块中时仍能正确解码。"""
+        data = "中文输出\n第二行".encode("utf-8")
+        acc = cmdline.OutputAccumulator(max_lines=1000, max_bytes=50000)
+        acc.append(data[:4])
+        # 未结束时不完整的字符不会被替换成乱码
+        self.assertEqual(acc.snapshot()["content"], "中")
+        acc.append(data[4:])
+        acc.finish()
+
+        snapshot = acc.snapshot()
+        self.assertEqual(snapshot["content"], "中文输出\n第二行")
+        self.assertEqual(snapshot["truncation"]["total_bytes"], len(data))
+        self.assertEqual(snapshot["truncation"]["total_lines"], 2)
+        self.assertEqual(acc.get_last_line_bytes(), len("第二行".encode("utf-8")))
+
+    def test_output_accumulator_rolling_tail_starts_at_line_boundary(self):
+        """尾部缓冲丢弃旧数据后，快照从完整的行开始。"""
+        acc = cmdline.OutputAccumulator(max_lines=5, max_bytes=100)
+        for i in range(1000):
+            acc.append(f"行 {i:04d}\n".encode("utf-8"))
+        acc.append(("长" * 500).encode("utf-8"))
+        acc.finish()
+
+        snapshot = acc.snapshot(persist_if_truncated=True)
+        self.addCleanup(os.unlink, snapshot["full_output_path"])
+        acc.close_temp_file()
+        self.assertTrue(snapshot["truncation"]["truncated"])
+        self.assertEqual(snapshot["truncation"]["total_lines"], 1001)
+        self.assertTrue(snapshot["content"].startswith("长"))
+        self.assertNotIn("\ufffd", snapshot["content"])
+
     def test_output_accumulator_temp_file(self):
         """输出累加器临时文件测试。"""
         acc = cmdline.OutputAccumulator(max_lines=10, max_bytes=500)
@@ -121,5 +157,114 @@ class CmdlineTests(unittest.TestCase):
             os.unlink(acc.temp_file_path)
 
 
+class OutputPumpTests(unittest.TestCase):
+    def _spawn(self, command):
+        process = subprocess.Popen(
+            command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        self.addCleanup(process.wait)
+        self.addCleanup(process.stdout.close)
+        self.addCleanup(process.stderr.close)
+        return process
+
+    def test_chunks_are_tagged_and_delivered_on_caller_thread(self):
+        process = self._spawn("printf out; printf err >&2")
+        caller = threading.get_ident()
+        received = {"stdout": b"", "stderr": b""}
+        threads = set()
+
+        def sink(tag, data):
+            threads.add(threading.get_ident())
+            received[tag] += data
+
+        timed_out = cmdline._pump_process_output(process, sink, time.monotonic() + 10)
+
+        self.assertFalse(timed_out)
+        self.assertEqual(received, {"stdout": b"out", "stderr": b"err"})
+        self.assertEqual(threads, {caller})
+
+    def test_deadline_reports_timeout(self):
+        process = self._spawn("sleep 5")
+        self.addCleanup(process.kill)
+        start = time.monotonic()
+        self.assertTrue(cmdline._pump_process_output(process, lambda tag, data: None, start + 0.2))
+        self.assertLess(time.monotonic() - start, 2)
+
+    @unittest.skipIf(os.name == "nt", "依赖 bash 后台任务")
+    def test_background_writer_does_not_block_after_exit(self):
+        # 父进程退出后，后台子进程仍持有管道并持续写入
+        command = "(while echo x; do sleep 0.01; done) & sleep 0.2"
+        with patch.object(cmdline, "PUMP_DRAIN_GRACE", 0.5):
+            start = time.monotonic()
+            result = cmdline.execute_command(command, timeout=-1)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertIn("执行完毕", result)
+
+    def test_large_output_is_complete(self):
+        process = self._spawn("head -c 3000000 /dev/zero")
+        sizes = []
+        cmdline._pump_process_output(process, lambda tag, data: sizes.append(len(data)), None)
+        self.assertEqual(sum(sizes), 3000000)
+
+    def test_execute_command_separate_stderr(self):
+        result = cmdline.execute_command("echo out; echo problem >&2", separate_stderr=True)
+        output_part, stderr_part = result.split("输出结果:")[1].split("标准错误:")
+        self.assertIn("out", output_part)
+        self.assertNotIn("problem", output_part)
+        self.assertIn("problem", stderr_part)
+
+    def test_execute_command_merges_stderr_by_default(self):
+        result = cmdline.execute_command("echo out; echo problem >&2")
+        self.assertIn("problem", result)
+        self.assertNotIn("标准错误", result)
+
+
+@unittest.skipIf(os.name == "nt", "持久 shell 仅支持 Linux/macOS")
+class ShellSessionTests(unittest.TestCase):
+    def setUp(self):
+        self.session = cmdline.ShellSession()
+        token = cmdline.activate_shell_session(self.session)
+        self.addCleanup(self.session.close)
+        self.addCleanup(cmdline.deactivate_shell_session, token)
+
+    def test_state_persists_between_commands(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cmdline.execute_command(f"cd {tmp} && export PYAGENT_TEST_VAR=kept")
+            pid = self.session.pid
+
+            result = cmdline.execute_command("pwd; echo $PYAGENT_TEST_VAR; printf no-newline")
+
+            self.assertIn(os.path.realpath(tmp), result)
+            self.assertIn("kept", result)
+            self.assertIn("no-newline", result)
+            self.assertEqual(self.session.pid, pid)
+            self.assertEqual(os.path.realpath(self.session.cwd), os.path.realpath(tmp))
+
+    def test_exit_code_and_syntax_error(self):
+        self.assertIn("退出码 3", cmdline.execute_command("(exit 3)"))
+        self.assertIn("退出码 2", cmdline.execute_command('echo "unbalanced'))
+        self.assertIn("执行完毕", cmdline.execute_command("echo ok"))
+
+    def test_timeout_kills_shell_and_restarts_in_same_directory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cmdline.execute_command(f"cd {tmp}")
+            pid = self.session.pid
+
+            result = cmdline.execute_command("echo before; sleep 10", timeout=1)
+            self.assertIn("命令超时", result)
+            self.assertIn("before", result)
+            self.assertIsNone(self.session.pid)
+
+            result = cmdline.execute_command("pwd")
+            self.assertIn(os.path.realpath(tmp), result)
+            self.assertNotEqual(self.session.pid, pid)
+
+    def test_shell_exit_is_reported(self):
+        result = cmdline.execute_command("exit 4")
+        self.assertIn("退出码 4", result)
+        self.assertIn("shell 已退出", result)
+        self.assertIn("hello", cmdline.execute_command("echo hello"))
+
+
 if __name__ == "__main__":
     unittest.main()
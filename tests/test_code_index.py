@@ -0,0 +1,210 @@
+"""三元组代码索引与 search_code 工具单元测试"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from pyagent.tools import TOOL_REGISTRY
+from pyagent.tools import code_index
+from pyagent.tools.code_index import CodeIndex, literal_trigrams, regex_query, search_code
+from pyagent.tools.search_files import search_files
+
+
+class RegexQueryTests(unittest.TestCase):
+    def _query(self, pattern, **kwargs):
+        return [[sorted(grams) for grams in clause] for clause in regex_query(pattern, **kwargs)]
+
+    def test_literal_runs_become_required_trigrams(self):
+        query = self._query(r"^def\s+handle_request\(")
+        self.assertEqual(query, [[sorted(literal_trigrams("def"))], [sorted(literal_trigrams("handle_request("))]])
+
+    def test_branches_become_alternatives(self):
+        query = self._query(r"(foo|barbaz)_id")
+        self.assertEqual(len(query), 2)
+        self.assertEqual(query[0], [sorted(literal_trigrams("foo")), sorted(literal_trigrams("barbaz"))])
+
+    def test_unconstrained_patterns(self):
+        self.assertEqual(regex_query(r"a.b"), [])
+        self.assertEqual(regex_query(r"(foo|x)"), [])
+        self.assertEqual(regex_query(r"(?:abc)?"), [])
+        self.assertEqual(regex_query(r"Größe", ignore_case=True, literal=True), [])
+
+    def test_regex_syntax_is_recognised(self):
+        # 零宽断言与转义的字符不会打断字面量
+        self.assertEqual(self._query(r"\bfoo\.bar\b"), [[sorted(literal_trigrams("foo.bar"))]])
+        self.assertEqual(self._query(r"(?=abc)abcdef"), [[sorted(literal_trigrams("abcdef"))]])
+        self.assertEqual(self._query(r"(?#note)\x41bc"), [[sorted(literal_trigrams("Abc"))]])
+        # 至少出现一次的分组保留，可选的丢弃；非量词的 { 是普通字符
+        self.assertEqual(self._query(r"(?P<n>abc)+x?def"), [[sorted(literal_trigrams("abc"))], [sorted(literal_trigrams("def"))]])
+        self.assertEqual(self._query(r"ab{2,}cde"), [[sorted(literal_trigrams("cde"))]])
+        self.assertEqual(self._query(r"a{b}c"), [[sorted(literal_trigrams("a{b}c"))]])
+        self.assertEqual(self._query(r"[abc]def\d+ghi"), [[sorted(literal_trigrams("def"))], [sorted(literal_trigrams("ghi"))]])
+
+    def test_inline_flags_and_invalid_patterns(self):
+        self.assertEqual(regex_query("(?i)Größe"), regex_query("gr"))
+        self.assertEqual(regex_query("(?x) abc def"), [])
+        self.assertEqual(regex_query("(abc"), [])
+        self.assertEqual(regex_query("abc[def"), [])
+
+    def test_case_is_folded(self):
+        self.assertEqual(regex_query("HELLO"), regex_query("hello"))
+
+
+class CodeIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.addCleanup(shutil.rmtree, self.cache)
+        patcher = mock.patch.object(code_index, "INDEX_DIR", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(code_index.close_code_indexes)
+
+    def _write(self, relative_path, content):
+        path = os.path.join(self.root, *relative_path.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content if isinstance(content, bytes) else content.encode("utf-8"))
+        # 保证同一秒内的修改也能被 mtime 区分
+        stamp = time.time_ns() + 10_000_000 * len(os.listdir(os.path.dirname(path)))
+        os.utime(path, ns=(stamp, stamp))
+        return path
+
+    def _candidates(self, index, pattern, **kwargs):
+        return index.candidates(regex_query(pattern, **kwargs))
+
+    def test_candidates_are_narrowed_by_trigrams(self):
+        self._write("a.py", "def handle_request(req):\n    pass\n")
+        self._write("b.py", "def other():\n    pass\n")
+        self._write("sub/c.py", "x = Handle_Request()\n")
+        self._write("data.bin", b"handle_request\x00")
+        index = CodeIndex(self.root)
+        self.addCleanup(index.close)
+
+        self.assertEqual(index.refresh(), {"added": 4, "updated": 0, "removed": 0})
+        self.assertEqual(self._candidates(index, "handle_request"), ["a.py", "sub/c.py"])
+        self.assertEqual(self._candidates(index, "def (handle|other)"), ["a.py", "b.py"])
+        self.assertEqual(self._candidates(index, "nothing_here"), [])
+
+    def test_incremental_refresh_and_persistence(self):
+        self._write("a.py", "alpha\n")
+        self._write("b.py", "beta\n")
+        index = CodeIndex(self.root)
+        index.refresh()
+        self.assertEqual(index.refresh(), {"added": 0, "updated": 0, "removed": 0})
+
+        self._write("a.py", "gamma\n")
+        os.remove(os.path.join(self.root, "b.py"))
+        self._write("new/c.py", "alpha gamma\n")
+        self.assertEqual(index.refresh(), {"added": 1, "updated": 1, "removed": 1})
+        self.assertEqual(self._candidates(index, "alpha"), ["new/c.py"])
+        self.assertEqual(self._candidates(index, "gamma"), ["a.py", "new/c.py"])
+        index.close()
+
+        # 重新打开：索引从磁盘加载，没有变化的文件不会重新索引
+        reopened = CodeIndex(self.root)
+        self.addCleanup(reopened.close)
+        self.assertEqual(reopened.refresh(), {"added": 0, "updated": 0, "removed": 0})
+        self.assertEqual(self._candidates(reopened, "gamma"), ["a.py", "new/c.py"])
+
+    def test_compaction_drops_dead_ids(self):
+        self._write("a.py", "version_one\n")
+        index = CodeIndex(self.root)
+        self.addCleanup(index.close)
+        index.refresh()
+        for i in range(3):
+            self._write("a.py", f"version_{i}\n")
+            index.refresh()  # 失效 ID 超过比例后自动压缩
+
+        self.assertEqual(index._meta("dead"), 0)
+        self.assertEqual(index._conn.execute("SELECT DISTINCT batch FROM postings").fetchall(), [(1,)])
+        self.assertEqual(self._candidates(index, "version_2"), ["a.py"])
+        self.assertEqual(self._candidates(index, "version_one"), [])
+
+    def test_instances_sharing_a_database(self):
+        # 多个进程共用同一个索引库：每个实例都以数据库中的文件表为准
+        self._write("a.py", "alpha\n")
+        first = CodeIndex(self.root)
+        self.addCleanup(first.close)
+        first.refresh()
+        second = CodeIndex(self.root, db_path=first.db_path)
+        self.addCleanup(second.close)
+
+        self._write("b.py", "alpha beta\n")
+        self.assertEqual(second.refresh(), {"added": 1, "updated": 0, "removed": 0})
+        self._write("c.py", "alpha gamma\n")
+        self.assertEqual(first.refresh(), {"added": 1, "updated": 0, "removed": 0})
+        self.assertEqual(self._candidates(first, "beta"), ["b.py"])
+
+        # 压缩保留其他实例新增文件的倒排表
+        self._write("a.py", "delta\n")
+        self.assertEqual(second.refresh(), {"added": 0, "updated": 1, "removed": 0})
+        first.compact()
+        self.assertEqual(first._meta("dead"), 0)
+        for index in (first, second):
+            self.assertEqual(self._candidates(index, "alpha"), ["b.py", "c.py"])
+            self.assertEqual(self._candidates(index, "delta"), ["a.py"])
+            self.assertEqual(self._candidates(index, "gamma"), ["c.py"])
+
+    def test_gitignore_and_large_files(self):
+        self._write(".gitignore", "build/\n")
+        self._write("build/out.py", "needle\n")
+        self._write("src/main.py", "needle\n")
+        self._write("big.log", "x\n")
+        with mock.patch.object(code_index, "MAX_INDEXED_FILE_BYTES", 1):
+            index = CodeIndex(self.root)
+            self.addCleanup(index.close)
+            index.refresh()
+        # 超大文件不建索引，但总是作为候选
+        self.assertEqual(self._candidates(index, "needle"), [".gitignore", "big.log", "src/main.py"])
+
+    def test_nested_gitignore_changes_are_picked_up(self):
+        self._write("pkg/gen.py", "needle\n")
+        self._write("pkg/main.py", "needle\n")
+        index = CodeIndex(self.root)
+        self.addCleanup(index.close)
+        index.refresh()
+        self.assertEqual(self._candidates(index, "needle"), ["pkg/gen.py", "pkg/main.py"])
+
+        self._write("pkg/.gitignore", "gen.py\n")
+        self.assertEqual(index.refresh()["removed"], 1)
+        self.assertEqual(self._candidates(index, "needle"), ["pkg/main.py"])
+
+    def test_search_code_matches_search_files(self):
+        self._write(".gitignore", "*.log\n")
+        self._write("pkg/mod.py", "import os\n\ndef Handle(x):\n    return x\n")
+        self._write("pkg/util.py", "def helper():\n    handle = 1\n")
+        # 子目录名排在文件名之前，但遍历时同一目录下先输出文件
+        self._write("pkg/a_sub/x.py", "def handle_sub():\n    pass\n")
+        self._write("README.md", "Call handle() to start\n")
+        self._write("debug.log", "handle\n")
+
+        for pattern, kwargs in (
+            ("handle", {}),
+            ("handle", {"ignore_case": True, "context": 1}),
+            (r"def \w+\(", {}),
+            ("handle()", {"literal": True}),
+            ("handle", {"glob": "*.py", "ignore_case": True}),
+        ):
+            with self.subTest(pattern=pattern, **kwargs):
+                self.assertEqual(
+                    search_code(pattern, path=self.root, **kwargs),
+                    search_files(pattern, path=self.root, **kwargs),
+                )
+
+    def test_search_code_sees_edits(self):
+        self._write("a.py", "old_name = 1\n")
+        self.assertIn("a.py:1:old_name", search_code("old_name", path=self.root))
+        self._write("a.py", "new_name = 1\n")
+        self.assertIn("未找到匹配", search_code("old_name", path=self.root))
+        self.assertIn("a.py:1:new_name", search_code("new_name", path=self.root))
+
+    def test_registered_as_read_only_tool(self):
+        self.assertTrue(TOOL_REGISTRY["search_code"].read_only)
+
+
+if __name__ == "__main__":
+    unittest.main()
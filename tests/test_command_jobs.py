@@ -0,0 +1,77 @@
+"""后台命令任务单元测试"""
+import time
+import unittest
+
+from pyagent.tools import cmdline
+from pyagent.tools.command_jobs import (
+    JobTable,
+    activate_job_table,
+    command_job,
+    deactivate_job_table,
+)
+
+
+class CommandJobTests(unittest.TestCase):
+    def setUp(self):
+        self.table = JobTable(max_running=2)
+        token = activate_job_table(self.table)
+        self.addCleanup(self.table.close)
+        self.addCleanup(deactivate_job_table, token)
+
+    def test_start_returns_before_command_finishes(self):
+        start = time.monotonic()
+        result = command_job("start", command="sleep 0.5; echo done")
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertIn("job-1", result)
+        self.assertIn("运行中", command_job("poll", job_id="job-1"))
+
+        result = command_job("poll", job_id="job-1", wait=10)
+        self.assertIn("执行完毕", result)
+        self.assertIn("done", command_job("tail", job_id="job-1"))
+
+    def test_tail_limits_lines_and_reports_exit_code(self):
+        command_job("start", command="for i in 1 2 3 4 5; do echo line$i; done; exit 3")
+        self.table.get("job-1").wait(10)
+
+        result = command_job("tail", job_id="job-1", lines=2)
+        self.assertIn("退出码 3", result)
+        self.assertIn("line5", result)
+        self.assertNotIn("line1", result)
+
+    def test_kill_terminates_process_tree(self):
+        command_job("start", command="sleep 30 & sleep 30; wait")
+        job = self.table.get("job-1")
+        pid = job._process.pid
+        with cmdline._tracked_pids_lock:
+            self.assertIn(pid, cmdline._tracked_pids)
+
+        result = command_job("kill", job_id="job-1")
+
+        self.assertIn("已终止", result)
+        self.assertFalse(job.running)
+        with cmdline._tracked_pids_lock:
+            self.assertNotIn(pid, cmdline._tracked_pids)
+
+    def test_timeout_and_running_limit(self):
+        command_job("start", command="sleep 30", timeout=1)
+        command_job("start", command="sleep 30")
+        self.assertIn("上限", command_job("start", command="true"))
+
+        self.assertIn("超时终止", command_job("poll", job_id="job-1", wait=10))
+        # 超时的任务结束后腾出名额
+        self.assertIn("job-3 已启动", command_job("start", command="true"))
+
+    def test_close_kills_running_jobs(self):
+        command_job("start", command="sleep 30")
+        job = self.table.get("job-1")
+        self.table.close()
+        self.assertFalse(job.running)
+        self.assertTrue(job.killed)
+
+    def test_unknown_job(self):
+        self.assertIn("未找到", command_job("poll", job_id="job-99"))
+        self.assertIn("当前没有后台任务", command_job("poll"))
+
+
+if __name__ == "__main__":
+    unittest.main()
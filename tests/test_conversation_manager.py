@@ -0,0 +1,177 @@
+"""ConversationManager 单元测试"""
+import unittest
+
+from pyagent.conversation_manager import ConversationManager, ELIDED_IMAGE_TEXT, MessageRole
+from pyagent.token_counter import TokenCounter
+
+
+def _assert_tool_results_follow_calls(testcase, messages):
+    """每条 tool 消息都必须回应前面某条 assistant 消息里的 tool_call。"""
+    open_calls = set()
+    for msg in messages:
+        if msg["role"] == "assistant":
+            open_calls = {c["id"] for c in msg.get("tool_calls") or []}
+        elif msg["role"] == "tool":
+            testcase.assertIn(msg["tool_call_id"], open_calls)
+
+
+class ConversationManagerTests(unittest.TestCase):
+    def setUp(self):
+        self.manager = ConversationManager("你是助手")
+
+    def test_sdk_dicts_are_built_once(self):
+        self.manager.add_user_message("hi")
+        first = self.manager.get_messages_for_sdk()
+        self.manager.add_assistant_message("hello", "想一想")
+        second = self.manager.get_messages_for_sdk()
+
+        self.assertIsNot(first, second)
+        self.assertIs(first[0], second[0])
+        self.assertIs(first[1], second[1])
+        self.assertEqual(second[2]["reasoning_content"], "想一想")
+        self.assertEqual(len(self.manager), 3)
+
+    def test_sdk_dicts_match_messages(self):
+        self.manager.add_user_message("look", [{"type": "text", "text": "look"}])
+        self.manager.add_assistant_message("", None, [{"id": "c1", "type": "function"}])
+        self.manager.add_tool_result("c1", "done")
+
+        self.assertEqual(
+            self.manager.get_messages_for_sdk(),
+            [msg.to_sdk_dict() for msg in self.manager.messages],
+        )
+
+    def test_clear_keeps_system_message(self):
+        self.manager.add_user_message("hi")
+        self.manager.clear()
+        self.manager.add_user_message("again")
+
+        messages = self.manager.get_messages_for_sdk()
+        self.assertEqual([m["role"] for m in messages], ["system", "user"])
+        self.assertEqual(messages[1]["content"], "again")
+
+    def test_seq_keeps_growing_after_clear(self):
+        self.manager.add_user_message("hi")
+        self.manager.clear()
+        self.manager.add_user_message("again")
+        self.assertEqual(self.manager.get_last_message_seq(), 2)
+
+    def test_compress_context_keeps_system_and_recent(self):
+        for i in range(5):
+            self.manager.add_user_message(f"q{i}")
+            self.manager.add_assistant_message(f"a{i}")
+
+        compressed = self.manager.compress_context(1)
+        self.assertEqual([m.get("content") for m in compressed], ["你是助手", "q4", "a4"])
+
+
+    def test_compress_context_does_not_split_tool_calls(self):
+        self.manager.add_user_message("q0")
+        self.manager.add_user_message("q1")
+        self.manager.add_assistant_message("", None, [{"id": "c1", "type": "function"}])
+        self.manager.add_tool_result("c1", "r1")
+        self.manager.add_assistant_message("a1")
+
+        compressed = self.manager.compress_context(1)
+        self.assertEqual([m["role"] for m in compressed], ["system", "user", "assistant", "tool", "assistant"])
+        _assert_tool_results_follow_calls(self, compressed)
+
+
+class ContextCompactionTests(unittest.TestCase):
+    def setUp(self):
+        self.manager = ConversationManager("system")
+        self.counter = TokenCounter()
+        self.counter.set_initial_tokens("system", [])
+
+    def _add_tool_round(self, index, output_words):
+        self.manager.add_user_message(f"question {index}")
+        call_id = f"call_{index}"
+        self.manager.add_assistant_message(
+            "", None,
+            [{"id": call_id, "type": "function", "function": {"name": "read_file", "arguments": "{}"}}],
+        )
+        self.manager.add_tool_result(call_id, " ".join(["word"] * output_words))
+        self.manager.add_assistant_message(f"answer {index}")
+
+    def _tokens(self):
+        return self.counter.calculate_conversation_tokens(self.manager.get_messages_for_sdk())
+
+    def test_under_budget_is_untouched(self):
+        self._add_tool_round(0, 10)
+        before = self.manager.get_messages_for_sdk()
+        self.assertIsNone(self.manager.compact_context(self.counter, 10_000))
+        self.assertEqual(self.manager.get_messages_for_sdk(), before)
+
+    def test_old_tool_outputs_are_elided_first(self):
+        for i in range(4):
+            self._add_tool_round(i, 2000)
+        budget = self._tokens() - 1000
+
+        result = self.manager.compact_context(self.counter, budget)
+
+        self.assertEqual(result["dropped_messages"], 0)
+        self.assertGreater(result["elided_messages"], 0)
+        self.assertLessEqual(result["context_tokens"], budget)
+        tool_contents = [m.content for m in self.manager.messages if m.role == MessageRole.TOOL]
+        self.assertIn("省略", tool_contents[0])
+        self.assertNotIn("省略", tool_contents[-1])
+
+    def test_old_images_are_elided(self):
+        image = {"type": "image_url", "image_url": {"url": "data:image/png;base64," + "A" * 200000}}
+        self.manager.add_user_message("see", [{"type": "text", "text": "see"}, image])
+        self.manager.add_assistant_message("ok")
+        for i in range(2):
+            self._add_tool_round(i, 10)
+
+        result = self.manager.compact_context(self.counter, self._tokens() - 1)
+
+        self.assertIsNotNone(result)
+        parts = self.manager.messages[1].content_parts
+        self.assertEqual(parts[1], {"type": "text", "text": ELIDED_IMAGE_TEXT})
+
+    def test_drops_old_blocks_and_keeps_pairs(self):
+        for i in range(6):
+            self._add_tool_round(i, 300)
+        budget = 400
+
+        result = self.manager.compact_context(self.counter, budget)
+
+        self.assertGreater(result["dropped_messages"], 0)
+        messages = self.manager.get_messages_for_sdk()
+        self.assertEqual(messages[0]["role"], "system")
+        self.assertIn("上下文已自动压缩", messages[1]["content"])
+        self.assertIn("question 5", [m.get("content") for m in messages])
+        self.assertNotIn("question 0", [m.get("content") for m in messages])
+        _assert_tool_results_follow_calls(self, messages)
+        self.assertEqual(self.manager.messages[-1].content, "answer 5")
+
+    def test_long_single_round_keeps_current_question(self):
+        self.manager.add_user_message("the task")
+        for i in range(6):
+            call_id = f"call_{i}"
+            self.manager.add_assistant_message("", None, [{"id": call_id, "type": "function"}])
+            self.manager.add_tool_result(call_id, " ".join(["word"] * 300))
+
+        self.manager.compact_context(self.counter, 400)
+
+        messages = self.manager.get_messages_for_sdk()
+        self.assertEqual(messages[2]["content"], "the task")
+        self.assertEqual(messages[-1]["tool_call_id"], "call_5")
+        _assert_tool_results_follow_calls(self, messages)
+
+    def test_repeated_compaction_replaces_placeholder(self):
+        for i in range(4):
+            self._add_tool_round(i, 300)
+        self.manager.compact_context(self.counter, 400)
+        for i in range(4, 8):
+            self._add_tool_round(i, 300)
+        self.manager.compact_context(self.counter, 400)
+
+        placeholders = [m for m in self.manager.messages if m.seq is None]
+        self.assertEqual(len(placeholders), 1)
+        self.assertIs(self.manager.messages[1], placeholders[0])
+        _assert_tool_results_follow_calls(self, self.manager.get_messages_for_sdk())
+
+
+if __name__ == "__main__":
+    unittest.main()
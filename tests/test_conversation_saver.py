@@ -0,0 +1,211 @@
+"""ConversationDatabase 单元测试"""
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from pyagent.conversation_saver import ConversationDatabase, ConversationSaveError
+
+
+def _message(role, content, timestamp):
+    return {"role": role, "content": content, "timestamp": timestamp}
+
+
+class ConversationDatabaseTests(unittest.TestCase):
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory(prefix="conversation_db_test_")
+        self.db_path = os.path.join(self._temp_dir.name, "conversations.db")
+        self.db = ConversationDatabase(self.db_path)
+
+    def tearDown(self):
+        self.db.close()
+        self._temp_dir.cleanup()
+
+    def test_uses_wal_journal_mode(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        finally:
+            conn.close()
+        self.assertEqual(mode.lower(), "wal")
+
+    def test_save_and_read_back_after_flush(self):
+        self.db.save_conversation([_message("system", "sys", "2025-01-01T00:00:00")], "s1")
+        self.db.save_conversation([_message("user", "hi", "2025-01-01T00:00:01")], "s1")
+        self.db.flush()
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            count = conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+        finally:
+            conn.close()
+        self.assertEqual(count, 2)
+
+        rows = self.db.get_conversations("s1")
+        self.assertEqual([r["content"] for r in rows], ["sys", "hi"])
+
+    def test_list_content_round_trips(self):
+        parts = [{"type": "text", "text": "看图"}, {"type": "image_url", "image_url": {"url": "data:image/png;base64,AA"}}]
+        self.db.save_conversation([_message("user", parts, "2025-01-01T00:00:00")], "s1")
+        self.assertEqual(self.db.get_conversations("s1")[0]["content"], parts)
+
+    def test_missing_timestamp_raises_immediately(self):
+        with self.assertRaises(ValueError):
+            self.db.save_conversation([{"role": "user", "content": "hi"}], "s1")
+
+    def test_concurrent_writers(self):
+        def worker(index):
+            for i in range(20):
+                self.db.save_conversation(
+                    [_message("user", f"{index}-{i}", f"2025-01-01T00:{index:02d}:{i:02d}")],
+                    f"session-{index}",
+                )
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        sessions = self.db.get_all_sessions()
+        self.assertEqual(len(sessions), 4)
+        for n in range(4):
+            self.assertEqual(len(self.db.get_conversations(f"session-{n}")), 20)
+
+    def test_close_flushes_pending_messages(self):
+        self.db.save_conversation([_message("user", "bye", "2025-01-01T00:00:00")], "s1")
+        self.db.close()
+
+        reopened = ConversationDatabase(self.db_path)
+        try:
+            self.assertEqual(len(reopened.get_conversations("s1")), 1)
+        finally:
+            reopened.close()
+
+    def test_failed_message_does_not_drop_rest_of_batch(self):
+        ts = "2025-01-01T00:00:00"
+        self.db.append_message(_message("user", "kept", ts), "s1", 0)
+        # 缺少 role 的消息写入时失败
+        self.db.append_message({"content": "broken", "timestamp": ts}, "s2", 0)
+        self.db.append_message(_message("user", "also kept", ts), "s3", 0)
+
+        with self.assertLogs("pyagent.conversation_saver", level="ERROR"):
+            self.db._wait_for_writer()
+        self.assertEqual([r["content"] for r in self.db.get_conversations("s1")], ["kept"])
+        self.assertEqual([r["content"] for r in self.db.get_conversations("s3")], ["also kept"])
+
+        # 失败只报告给对应会话，且只报告一次
+        self.db.flush("s1")
+        with self.assertRaises(ConversationSaveError) as ctx:
+            self.db.flush("s2")
+        self.assertEqual([session_id for session_id, _ in ctx.exception.failures], ["s2"])
+        self.db.flush()
+
+    def test_close_reports_failed_messages(self):
+        self.db.append_message({"content": "broken"}, "s1", 0)
+        with self.assertLogs("pyagent.conversation_saver", level="ERROR"):
+            with self.assertRaises(ConversationSaveError):
+                self.db.close()
+
+    def test_append_message_keeps_same_timestamp_messages(self):
+        ts = "2025-01-01T00:00:00"
+        self.db.append_message(_message("assistant", "call", ts), "s1", 0)
+        self.db.append_message(_message("tool", "result", ts), "s1", 1)
+
+        rows = self.db.get_conversations("s1")
+        self.assertEqual([r["content"] for r in rows], ["call", "result"])
+
+    def test_duplicate_seq_is_reported(self):
+        # 两个 Agent 共用同一个会话 ID 时不能静默丢弃其中一方的消息
+        self.db.append_message(_message("user", "first", "2025-01-01T00:00:00"), "s1", 0)
+        self.db.append_message(_message("user", "other agent", "2025-01-01T00:00:01"), "s1", 0)
+
+        with self.assertLogs("pyagent.conversation_saver", level="ERROR"):
+            with self.assertRaises(ConversationSaveError) as ctx:
+                self.db.flush("s1")
+        self.assertIsInstance(ctx.exception.failures[0][1], sqlite3.IntegrityError)
+        rows = self.db.get_conversations("s1")
+        self.assertEqual([r["content"] for r in rows], ["first"])
+
+    def test_rows_ordered_by_seq(self):
+        self.db.append_message(_message("user", "b", "2025-01-01T00:00:00"), "s1", 1)
+        self.db.append_message(_message("user", "a", "2025-01-01T00:00:05"), "s1", 0)
+        rows = self.db.get_conversations("s1")
+        self.assertEqual([r["content"] for r in rows], ["a", "b"])
+
+    def test_legacy_save_continues_sequence(self):
+        self.db.append_message(_message("user", "a", "2025-01-01T00:00:00"), "s1", 0)
+        self.db.save_conversation([_message("user", "b", "2025-01-01T00:00:01")], "s1")
+        self.db.flush()
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            seqs = [r[0] for r in conn.execute("SELECT seq FROM conversations ORDER BY id")]
+        finally:
+            conn.close()
+        self.assertEqual(seqs, [0, 1])
+
+    def test_delete_session(self):
+        self.db.save_conversation([_message("user", "hi", "2025-01-01T00:00:00")], "s1")
+        self.db.delete_session("s1")
+        self.assertEqual(self.db.get_conversations("s1"), [])
+
+
+class ConversationDatabaseMigrationTests(unittest.TestCase):
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory(prefix="conversation_db_migration_")
+        self.db_path = os.path.join(self._temp_dir.name, "conversations.db")
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def _create_legacy_database(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            CREATE TABLE conversations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT,
+                role TEXT NOT NULL,
+                thinking TEXT,
+                content TEXT,
+                tool_calls TEXT,
+                tool_call_id TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        rows = [
+            ("s1", "user", "second", "2025-01-01T00:00:02"),
+            ("s1", "system", "first", "2025-01-01T00:00:01"),
+            ("s2", "system", "other", "2025-01-02T00:00:00"),
+        ]
+        conn.executemany(
+            "INSERT INTO conversations (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+        conn.commit()
+        conn.close()
+
+    def test_legacy_database_is_backfilled(self):
+        self._create_legacy_database()
+
+        db = ConversationDatabase(self.db_path)
+        try:
+            self.assertEqual([r["content"] for r in db.get_conversations("s1")], ["first", "second"])
+            db.append_message(_message("assistant", "third", "2025-01-01T00:00:03"), "s1", 2)
+            self.assertEqual(len(db.get_conversations("s1")), 3)
+        finally:
+            db.close()
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            seqs = dict(conn.execute("SELECT content, seq FROM conversations"))
+        finally:
+            conn.close()
+        self.assertEqual(version, 1)
+        self.assertEqual(seqs, {"first": 0, "second": 1, "other": 0, "third": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
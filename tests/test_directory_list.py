@@ -0,0 +1,154 @@
+"""list_directory 工具单元测试"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from pyagent.tools import directory_list
+from pyagent.tools.directory_list import list_directory
+
+
+class ListDirectoryTests(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def _touch(self, relative_path, content="x"):
+        path = os.path.join(self.root, *relative_path.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def test_tree_output(self):
+        self._touch("b.txt")
+        self._touch("src/pkg/mod.py")
+        self._touch("src/main.c")
+        self._touch("A.md")
+
+        lines = list_directory(self.root).splitlines()
+
+        self.assertEqual(lines[1:7], [
+            "    ├── A.md",
+            "    ├── b.txt",
+            "    └── src",
+            "        ├── main.c",
+            "        └── pkg",
+            "            └── mod.py",
+        ])
+        self.assertEqual(lines[-1], "文件类型：['c', 'md', 'py', 'txt']")
+
+    def test_ignored_directories_are_not_scanned(self):
+        self._touch(".gitignore", "node_modules/\n*.log\n")
+        self._touch("node_modules/pkg/index.js")
+        self._touch("debug.log")
+        self._touch(".git/HEAD")
+        self._touch("app.js")
+
+        scanned = []
+        real_scandir = os.scandir
+
+        def tracking_scandir(path):
+            scanned.append(os.path.relpath(path, self.root))
+            return real_scandir(path)
+
+        with mock.patch.object(directory_list.os, "scandir", tracking_scandir):
+            result = list_directory(self.root)
+
+        self.assertEqual(scanned, ["."])
+        self.assertIn("app.js", result)
+        self.assertNotIn("node_modules", result)
+        self.assertNotIn("debug.log", result)
+        self.assertIn("已过滤：2个文件夹、1个文件", result)
+
+    def test_whitelist_restores_filtered_entries(self):
+        self._touch(".gitignore", "*.log\n!keep.log\n")
+        self._touch("drop.log")
+        self._touch("keep.log")
+
+        result = list_directory(self.root)
+
+        self.assertIn("keep.log", result)
+        self.assertNotIn("drop.log", result)
+        self.assertIn("已过滤：1个文件", result)
+
+    def test_depth_limit(self):
+        self._touch("a/b/c/deep.txt")
+
+        result = list_directory(self.root, depth=2)
+
+        self.assertIn("└── b", result)
+        self.assertNotIn("c", result.replace(self.root, ""))
+
+    def test_depth_reduced_to_fit_budget(self):
+        for i in range(300):
+            self._touch(f"pkg/module_{i:03d}.py")
+        self._touch("top.txt")
+
+        result = list_directory(self.root)
+
+        self.assertIn("└── pkg", result)
+        self.assertNotIn("module_", result)
+        self.assertIn("内容过多，只展开前1层", result)
+        self.assertNotIn("cursor", result)
+
+    def test_first_level_over_budget_is_paged(self):
+        names = [f"entry_{i:03d}.txt" for i in range(300)]
+        for name in names:
+            self._touch(name)
+
+        seen = []
+        cursor = 0
+        for _ in range(10):
+            result = list_directory(self.root, depth=1, cursor=cursor)
+            body, _, info = result.partition("\n\n")
+            seen.extend(line[len("    ├── "):] for line in body.splitlines()[1:])
+            if "cursor=" not in info:
+                break
+            cursor = int(info.split("cursor=")[1].split()[0])
+            self.assertLessEqual(len(body), 2000 + len(body.splitlines()) * len("    ├── \n") + len(self.root))
+
+        self.assertEqual(seen, names)
+        self.assertIn("共300项", result)
+
+    def test_max_entries_pages_keep_ancestors(self):
+        for name in ("a.txt", "b.txt", "c.txt"):
+            self._touch(f"dir/{name}")
+        self._touch("z.txt")
+
+        result = list_directory(self.root, max_entries=2, cursor=2)
+
+        self.assertEqual(result.splitlines()[1:4], [
+            "    └── dir",
+            "        ├── a.txt",
+            "        ├── b.txt",
+        ])
+        self.assertIn("显示第3-4项，共5项", result)
+        self.assertIn("max_entries=2, cursor=4", result)
+
+    def test_deep_tree_does_not_recurse(self):
+        depth = sys.getrecursionlimit() + 50
+        path = self.root
+        for _ in range(depth):
+            path = os.path.join(path, "d")
+            os.mkdir(path)
+
+        result = list_directory(self.root)
+
+        self.assertEqual(len(result.splitlines()), depth + 1)
+        self.assertTrue(result.splitlines()[-1].endswith("└── d"))
+
+    @unittest.skipIf(os.name == "nt", "符号链接需要额外权限")
+    def test_directory_symlink_loop_is_not_followed(self):
+        self._touch("real/file.txt")
+        os.symlink(self.root, os.path.join(self.root, "real", "loop"))
+
+        result = list_directory(self.root)
+
+        self.assertIn("file.txt", result)
+        self.assertEqual(result.count("loop"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
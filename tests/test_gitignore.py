@@ -0,0 +1,182 @@
+"""共用 .gitignore 匹配器单元测试"""
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest
+
+from pyagent.tools.directory_list import list_directory
+from pyagent.tools.gitignore import GitignoreMatcher, RuleSet, compile_glob_filter
+from pyagent.tools.search_files import search_files
+
+
+class RuleSetTests(unittest.TestCase):
+    def test_last_matching_rule_wins(self):
+        rules = RuleSet(["*.log", "!keep.log", "keep.log"])
+        self.assertTrue(rules.decide("a.log"))
+        self.assertTrue(rules.decide("keep.log"))
+
+        rules = RuleSet(["*.log", "!keep.log"])
+        self.assertFalse(rules.decide("keep.log"))
+        self.assertIsNone(rules.decide("a.txt"))
+
+    def test_unanchored_patterns_match_at_any_depth(self):
+        rules = RuleSet(["build"])
+        self.assertTrue(rules.decide("build"))
+        self.assertTrue(rules.decide("src/build/"))
+        # 规则只判断条目本身，被忽略目录下的内容由遍历方剪枝
+        self.assertIsNone(rules.decide("src/build/out.o"))
+        self.assertIsNone(rules.decide("rebuild"))
+
+    def test_anchored_patterns(self):
+        rules = RuleSet(["/dist", "docs/_build"])
+        self.assertTrue(rules.decide("dist/"))
+        self.assertIsNone(rules.decide("pkg/dist/"))
+        self.assertTrue(rules.decide("docs/_build/"))
+        self.assertIsNone(rules.decide("pkg/docs/_build/"))
+
+    def test_directory_only_patterns(self):
+        rules = RuleSet(["cache/"])
+        self.assertTrue(rules.decide("cache/"))
+        self.assertTrue(rules.decide("a/cache/"))
+        self.assertIsNone(rules.decide("cache"))
+
+    def test_globs_and_escapes(self):
+        rules = RuleSet(["file[0-9].txt", "**/tmp/**", "\\#notes", "# comment", ""])
+        self.assertTrue(rules.decide("file3.txt"))
+        self.assertIsNone(rules.decide("filex.txt"))
+        self.assertTrue(rules.decide("a/b/tmp/c.txt"))
+        self.assertTrue(rules.decide("#notes"))
+        self.assertIsNone(rules.decide("# comment"))
+
+    def test_empty_rule_set(self):
+        rules = RuleSet(["# only comments", ""])
+        self.assertFalse(rules)
+        self.assertIsNone(rules.decide("anything"))
+
+
+
+class GlobFilterTests(unittest.TestCase):
+    def _selected(self, pattern, paths):
+        regex = compile_glob_filter(pattern)
+        return [path for path in paths if regex.match(path)]
+
+    def test_patterns_without_slash_match_names_at_any_depth(self):
+        paths = ["a.py", "pkg/b.py", "pkg/b.pyc", "x.py.txt", "pkg.py/c.txt"]
+        self.assertEqual(self._selected("*.py", paths), ["a.py", "pkg/b.py", "pkg.py/c.txt"])
+
+    def test_patterns_with_slash_are_anchored(self):
+        paths = ["src/a.ts", "src/x/y/b.ts", "lib/src/c.ts", "src/a.tsx", "docs/src/d.ts"]
+        self.assertEqual(self._selected("src/**/*.ts", paths), ["src/a.ts", "src/x/y/b.ts"])
+        self.assertEqual(self._selected("/src/*.ts", paths), ["src/a.ts"])
+
+    def test_directory_patterns_select_contents(self):
+        paths = ["build", "build/out.o", "pkg/build/x.o", "rebuild/y.o"]
+        self.assertEqual(self._selected("build/", paths), ["build/out.o", "pkg/build/x.o"])
+        self.assertEqual(self._selected("build", paths), ["build", "build/out.o", "pkg/build/x.o"])
+        self.assertEqual(self._selected("", paths), [])
+
+
+class GitignoreMatcherTests(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def _write(self, relative_path, content="x"):
+        path = os.path.join(self.root, *relative_path.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return path
+
+    def test_nested_gitignore_overrides_parent(self):
+        self._write(".gitignore", "*.log\n")
+        self._write("pkg/.gitignore", "!keep.log\n/local.txt\n")
+        matcher = GitignoreMatcher(self.root)
+
+        self.assertTrue(matcher.ignored("a.log"))
+        self.assertTrue(matcher.ignored("pkg/drop.log"))
+        self.assertFalse(matcher.ignored("pkg/keep.log"))
+        self.assertTrue(matcher.ignored("keep.log"))
+        # 锚定规则相对所在目录的 .gitignore 解析
+        self.assertTrue(matcher.ignored("pkg/local.txt"))
+        self.assertFalse(matcher.ignored("local.txt"))
+        self.assertFalse(matcher.ignored("pkg/sub/local.txt"))
+
+    def test_keep_and_ignore_precedence(self):
+        self._write(".gitignore", "!.git\nsecret.txt\n")
+        matcher = GitignoreMatcher(self.root, ignore=(".git", "*.tmp"), keep=("secret.txt",))
+
+        self.assertFalse(matcher.ignored("secret.txt"))
+        self.assertFalse(matcher.ignored(".git", is_dir=True))
+        self.assertTrue(matcher.ignored("a.tmp"))
+
+        matcher = GitignoreMatcher(self.root, read_gitignore_files=False)
+        self.assertTrue(matcher.ignored(".git", is_dir=True))
+        self.assertFalse(matcher.ignored("secret.txt"))
+
+    def test_stale_detects_gitignore_changes(self):
+        self._write(".gitignore", "*.log\n")
+        matcher = GitignoreMatcher(self.root)
+        matcher.ignored("pkg/a.txt")
+        self.assertFalse(matcher.stale())
+
+        path = self._write("pkg/.gitignore", "a.txt\n")
+        self.assertTrue(matcher.stale())
+        self.assertTrue(GitignoreMatcher(self.root).ignored("pkg/a.txt"))
+
+        matcher = GitignoreMatcher(self.root)
+        matcher.ignored("pkg/a.txt")
+        stamp = time.time_ns() + 10_000_000
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("b.txt\n")
+        os.utime(path, ns=(stamp, stamp))
+        self.assertTrue(matcher.stale())
+
+    def test_negated_ancestor_does_not_reinclude_files(self):
+        # 常见的白名单写法：只保留 .py 文件
+        self._write(".gitignore", "*\n!*/\n!*.py\n")
+        paths = {"src/a.txt": True, "src/b.py": False, "src/": False, "top.txt": True}
+        matcher = GitignoreMatcher(self.root)
+        for path, expected in paths.items():
+            with self.subTest(path=path):
+                self.assertEqual(matcher.ignored(path.rstrip("/"), is_dir=path.endswith("/")), expected)
+
+        if shutil.which("git") is None:
+            return
+        self._write("src/a.txt")
+        self._write("src/b.py")
+        self._write("top.txt")
+        subprocess.run(["git", "init", "-q", self.root], check=True)
+        result = subprocess.run(
+            ["git", "-C", self.root, "check-ignore", *paths],
+            capture_output=True, text=True,
+        )
+        self.assertEqual(
+            sorted(result.stdout.split()),
+            sorted(path for path, expected in paths.items() if expected),
+        )
+
+    def test_tools_honour_nested_gitignore(self):
+        self._write(".gitignore", "*.gen\n")
+        self._write("app/.gitignore", "out/\n!main.gen\n")
+        self._write("app/out/x.py", "needle\n")
+        self._write("app/main.gen", "needle\n")
+        self._write("app/other.gen", "needle\n")
+        self._write("app/src/out", "needle\n")
+
+        listing = list_directory(self.root)
+        self.assertIn("main.gen", listing)
+        self.assertNotIn("other.gen", listing)
+        self.assertNotIn("x.py", listing)
+
+        result = search_files("needle", path=self.root)
+        self.assertEqual(
+            sorted(line.split(":")[0] for line in result.splitlines() if ":" in line),
+            ["app/main.gen", "app/src/out"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
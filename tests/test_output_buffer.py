@@ -0,0 +1,65 @@
+"""CoalescingOutputBuffer 单元测试"""
+import threading
+import time
+import unittest
+
+from pyagent.frontends.output_buffer import CoalescingOutputBuffer
+
+
+class CoalescingOutputBufferTests(unittest.TestCase):
+    def setUp(self):
+        self.writes = []
+        self.written = threading.Event()
+
+        def sink(text):
+            self.writes.append(text)
+            self.written.set()
+
+        self.sink = sink
+
+    def test_deltas_coalesced_until_flush(self):
+        buffer = CoalescingOutputBuffer(self.sink, interval=10)
+        for char in "hello":
+            buffer.write("content", char)
+        self.assertEqual(self.writes, [])
+
+        buffer.flush()
+        self.assertEqual(self.writes, ["hello"])
+        buffer.close()
+
+    def test_newline_flushes_immediately(self):
+        buffer = CoalescingOutputBuffer(self.sink, interval=10)
+        buffer.write("content", "line")
+        buffer.write("content", " end\n")
+        self.assertEqual(self.writes, ["line end\n"])
+        buffer.close()
+
+    def test_type_change_flushes_previous_type(self):
+        buffer = CoalescingOutputBuffer(self.sink, interval=10)
+        buffer.write("thinking", "a")
+        buffer.write("thinking", "b")
+        buffer.write("content", "c")
+        self.assertEqual(self.writes, ["ab"])
+        self.assertEqual(buffer.pending_type, "content")
+        buffer.close()
+        self.assertEqual(self.writes, ["ab", "c"])
+
+    def test_timer_flushes_pending_output(self):
+        buffer = CoalescingOutputBuffer(self.sink, interval=0.02)
+        start = time.monotonic()
+        buffer.write("content", "x")
+        buffer.write("content", "y")
+        self.assertTrue(self.written.wait(2))
+        self.assertEqual(self.writes, ["xy"])
+        self.assertLess(time.monotonic() - start, 2)
+        buffer.close()
+
+    def test_zero_interval_disables_buffering(self):
+        buffer = CoalescingOutputBuffer(self.sink, interval=0)
+        buffer.write("content", "a")
+        buffer.write("content", "b")
+        self.assertEqual(self.writes, ["a", "b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
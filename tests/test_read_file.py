@@ -19,10 +19,13 @@ import os
 import sys
 import tempfile
 import unittest
+from unittest import mock
 
 # 确保 pyagent 包可导入
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from pyagent.tools import line_index
+from pyagent.tools.line_index import clear_line_index_cache
 from pyagent.tools.read_file import (
     _normalize_unicode_spaces,
     _resolve_path,
@@ -31,6 +34,7 @@ from pyagent.tools.read_file import (
     read_file,
     DEFAULT_MAX_LINES,
     DEFAULT_MAX_BYTES,
+    BINARY_SAMPLE_BYTES,
     READ_FILE_TOOLS,
     READ_FILE_FUNCTIONS,
 )
@@ -585,6 +589,124 @@ class TestReadFileEdgeCases(TempDirMixin, unittest.TestCase):
         self.assertIn("line3", result)
 
 
+# ============================================================================
+# 流式读取测试
+# ============================================================================
+
+class TestReadFileStreaming(TempDirMixin, unittest.TestCase):
+
+    def _write_bytes(self, name, data):
+        path = self.temp_path(name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_nul_byte_in_head_detected_as_binary(self):
+        path = self._write_bytes("nul.txt", b"header\x00rest\n")
+        self.assertIn("Binary file detected", read_file(path=path))
+
+    def test_multibyte_char_cut_by_sample_is_not_binary(self):
+        # 让一个多字节字符正好跨越二进制检测样本的末尾
+        data = b"a" * (BINARY_SAMPLE_BYTES - 1) + "中\n尾行\n".encode("utf-8")
+        path = self._write_bytes("boundary.txt", data)
+        result = read_file(path=path, offset=2)
+        self.assertEqual(result, "尾行")
+
+    def test_invalid_utf8_after_sample_is_replaced(self):
+        data = b"ok\n" * (BINARY_SAMPLE_BYTES // 3 + 10) + b"bad \xff byte\n"
+        path = self._write_bytes("late_invalid.txt", data)
+        result = read_file(path=path, offset=BINARY_SAMPLE_BYTES // 3 + 11)
+        self.assertEqual(result, "bad \ufffd byte")
+
+    def test_long_line_longer_than_read_chunk(self):
+        long_line = "x" * (DEFAULT_MAX_BYTES - 10)
+        path = self._write_bytes("long.txt", f"{long_line}\nnext\n".encode("utf-8"))
+        result = read_file(path=path)
+        self.assertEqual(result, f"{long_line}\nnext")
+
+    def test_carriage_return_line_endings(self):
+        path = self._write_bytes("cr.txt", b"one\rtwo\rthree")
+        self.assertEqual(read_file(path=path, offset=2, limit=1), "two\n\n[1 more lines in file. Use offset=3 to continue.]")
+
+    def test_total_lines_counted_past_truncation(self):
+        lines = [f"line_{i}" for i in range(5000)]
+        path = self._write_bytes("many.txt", ("\n".join(lines)).encode("utf-8"))
+        result = read_file(path=path, offset=10)
+        self.assertIn("[Showing lines 10-2009 of 5000. Use offset=2010 to continue.]", result)
+
+    def test_empty_file_offset_beyond_end(self):
+        path = self._write_bytes("empty.txt", b"")
+        self.assertIn("(1 lines total)", read_file(path=path, offset=2))
+
+
+class TestReadFileLineIndex(TempDirMixin, unittest.TestCase):
+    """大文件通过行索引定位；结果应与逐行扫描完全一致。"""
+
+    def setUp(self):
+        super().setUp()
+        clear_line_index_cache()
+        self.addCleanup(clear_line_index_cache)
+
+    def _write_bytes(self, name, data):
+        path = self.temp_path(name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def _read_both(self, path, **kwargs):
+        """分别以逐行扫描和行索引读取（用很小的阈值和块大小强制走索引）。"""
+        with mock.patch.object(line_index, "INDEX_MIN_FILE_BYTES", 1 << 40):
+            streamed = read_file(path=path, **kwargs)
+        with mock.patch.object(line_index, "INDEX_MIN_FILE_BYTES", 1), \
+                mock.patch.object(line_index, "INDEX_BLOCK_BYTES", 64):
+            indexed = read_file(path=path, **kwargs)
+        return streamed, indexed
+
+    def test_indexed_reads_match_streaming(self):
+        lines = [f"第{i}行 " + "x" * (i % 37) for i in range(3000)]
+        for name, newline, tail in (("lf.txt", "\n", ""), ("crlf.txt", "\r\n", "\r\n")):
+            path = self._write_bytes(name, (newline.join(lines) + tail).encode("utf-8"))
+            for kwargs in (
+                {},
+                {"offset": 2},
+                {"offset": 1500, "limit": 10},
+                {"offset": 2999, "limit": 5},
+                {"offset": 3000},
+                {"offset": 3001},
+                {"offset": 5000},
+            ):
+                with self.subTest(name=name, **kwargs):
+                    streamed, indexed = self._read_both(path, **kwargs)
+                    self.assertEqual(indexed, streamed)
+
+    def test_line_start_offsets(self):
+        data = b"a\n\nbb\r\nccc\n" * 50 + b"end"
+        path = self._write_bytes("offsets.txt", data)
+        expected = [0] + [i + 1 for i, byte in enumerate(data) if byte == ord("\n")]
+        with open(path, "rb") as f:
+            index = line_index.build_line_index(f, len(data), block_bytes=7)
+            self.assertEqual(index.total_lines, len(expected))
+            for line, offset in enumerate(expected):
+                self.assertEqual(index.line_start(f, line), offset)
+
+    def test_lone_carriage_return_falls_back_to_streaming(self):
+        path = self._write_bytes("cr.txt", b"one\rtwo\r\nthree\n" * 20)
+        with open(path, "rb") as f:
+            self.assertIsNone(line_index.build_line_index(f, os.path.getsize(path), block_bytes=8))
+        streamed, indexed = self._read_both(path, offset=5, limit=3)
+        self.assertEqual(indexed, streamed)
+
+    def test_index_rebuilt_after_file_changes(self):
+        path = self._write_bytes("grow.txt", b"line\n" * 100)
+        with mock.patch.object(line_index, "INDEX_MIN_FILE_BYTES", 1):
+            self.assertIn("(100 lines total)", read_file(path=path, offset=200))
+            with open(path, "ab") as f:
+                f.write(b"more\n" * 50)
+            os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+            self.assertIn("(150 lines total)", read_file(path=path, offset=200))
+            self.assertEqual(read_file(path=path, offset=150), "more")
+
+
 # ============================================================================
 # 工具元信息测试
 # ============================================================================
@@ -0,0 +1,137 @@
+"""search_files 工具单元测试"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from pyagent.tools import TOOL_REGISTRY
+from pyagent.tools import search_files as search_module
+from pyagent.tools.search_files import search_files
+
+
+class SearchFilesTests(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def _write(self, relative_path, content):
+        path = os.path.join(self.root, *relative_path.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        mode = "wb" if isinstance(content, bytes) else "w"
+        with open(path, mode, **({} if mode == "wb" else {"encoding": "utf-8"})) as f:
+            f.write(content)
+        return path
+
+    def test_matches_report_relative_path_and_line_number(self):
+        self._write("a.py", "import os\ndef foo():\n    return 1\n")
+        self._write("pkg/b.py", "x = 1\ndef foo_bar():\n    pass\n")
+
+        result = search_files(r"def foo", path=self.root)
+
+        self.assertIn("a.py:2:def foo():", result)
+        self.assertIn("pkg/b.py:2:def foo_bar():", result)
+        self.assertIn("共 2 处匹配，分布在 2 个文件中", result)
+        self.assertLess(result.index("a.py:2"), result.index("pkg/b.py:2"))
+
+    def test_gitignore_git_dir_and_binary_files_are_skipped(self):
+        self._write(".gitignore", "build/\n*.log\n!keep.log\n")
+        self._write("src/main.c", "needle\n")
+        self._write("build/out.c", "needle\n")
+        self._write("debug.log", "needle\n")
+        self._write("keep.log", "needle\n")
+        self._write(".git/config", "needle\n")
+        self._write("blob.bin", b"needle\x00\x01")
+
+        result = search_files("needle", path=self.root)
+
+        self.assertIn("src/main.c:1:needle", result)
+        self.assertIn("keep.log:1:needle", result)
+        for skipped in ("build/out.c", "debug.log", ".git/config", "blob.bin"):
+            self.assertNotIn(skipped, result)
+
+    def test_context_lines_and_group_separator(self):
+        lines = [f"line {i}" for i in range(1, 21)]
+        lines[4] = "hit one"
+        lines[6] = "hit two"
+        lines[15] = "hit three"
+        self._write("ctx.txt", "\n".join(lines) + "\n")
+
+        result = search_files("hit", path=self.root, context=1)
+
+        expected = "\n".join([
+            "ctx.txt-4-line 4",
+            "ctx.txt:5:hit one",
+            "ctx.txt-6-line 6",
+            "ctx.txt:7:hit two",
+            "ctx.txt-8-line 8",
+            "--",
+            "ctx.txt-15-line 15",
+            "ctx.txt:16:hit three",
+            "ctx.txt-17-line 17",
+        ])
+        self.assertTrue(result.startswith(expected), result)
+
+    def test_max_results_stops_search(self):
+        for i in range(5):
+            self._write(f"f{i}.txt", "match\n" * 10)
+
+        result = search_files("match", path=self.root, max_results=15)
+
+        self.assertEqual(result.count(":match"), 15)
+        self.assertIn("f1.txt:5:match", result)
+        self.assertNotIn("f2.txt", result)
+        self.assertIn("15 处匹配的上限", result)
+
+    def test_output_byte_budget(self):
+        self._write("big.txt", ("x" * 400 + " hit\n") * 500)
+        with mock.patch.object(search_module, "DEFAULT_MAX_BYTES", 4096):
+            result = search_files("hit", path=self.root, max_results=1000)
+        self.assertLess(len(result.encode("utf-8")), 4096 + 200)
+        self.assertIn("4KB 上限", result)
+
+    def test_glob_literal_ignore_case_and_crlf(self):
+        self._write("a.py", "Value = a.b(1)\r\n")
+        self._write("a.txt", "value = a.b(1)\n")
+
+        self.assertIn("a.py:1:Value = a.b(1)\n", search_files("a.b(1)", path=self.root, literal=True, glob="*.py"))
+        self._write("vendor/src/c.py", "Value = a.b(1)\n")
+        self._write("src/d.py", "Value = a.b(1)\n")
+        result = search_files("Value", path=self.root, glob="src/*.py")
+        self.assertIn("src/d.py:1:", result)
+        self.assertNotIn("vendor/src/c.py", result)
+
+        result = search_files("^value", path=self.root, ignore_case=True)
+        self.assertIn("a.py:1:Value", result)
+        self.assertIn("a.txt:1:value", result)
+
+    def test_single_file_and_multibyte_content(self):
+        path = self._write("中文.md", "第一行\n包含关键字的第二行\n")
+        self.assertIn("中文.md:2:包含关键字的第二行", search_files("关键字", path=path))
+
+    def test_empty_match_at_end_of_file(self):
+        # 与 grep -n 一致：结尾的换行之后没有第 3 行
+        self._write("x.txt", "a\nb\n")
+        self.assertIn("未找到匹配", search_files("^$", path=self.root))
+        result = search_files("^", path=self.root)
+        self.assertEqual([line for line in result.splitlines() if line.startswith("x.txt")], ["x.txt:1:a", "x.txt:2:b"])
+        self.assertIn("共 2 处匹配", result)
+
+        self._write("y.txt", "a\n\nb")
+        self.assertIn("y.txt:2:", search_files("^$", path=self.root))
+        self.assertIn("共 1 处匹配", search_files("b$", path=self.root, glob="y.txt"))
+
+    def test_errors_and_no_match(self):
+        self.assertIn("无效的正则表达式", search_files("(", path=self.root))
+        self.assertIn("路径不存在", search_files("x", path=os.path.join(self.root, "missing")))
+        self._write("a.txt", "abc\n")
+        self.assertIn("未找到匹配", search_files("zzz", path=self.root))
+
+    def test_registered_as_read_only_tool(self):
+        spec = TOOL_REGISTRY["search_files"]
+        self.assertTrue(spec.read_only)
+        self.assertEqual(spec.validate({"pattern": "x", "context": "2"}), ["context 应为 integer，实际为 str"])
+
+
+if __name__ == "__main__":
+    unittest.main()
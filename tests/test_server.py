@@ -0,0 +1,224 @@
+"""AgentServer 单元测试"""
+import io
+import json
+import os
+import socket
+import stat
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from pyagent.conversation_manager import StreamEvent
+from pyagent.frontends import JSONSocketFrontend
+from pyagent.server import AgentServer, write_token_file
+from pyagent.tools.browser_manager import BrowserPool, get_browser_manager
+
+
+class FakeLLMClient:
+    """回显最后一条用户消息的伪 LLM 客户端。"""
+
+    def __init__(self):
+        self.barrier = None
+
+    def chat_completions_create_with_events(self, **kwargs):
+        last_user = [m for m in kwargs["messages"] if m["role"] == "user"][-1]
+        text = last_user["content"]
+        if isinstance(text, list):
+            text = "".join(part.get("text", "") for part in text)
+        if self.barrier is not None:
+            # 所有会话都进入生成阶段后才返回，证明会话是并发处理的
+            self.barrier.wait()
+        yield StreamEvent("content", f"echo: {text}")
+        yield StreamEvent("finish", "stop")
+
+
+class _Client:
+    def __init__(self, address, token=None):
+        if isinstance(address, str):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(10)
+            self.sock.connect(address)
+        else:
+            self.sock = socket.create_connection(address, timeout=10)
+        self.rfile = self.sock.makefile("rb")
+        if token is not None:
+            self.send({"type": "auth", "token": token})
+
+    def send(self, payload):
+        self.sock.sendall((json.dumps(payload) + "\n").encode("utf-8"))
+
+    def read_until(self, message_type):
+        messages = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return messages
+            message = json.loads(line)
+            messages.append(message)
+            if message["type"] == message_type:
+                return messages
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+
+class AgentServerTests(unittest.TestCase):
+    def setUp(self):
+        saver_patcher = patch("pyagent.agent.conversation_saver")
+        saver_patcher.start()
+        self.addCleanup(saver_patcher.stop)
+
+        self.llm = FakeLLMClient()
+        self.server = AgentServer(
+            self.llm,
+            {"name": "fake-model"},
+            port=0,
+            max_sessions=2,
+            system_prompt="你是助手",
+        )
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.addCleanup(self.server.shutdown)
+
+    def _open_session(self):
+        client = _Client(self.server.address, self.server.token)
+        self.addCleanup(client.close)
+        session = client.read_until("session")[-1]
+        client.read_until("input_request")
+        return client, session
+
+    def test_concurrent_sessions(self):
+        self.llm.barrier = threading.Barrier(2, timeout=5)
+        first, first_session = self._open_session()
+        second, second_session = self._open_session()
+        self.assertNotEqual(first_session["session_id"], second_session["session_id"])
+
+        first.send({"type": "input", "text": "one"})
+        second.send({"type": "input", "text": "two"})
+
+        first_reply = first.read_until("input_request")
+        second_reply = second.read_until("input_request")
+        self.assertIn({"type": "content", "content": "echo: one"}, first_reply)
+        self.assertIn({"type": "content", "content": "echo: two"}, second_reply)
+
+        first.send({"type": "exit"})
+        self.assertEqual(first.read_until("session_end")[-1]["type"], "session_end")
+
+    def test_session_ids_survive_restart(self):
+        # 重启后计数等进程内状态归零，同一秒内的会话也不能与之前的重名
+        frozen = patch("pyagent.server.datetime")
+        frozen.start().now.return_value = datetime(2026, 1, 1)
+        self.addCleanup(frozen.stop)
+        _, before = self._open_session()
+
+        restarted = AgentServer(self.llm, {"name": "fake-model"}, port=0, system_prompt="你是助手")
+        threading.Thread(target=restarted.serve_forever, daemon=True).start()
+        self.addCleanup(restarted.shutdown)
+        client = _Client(restarted.address, restarted.token)
+        self.addCleanup(client.close)
+        after = client.read_until("session")[-1]
+
+        self.assertTrue(before["session_id"].startswith("conversation_20260101_000000_"))
+        self.assertNotEqual(before["session_id"], after["session_id"])
+
+    def test_rejects_sessions_over_limit(self):
+        self._open_session()
+        self._open_session()
+
+        third = _Client(self.server.address, self.server.token)
+        self.addCleanup(third.close)
+        messages = third.read_until("input_request")
+        self.assertEqual(messages[0]["type"], "error")
+        self.assertIn("上限", messages[0]["content"])
+
+    def test_invalid_message_closes_connection(self):
+        client, _ = self._open_session()
+        client.sock.sendall(b"not json\n")
+        messages = client.read_until("input_request")
+        self.assertEqual([m["type"] for m in messages], ["error"])
+        self.assertEqual(client.rfile.readline(), b"")
+
+    def test_sessions_require_token(self):
+        for first_line in (b'{"type": "auth", "token": "wrong"}\n', b'{"type": "input", "text": "hi"}\n'):
+            with self.subTest(first_line=first_line):
+                client = _Client(self.server.address)
+                self.addCleanup(client.close)
+                client.sock.sendall(first_line)
+                messages = client.read_until("session")
+                self.assertEqual([m["type"] for m in messages], ["error"])
+                self.assertIn("认证失败", messages[0]["content"])
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "需要 Unix socket")
+    def test_unix_socket_is_private(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        path = os.path.join(temp_dir.name, "agent.sock")
+        server = AgentServer(self.llm, {"name": "fake-model"}, unix_path=path, system_prompt="你是助手")
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.shutdown)
+
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+        client = _Client(path, server.token)
+        self.addCleanup(client.close)
+        self.assertEqual(client.read_until("session")[-1]["model"], "fake-model")
+
+
+class JSONSocketFrontendTests(unittest.TestCase):
+    def _frontend(self, data):
+        return JSONSocketFrontend(io.BytesIO(data), io.BytesIO())
+
+    def test_http_request_body_is_not_treated_as_input(self):
+        # 网页 fetch() 发往本地端口的请求：请求行和头部之后的 JSON 请求体不能成为用户输入
+        request = (
+            b"POST / HTTP/1.1\r\nHost: 127.0.0.1:8765\r\nContent-Type: text/plain\r\n"
+            b"Content-Length: 42\r\n\r\n"
+            b'{"type":"input","text":"rm -rf ~"}\n'
+        )
+        frontend = self._frontend(request)
+        self.assertEqual(frontend.get_input(), ("", False))
+        self.assertTrue(frontend.closed)
+        self.assertFalse(self._frontend(request).authenticate("secret"))
+
+    def test_authenticate(self):
+        self.assertTrue(self._frontend(b'{"type": "auth", "token": "secret"}\n').authenticate("secret"))
+        self.assertFalse(self._frontend(b'{"type": "auth", "token": "secreT"}\n').authenticate("secret"))
+        self.assertFalse(self._frontend(b'{"type": "auth", "token": 1}\n').authenticate("secret"))
+        self.assertFalse(self._frontend(b"").authenticate("secret"))
+
+    def test_write_token_file_is_private(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        path = os.path.join(temp_dir.name, "sub", "token")
+        write_token_file(path, "abc")
+        os.chmod(path, 0o644)
+        write_token_file(path, "def")
+        with open(path, encoding="utf-8") as f:
+            self.assertEqual(f.read(), "def\n")
+        if os.name != "nt":
+            self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+
+
+class BrowserPoolTests(unittest.TestCase):
+    def test_run_sets_session_manager_on_browser_thread(self):
+        pool = BrowserPool()
+        self.addCleanup(pool.close)
+        first = pool.create_session()
+        second = pool.create_session()
+
+        seen = [pool.run(manager, lambda: (get_browser_manager(), threading.current_thread().name))
+                for manager in (first, second)]
+
+        self.assertIs(seen[0][0], first)
+        self.assertIs(seen[1][0], second)
+        # 所有浏览器操作都在同一个池线程上执行
+        self.assertEqual(seen[0][1], seen[1][1])
+        self.assertNotEqual(seen[0][1], threading.current_thread().name)
+        # 池外仍是模块级单例
+        self.assertIsNot(get_browser_manager(), first)
+
+
+if __name__ == "__main__":
+    unittest.main()
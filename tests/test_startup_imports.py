@@ -0,0 +1,46 @@
+"""启动阶段延迟导入的单元测试：在新解释器中检查 sys.modules"""
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("prompt_toolkit", "httpx", "openai", "anthropic", "json_repair", "playwright")
+
+
+def _loaded_after(statement, modules):
+    script = (
+        f"import json, sys\n{statement}\n"
+        f"print(json.dumps([m for m in {list(modules)!r} if m in sys.modules]))"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+class StartupImportTests(unittest.TestCase):
+    def test_main_does_not_import_heavy_dependencies(self):
+        self.assertEqual(_loaded_after("import pyagent.main", HEAVY_MODULES), [])
+
+    def test_tool_schemas_do_not_import_heavy_dependencies(self):
+        loaded = _loaded_after(
+            "from pyagent.tools import TOOLS, TOOL_FUNCTIONS",
+            HEAVY_MODULES + ("difflib", "pyagent.tools.browser_manager"),
+        )
+        self.assertEqual(loaded, [])
+
+    def test_lazy_package_attributes_resolve(self):
+        loaded = _loaded_after(
+            "from pyagent import UnifiedLLMClient\n"
+            "from pyagent.frontends import CommandlineFrontend\n"
+            "from pyagent.llm_adapter import HTTPPoolConfig",
+            ("prompt_toolkit", "httpx"),
+        )
+        self.assertEqual(loaded, ["prompt_toolkit", "httpx"])
+
+
+if __name__ == "__main__":
+    unittest.main()
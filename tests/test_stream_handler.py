@@ -40,6 +40,79 @@ class StreamResponseHandlerTests(unittest.TestCase):
         result = handler.get_result()
         self.assertEqual(result["finish_reason"], "length")
 
+    def test_fragments_joined_in_result(self):
+        handler, frontend = self._create_handler()
+
+        for char in "abc" * 1000:
+            handler.handle_stream_event(StreamEvent("thinking", char))
+        handler.handle_stream_event(StreamEvent("content", "Hel"))
+        handler.handle_stream_event(StreamEvent("content", "lo"))
+        handler.handle_stream_event(StreamEvent("tool_call", {
+            "index": 0, "id": "c0", "function": {"name": "read_file", "arguments": "x" * 49},
+        }))
+        handler.handle_stream_event(StreamEvent("tool_call", {
+            "index": 0, "id": "", "function": {"name": "", "arguments": "y"},
+        }))
+
+        result = handler.get_result()
+        self.assertEqual(result["thinking"], "abc" * 1000)
+        self.assertEqual(result["content"], "Hello")
+        self.assertEqual(handler.full_content, "Hello")
+        self.assertEqual(result["tool_calls"][0]["function"]["arguments"], "x" * 49 + "y")
+        # 参数累计长度达到 50 的倍数时输出一次进度
+        progress_calls = [c for c in frontend.output.call_args_list if c.args[0] == "tool_progress"]
+        self.assertEqual(len(progress_calls), 1)
+
+
+def _tool_chunk(index, arguments, name="", tool_id=""):
+    return {"index": index, "id": tool_id, "function": {"name": name, "arguments": arguments}}
+
+
+class EarlyToolDispatchTests(unittest.TestCase):
+    def _create_handler(self):
+        ready = []
+        handler = StreamResponseHandler(
+            MagicMock(), on_tool_call_ready=lambda call, args: ready.append((call["id"], args))
+        )
+        return handler, ready
+
+    def test_complete_call_dispatched_before_stream_ends(self):
+        handler, ready = self._create_handler()
+
+        handler.handle_stream_event(StreamEvent("tool_call", _tool_chunk(0, '{"path": "a', "read_file", "c0")))
+        self.assertEqual(ready, [])
+        handler.handle_stream_event(StreamEvent("tool_call", _tool_chunk(0, '.txt"}')))
+        self.assertEqual(ready, [("c0", {"path": "a.txt"})])
+
+        # 第二个调用仍在流式到达
+        handler.handle_stream_event(StreamEvent("tool_call", _tool_chunk(1, '{"path": "{b}', "read_file", "c1")))
+        self.assertEqual(len(ready), 1)
+        handler.handle_stream_event(StreamEvent("tool_call", _tool_chunk(1, '"}')))
+        self.assertEqual(ready[1], ("c1", {"path": "{b}"}))
+
+        result = handler.get_result()
+        self.assertEqual(result["tool_calls"][1]["function"]["arguments"], '{"path": "{b}"}')
+
+    def test_malformed_call_blocks_later_early_dispatch(self):
+        handler, ready = self._create_handler()
+
+        handler.handle_stream_event(StreamEvent("tool_call", _tool_chunk(0, "{'path': 'a'}", "read_file", "c0")))
+        handler.handle_stream_event(StreamEvent("tool_call", _tool_chunk(1, '{"path": "b"}', "read_file", "c1")))
+
+        # 第一个调用需要修复后才能解析，其后的调用也留到流结束后按顺序处理
+        self.assertEqual(ready, [])
+        self.assertEqual(len(handler.get_result()["tool_calls"]), 2)
+
+    def test_calls_dispatched_in_index_order(self):
+        handler, ready = self._create_handler()
+
+        handler.handle_stream_event(StreamEvent("tool_call", _tool_chunk(0, '{"path": ', "read_file", "c0")))
+        handler.handle_stream_event(StreamEvent("tool_call", _tool_chunk(1, '{"path": "b"}', "read_file", "c1")))
+        self.assertEqual(ready, [])
+
+        handler.handle_stream_event(StreamEvent("tool_call", _tool_chunk(0, '"a"}')))
+        self.assertEqual([call_id for call_id, _ in ready], ["c0", "c1"])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,47 @@
+"""JSONObjectScanner 单元测试"""
+import unittest
+
+from pyagent.streaming_json import JSONObjectScanner, parse_complete_object
+
+
+class JSONObjectScannerTests(unittest.TestCase):
+    def _feed_all(self, fragments):
+        scanner = JSONObjectScanner()
+        states = [scanner.feed(fragment) for fragment in fragments]
+        return scanner, states
+
+    def test_completes_when_top_level_object_closes(self):
+        scanner, states = self._feed_all(['{"a": ', '{"b": [1, 2]', "}", "}"])
+        self.assertEqual(states, [False, False, False, True])
+        self.assertFalse(scanner.invalid)
+
+    def test_braces_inside_strings_are_ignored(self):
+        scanner, states = self._feed_all(['{"code": "if (x) { return [1]; }', '"}'])
+        self.assertEqual(states, [False, True])
+
+    def test_escaped_quote_split_across_fragments(self):
+        # 反斜杠位于片段末尾，下一片段开头的引号被转义，字符串尚未结束
+        fragments = ['{"s": "a\\', '"', '}"}']
+        scanner, states = self._feed_all(fragments)
+        self.assertEqual(states, [False, False, True])
+        self.assertEqual(parse_complete_object("".join(fragments)), {"s": 'a"}'})
+
+    def test_escaped_backslash_before_closing_quote(self):
+        fragments = ['{"p": "C:\\', '\\"', "}"]
+        scanner, states = self._feed_all(fragments)
+        self.assertEqual(states, [False, False, True])
+        self.assertEqual(parse_complete_object("".join(fragments)), {"p": "C:\\"})
+
+    def test_trailing_text_marks_invalid(self):
+        scanner, states = self._feed_all(['{"a": 1}', " ", "x"])
+        self.assertTrue(states[0])
+        self.assertTrue(scanner.invalid)
+
+    def test_parse_complete_object_rejects_non_objects(self):
+        self.assertIsNone(parse_complete_object("[1, 2]"))
+        self.assertIsNone(parse_complete_object("{'a': 1}"))
+        self.assertEqual(parse_complete_object('{"a": 1}'), {"a": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
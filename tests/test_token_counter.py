@@ -1,6 +1,8 @@
 """TokenCounter 单元测试"""
 import unittest
+from unittest.mock import patch
 
+from pyagent.conversation_manager import ConversationManager
 from pyagent.token_counter import TokenCounter
 
 
@@ -84,5 +86,32 @@ class TokenCounterTests(unittest.TestCase):
         self.assertEqual(self.counter.total_stats["total_input_tokens"], 10)
 
 
+    def test_conversation_tokens_only_counts_new_messages(self):
+        manager = ConversationManager("你是助手")
+        manager.add_user_message("Hello 你好")
+        first = self.counter.calculate_conversation_tokens(manager.get_messages_for_sdk())
+
+        manager.add_assistant_message("OK", "因为")
+        with patch.object(
+            self.counter, "count_message_tokens", wraps=self.counter.count_message_tokens
+        ) as counted:
+            second = self.counter.calculate_conversation_tokens(manager.get_messages_for_sdk())
+
+        self.assertEqual(counted.call_count, 1)
+        self.assertEqual(second, first + 3)
+
+    def test_conversation_tokens_recounted_after_history_changes(self):
+        messages = [
+            {"role": "user", "content": "one two"},
+            {"role": "assistant", "content": "three"},
+        ]
+        self.counter.calculate_conversation_tokens(messages)
+
+        rewritten = [{"role": "user", "content": "one"}, messages[1]]
+        total = self.counter.calculate_conversation_tokens(rewritten)
+        expected = self.counter.initial_tokens["total_initial_tokens"] + 1 + 1
+        self.assertEqual(total, expected)
+
+
 if __name__ == "__main__":
     unittest.main()
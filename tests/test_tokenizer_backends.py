@@ -0,0 +1,99 @@
+"""分词后端单元测试"""
+import base64
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from pyagent import tokenizer_backends
+from pyagent.token_counter import TokenCounter
+from pyagent.tokenizer_backends import BPETokenizer, HeuristicTokenizer, get_tokenizer
+
+
+def _write_vocab(path, merges):
+    """写入 tiktoken 格式词表：256 个单字节 + 给定的合并结果（按顺序分配 rank）。"""
+    tokens = [bytes([i]) for i in range(256)] + list(merges)
+    with open(path, "wb") as f:
+        for rank, token in enumerate(tokens):
+            f.write(base64.b64encode(token) + b" " + str(rank).encode() + b"\n")
+
+
+class BPETokenizerTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.vocab_path = os.path.join(self.temp_dir.name, "tiny.tiktoken")
+        _write_vocab(self.vocab_path, [b"he", b"ll", b"hell", b"hello", b" w", b" wor", b"or"])
+        # 始终测试纯 Python 实现，不依赖是否安装 tiktoken
+        patcher = patch.object(BPETokenizer, "_try_create_tiktoken_encoding", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def test_merges_follow_vocab(self):
+        tokenizer = BPETokenizer(self.vocab_path)
+        self.assertEqual(tokenizer.count("hello"), 1)
+        # "hello" + " wor" + "l" + "d"
+        self.assertEqual(tokenizer.count("hello world"), 4)
+        self.assertEqual(tokenizer.count(""), 0)
+
+    def test_vocab_loaded_lazily(self):
+        tokenizer = BPETokenizer(self.vocab_path)
+        self.assertFalse(tokenizer._loaded)
+        tokenizer.count("hello")
+        self.assertTrue(tokenizer._loaded)
+
+    def test_non_ascii_counts_bytes_without_merges(self):
+        tokenizer = BPETokenizer(self.vocab_path)
+        # 每个汉字 3 个 UTF-8 字节，词表中没有对应合并
+        self.assertEqual(tokenizer.count("你好"), 6)
+
+    def test_corrupt_vocab_falls_back_to_heuristic(self):
+        with open(self.vocab_path, "wb") as f:
+            f.write(b"not-a-valid-line\n")
+        tokenizer = BPETokenizer(self.vocab_path)
+        with self.assertLogs("pyagent.tokenizer_backends", level="WARNING"):
+            self.assertEqual(tokenizer.count("hello world"), 2)
+
+    def test_tiktoken_style_pattern_falls_back_to_builtin_splitter(self):
+        tokenizer = BPETokenizer(self.vocab_path, pattern=tokenizer_backends.CL100K_PATTERN)
+        with self.assertLogs("pyagent.tokenizer_backends", level="WARNING"):
+            self.assertEqual(tokenizer.count("hello world"), 4)
+
+
+class GetTokenizerTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        patcher = patch.dict(tokenizer_backends._tokenizers, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_default_is_heuristic(self):
+        self.assertIsInstance(get_tokenizer(None), HeuristicTokenizer)
+        self.assertIsInstance(get_tokenizer("heuristic"), HeuristicTokenizer)
+
+    def test_missing_vocab_falls_back(self):
+        with self.assertLogs("pyagent.tokenizer_backends", level="WARNING"):
+            tokenizer = get_tokenizer({"type": "bpe", "vocab_file": "does-not-exist.tiktoken"})
+        self.assertIsInstance(tokenizer, HeuristicTokenizer)
+
+    def test_bpe_tokenizer_is_memoized(self):
+        vocab_path = os.path.join(self.temp_dir.name, "tiny.tiktoken")
+        _write_vocab(vocab_path, [b"he"])
+        config = {"type": "bpe", "vocab_file": vocab_path}
+        first = get_tokenizer(config)
+        self.assertIsInstance(first, BPETokenizer)
+        self.assertIs(get_tokenizer(dict(config)), first)
+
+    def test_token_counter_uses_configured_backend(self):
+        vocab_path = os.path.join(self.temp_dir.name, "tiny.tiktoken")
+        _write_vocab(vocab_path, [b"he", b"ll", b"hell", b"hello"])
+        with patch.object(BPETokenizer, "_try_create_tiktoken_encoding", return_value=None):
+            counter = TokenCounter("demo", tokenizer={"type": "bpe", "vocab_file": vocab_path})
+            self.assertEqual(counter.count_tokens("hello"), 1)
+        counter.start_new_round("hello")
+        self.assertIn("bpe", counter.get_round_summary())
+
+
+if __name__ == "__main__":
+    unittest.main()
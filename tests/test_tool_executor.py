@@ -0,0 +1,139 @@
+"""ToolCallExecutor 单元测试"""
+import contextvars
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from pyagent.tool_executor import ToolCallExecutor
+from pyagent.tools.cmdline import ShellSession, activate_shell_session, deactivate_shell_session, execute_command
+from pyagent.tools.edit import edit_file
+from pyagent.tools.file_write import write_file
+
+
+class ToolCallExecutorTests(unittest.TestCase):
+    def test_independent_calls_run_concurrently(self):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def tool(name):
+            # 三个调用必须同时在运行，否则 Barrier 超时抛出异常
+            barrier.wait()
+            return name
+
+        start = time.time()
+        with ToolCallExecutor(max_workers=3) as executor:
+            futures = [executor.submit("read_file", tool, {"name": n}) for n in "abc"]
+            results = [f.result() for f in futures]
+
+        self.assertEqual(results, ["a", "b", "c"])
+        self.assertLess(time.time() - start, 5)
+
+    def test_same_path_mutations_run_in_order(self):
+        events = []
+
+        def slow_write(path, label, delay):
+            events.append(f"start {label}")
+            time.sleep(delay)
+            events.append(f"end {label}")
+            return label
+
+        with ToolCallExecutor(max_workers=4) as executor:
+            first = executor.submit("write_file", slow_write, {"path": "a.txt", "label": 1, "delay": 0.2})
+            second = executor.submit("edit_file", slow_write, {"path": "./a.txt", "label": 2, "delay": 0})
+            self.assertEqual([first.result(), second.result()], [1, 2])
+
+        self.assertEqual(events, ["start 1", "end 1", "start 2", "end 2"])
+
+    def test_exceptions_are_captured_in_future(self):
+        def broken():
+            raise RuntimeError("boom")
+
+        with ToolCallExecutor(max_workers=2) as executor:
+            future = executor.submit("read_file", broken, {})
+            with self.assertRaises(RuntimeError):
+                future.result()
+
+    def test_single_worker_runs_inline(self):
+        caller = threading.get_ident()
+        with ToolCallExecutor(max_workers=1) as executor:
+            future = executor.submit("execute_command", threading.get_ident, {})
+        self.assertEqual(future.result(), caller)
+
+    def test_thread_affine_tools_run_on_caller_thread(self):
+        caller = threading.get_ident()
+        with ToolCallExecutor(max_workers=4) as executor:
+            future = executor.submit("browser_use", threading.get_ident, {})
+        self.assertEqual(future.result(), caller)
+
+    def test_workers_inherit_caller_context(self):
+        var = contextvars.ContextVar("session", default=None)
+        token = var.set("session-1")
+        try:
+            with ToolCallExecutor(max_workers=4) as executor:
+                future = executor.submit("read_file", var.get, {})
+        finally:
+            var.reset(token)
+        self.assertEqual(future.result(), "session-1")
+
+    def test_write_then_edit_same_file(self):
+        with tempfile.TemporaryDirectory() as temp_root:
+            path = os.path.join(temp_root, "demo.txt")
+            with ToolCallExecutor(max_workers=4) as executor:
+                executor.submit("write_file", write_file, {"path": path, "content": "hello\n"})
+                edited = executor.submit(
+                    "edit_file",
+                    edit_file,
+                    {"path": path, "edits": [{"oldText": "hello", "newText": "world"}]},
+                )
+                self.assertTrue(edited.result().startswith("[OK]"))
+
+            with open(path, "r", encoding="utf-8") as f:
+                self.assertEqual(f.read(), "world\n")
+
+    @unittest.skipIf(os.name == "nt", "依赖 sleep 命令")
+    def test_interrupt_kills_running_commands_and_cancels_pending(self):
+        with ToolCallExecutor(max_workers=2) as executor:
+            started = time.time()
+            running = executor.submit("execute_command", execute_command, {"command": "sleep 30"})
+            other = executor.submit("execute_command", execute_command, {"command": "sleep 30"})
+            queued = executor.submit("read_file", time.time, {})
+            time.sleep(0.5)
+
+            self.assertEqual(executor.interrupt(), 2)
+            self.assertIn("命令已取消", running.result(timeout=10))
+            self.assertIn("命令已取消", other.result(timeout=10))
+            self.assertTrue(queued.cancelled())
+        self.assertLess(time.time() - started, 10)
+
+    @unittest.skipIf(os.name == "nt", "依赖 sleep 命令")
+    def test_keyboard_interrupt_exit_kills_commands(self):
+        futures = []
+        started = time.time()
+        with self.assertRaises(KeyboardInterrupt):
+            with ToolCallExecutor(max_workers=2) as executor:
+                futures.append(executor.submit("execute_command", execute_command, {"command": "sleep 30"}))
+                time.sleep(0.5)
+                raise KeyboardInterrupt
+
+        self.assertIn("命令已取消", futures[0].result(timeout=10))
+        self.assertLess(time.time() - started, 10)
+
+    @unittest.skipIf(os.name == "nt", "持久 shell 仅支持 Linux/macOS")
+    def test_interrupt_kills_persistent_shell_command(self):
+        session = ShellSession()
+        self.addCleanup(session.close)
+        token = activate_shell_session(session)
+        try:
+            with ToolCallExecutor(max_workers=2) as executor:
+                future = executor.submit("execute_command", execute_command, {"command": "sleep 30"})
+                time.sleep(0.5)
+                executor.interrupt()
+                self.assertIn("命令已取消", future.result(timeout=10))
+        finally:
+            deactivate_shell_session(token)
+        self.assertIn("hello", session.run("echo hello"))
+
+
+if __name__ == "__main__":
+    unittest.main()
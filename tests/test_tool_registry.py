@@ -0,0 +1,66 @@
+"""工具注册表与参数校验单元测试"""
+import unittest
+
+from pyagent.tool_executor import FILE_MUTATION_TOOLS, THREAD_AFFINE_TOOLS
+from pyagent.tools import TOOL_FUNCTIONS, TOOL_REGISTRY, TOOLS, ToolRegistry, compile_validator
+from pyagent.tools.edit import EDIT_TOOLS
+
+
+class CompileValidatorTests(unittest.TestCase):
+    def setUp(self):
+        self.validate = compile_validator({
+            "type": "object",
+            "properties": {
+                "path": {"type": "string"},
+                "limit": {"type": "integer"},
+                "mode": {"type": "string", "enum": ["a", "b"]},
+                "tags": {"type": "array", "items": {"type": "string"}},
+            },
+            "required": ["path"],
+        })
+
+    def test_valid_arguments(self):
+        self.assertEqual(self.validate({"path": "x", "limit": 3, "mode": "a", "tags": ["t"]}), [])
+        # JSON 中的 3.0 也是整数
+        self.assertEqual(self.validate({"path": "x", "limit": 3.0}), [])
+
+    def test_reports_each_problem(self):
+        errors = self.validate({"limit": True, "mode": "c", "tags": ["ok", 1]})
+        self.assertEqual(len(errors), 4)
+        self.assertTrue(any("path" in e for e in errors))
+        self.assertTrue(any("limit" in e and "bool" in e for e in errors))
+        self.assertTrue(any("'c'" in e for e in errors))
+        self.assertTrue(any("tags[]" in e for e in errors))
+
+    def test_additional_properties_false(self):
+        validate = compile_validator(EDIT_TOOLS[0]["function"]["parameters"])
+        errors = validate({"path": "a.txt", "edits": [{"oldText": "a", "newText": "b", "extra": 1}]})
+        self.assertEqual(errors, ["不支持的参数 edits[].extra"])
+        self.assertIn("缺少必填参数 edits[].newText", validate({"path": "a", "edits": [{"oldText": "a"}]}))
+
+
+class ToolRegistryTests(unittest.TestCase):
+    def test_registry_matches_exports(self):
+        self.assertEqual([t["function"]["name"] for t in TOOLS], [spec.name for spec in TOOL_REGISTRY])
+        self.assertEqual(TOOL_FUNCTIONS, {spec.name: spec.func for spec in TOOL_REGISTRY})
+
+    def test_cached_parameters_and_metadata(self):
+        spec = TOOL_REGISTRY["write_file"]
+        self.assertEqual(spec.parameters, {"path", "content", "signal"})
+        self.assertEqual(spec.path_param, "path")
+        self.assertFalse(spec.concurrency_safe)
+        self.assertTrue(TOOL_REGISTRY["read_file"].read_only)
+        self.assertTrue(TOOL_REGISTRY["read_file"].concurrency_safe)
+        self.assertEqual(FILE_MUTATION_TOOLS, {"write_file", "edit_file"})
+        self.assertEqual(THREAD_AFFINE_TOOLS, {"browser_use"})
+
+    def test_duplicate_registration_rejected(self):
+        registry = ToolRegistry()
+        schema = {"type": "function", "function": {"name": "noop", "parameters": {"type": "object"}}}
+        registry.register(schema, lambda: None)
+        with self.assertRaises(ValueError):
+            registry.register(schema, lambda: None)
+
+
+if __name__ == "__main__":
+    unittest.main()